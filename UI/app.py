@@ -1,9 +1,10 @@
 from src.models.appdirs import resource_path, get_resource_dir, get_templates_dir, get_static_dir
 import webview
-from flask import Flask, render_template, jsonify, request, send_from_directory, redirect, url_for, send_file
+from flask import Flask, render_template, jsonify, request, send_from_directory, redirect, url_for, send_file, Response
 import os
 import threading
 import asyncio
+import multiprocessing
 from src.models.stash_manager import StashManager
 import psutil
 import json
@@ -24,6 +25,10 @@ from src.models.item import Item
 from dotenv import load_dotenv
 sys.path.append(os.path.dirname(__file__))
 from src.models.capture import PacketCapture  # Add capture import
+from src.models.metrics import to_prometheus
+from src.models.persistence import writer
+from src.models.design_ids import character_classes
+from src.models.inventory_tracker import InventoryTracker
 
 APP_VERSION = "3.2.1"
 
@@ -58,20 +63,43 @@ server.config['JSON_AS_ASCII'] = False
 # Set a secure secret key for session
 server.secret_key = secrets.token_hex(32)  # Generate a secure random key
 
-# Initialize StashManager with explicit path, but defer actual data loading
-stash_manager = StashManager(app_dir, defer_loading=True)
+# Initialize StashManager with explicit path, but defer actual data loading.
+# Parsing uses threads: worker processes of the Windows build are spawned and
+# would run this module's setup (capture, hotkeys) again
+stash_manager = StashManager(app_dir, defer_loading=True, load_strategy=os.getenv("STASH_LOAD_STRATEGY", "threads"))
 
 # Cache for frequently accessed data
 _cache = {}
 
+def handle_data_dir_change():
+    """Refresh the UI after character files changed on disk"""
+    if api.window:
+        api.window.evaluate_js('window.dispatchEvent(new Event("charactersChanged")); '
+                               'if(window.updateCharacterData) window.updateCharacterData();')
+
+def handle_inventory_delta(character_id, ops):
+    # Called from InventoryTracker when a captured inventory change was applied
+    if stash_manager.apply_inventory_delta(character_id, ops) and api.window:
+        api.window.evaluate_js('if(window.updateCharacterData) window.updateCharacterData();')
+
+def handle_inventory_resync(character_id):
+    # Called from InventoryTracker when a change (a stack merge) could not be tracked exactly
+    if api.window:
+        api.window.evaluate_js('showNotification("Stack counts will be exact again after the next character capture", "info");')
+
+inventory_tracker = InventoryTracker(handle_inventory_delta, resync=handle_inventory_resync)
+
 def handle_character(message):
-    save_packet_data(message)
     # Called from PacketCapture when a new character is saved
-    stash_manager.force_reload()  # Use force_reload to ensure data is refreshed
+    if save_packet_data(message):
+        # The saved file is the new baseline for inventory deltas
+        inventory_tracker.set_character(message.characterDataBase.characterId)
+        # Rebuild only the captured character instead of reloading every file
+        stash_manager.update_character(message.characterDataBase.characterId, message)
     
     # Extract character information for visual effect
     char_data = message.characterDataBase
-    char_class = char_data.characterClass.replace("DesignDataPlayerCharacter:Id_PlayerCharacter_", "")
+    char_class = character_classes.name(char_data.characterClass)
     char_nickname = char_data.nickName.originalNickName if hasattr(char_data.nickName, 'originalNickName') else "Unknown"
     
     # Notify UI of data update with character capture animation
@@ -81,6 +109,7 @@ def handle_character(message):
             if(window.showCharacterCaptureAnimation) window.showCharacterCaptureAnimation("{char_class}", "{char_nickname}");
             if(window.updateCharacterData) window.updateCharacterData();
             if(window.updateCharacterList) window.updateCharacterList();
+            window.dispatchEvent(new Event("charactersChanged"));
         ''')
     return True
 
@@ -97,16 +126,14 @@ class Api:
             'port_range': (
                 int(os.getenv('CAPTURE_PORT_LOW', 20200)),
                 int(os.getenv('CAPTURE_PORT_HIGH', 20300))
-            )
-        }
-        self.packet_capture = PacketCapture(
-            interface=self.capture_settings['interface'],
-            port_range=self.capture_settings['port_range'],
-        )
-        capture_info = {
-            _PacketCommand_pb2.PacketCommand.S2C_LOBBY_CHARACTER_INFO_RES: handle_character,
+            ),
+            'backend': self.settings.get('captureBackend', os.getenv('CAPTURE_BACKEND', 'auto')),
+            'display_filter': os.getenv('CAPTURE_DISPLAY_FILTER', '0') == '1',
+            'workers': int(os.getenv('CAPTURE_WORKERS', 1)),
+            'queue_size': int(os.getenv('CAPTURE_QUEUE_SIZE', 256)),
+            'overflow': os.getenv('CAPTURE_OVERFLOW', 'drop_oldest')
         }
-        self.packet_capture.capture_info = capture_info
+        self.packet_capture = self._create_packet_capture()
 
         self.capture_thread = None
         self.capture_running = self.packet_capture.running
@@ -120,6 +147,22 @@ class Api:
         self._current_char_id = None
         self._current_stash_id = None
 
+    def _create_packet_capture(self):
+        packet_capture = PacketCapture(
+            interface=self.capture_settings['interface'],
+            port_range=self.capture_settings['port_range'],
+            backend=self.capture_settings['backend'],
+            display_filter=self.capture_settings['display_filter'],
+            workers=self.capture_settings['workers'],
+            queue_size=self.capture_settings['queue_size'],
+            overflow=self.capture_settings['overflow'],
+        )
+        packet_capture.capture_info = {
+            _PacketCommand_pb2.PacketCommand.S2C_LOBBY_CHARACTER_INFO_RES: handle_character,
+            **inventory_tracker.capture_info(),
+        }
+        return packet_capture
+
     def _load_settings(self):
         if os.path.exists(self.settings_file):
             try:
@@ -143,8 +186,8 @@ class Api:
         if 'sortSpeed' not in settings:
             settings['sortSpeed'] = 0.2
         try:
-            with open(self.settings_file, 'w') as f:
-                json.dump(settings, f, indent=2)
+            # Settings changed in quick succession, e.g. while dragging a slider, are written once
+            writer.write(self.settings_file, json.dumps(settings, indent=2), coalesce=True)
             self.settings = settings
             self._setup_global_hotkeys()
             logger.info("Settings saved successfully")
@@ -215,6 +258,12 @@ class Api:
     def get_character_stashes(self, character_id):
         return self.stash_manager.get_character_stashes(character_id)
         
+    def get_character_history(self, character_id, start=None, end=None):
+        return self.stash_manager.get_character_history(character_id, start, end)
+
+    def get_character_stashes_at(self, character_id, ts=None):
+        return self.stash_manager.get_character_stashes_at(character_id, ts)
+
     def get_character_details(self, character_id):
         return self.stash_manager.get_character_details(character_id)
 
@@ -225,16 +274,18 @@ class Api:
     def search_items(self, query):
         return self.stash_manager.search_items(query)
 
+    def search_suggest(self, query, limit=10):
+        """Get autocomplete suggestions for the search box"""
+        return self.stash_manager.search_suggest(query, limit)
+
     def set_capture_settings(self, interface, port_low, port_high):
-        # Stop current capture if running
+        # Stop current capture if running, and its frame workers, before replacing it
         if self.packet_capture.running:
             self.packet_capture.stop_capture_switch()
+        self.packet_capture.shutdown()
         # Create new PacketCapture with updated settings and callback
-        self.capture_settings = {'interface': interface, 'port_range': (port_low, port_high)}
-        self.packet_capture = PacketCapture(
-            interface,
-            (port_low, port_high),
-        )
+        self.capture_settings = dict(self.capture_settings, interface=interface, port_range=(port_low, port_high))
+        self.packet_capture = self._create_packet_capture()
         return True
 
     def start_capture(self):
@@ -243,8 +294,7 @@ class Api:
         result = self.packet_capture.capture()
         if result:
             # Reload data after successful capture
-            self.stash_manager.characters_cache = {}
-            self.stash_manager._load_data()
+            self.stash_manager.force_reload()
         return result
 
     def get_character_stash_previews(self, character_id):
@@ -276,6 +326,18 @@ class Api:
             "initialRestartDone": self._initial_restart_done
         }
 
+    def get_capture_metrics(self):
+        """Get capture pipeline counters and latency histograms, plus file write metrics"""
+        return dict(self.packet_capture.metrics(), persistence=writer.metrics())
+
+    def get_flight_recorder(self, limit=None, outcome=None):
+        """Get recently captured frames from the capture flight recorder"""
+        recorder = self.packet_capture.flight_recorder
+        return {
+            "summary": recorder.summary(),
+            "frames": recorder.dump(limit=limit, outcome=outcome)
+        }
+
     def sort_stash(self, character_id, stash_id):
         """Sort a specific stash for a character"""
         try:
@@ -555,7 +617,13 @@ api = Api()
 # JSON API endpoint
 @server.route('/api/characters')
 def api_characters():
-    return jsonify(api.get_characters())
+    # The character list only changes when a new snapshot is published
+    etag = f'"chars-{api.stash_manager.version}"'
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304
+    response = jsonify(api.get_characters())
+    response.headers['ETag'] = etag
+    return response
 
 @server.route('/api/character/<character_id>/stashes')
 def api_character_stashes(character_id):
@@ -565,6 +633,21 @@ def api_character_stashes(character_id):
 def api_character_details(character_id):
     return jsonify(api.get_character_details(character_id) or {}), 200
 
+@server.route('/api/character/<character_id>/history')
+def api_character_history(character_id):
+    # ?start= and ?end= are Unix timestamps limiting the returned changes
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    return jsonify(api.get_character_history(character_id, start, end))
+
+@server.route('/api/character/<character_id>/history/state')
+def api_character_history_state(character_id):
+    # ?at= is a Unix timestamp; without it the latest recorded state is returned
+    state = api.get_character_stashes_at(character_id, request.args.get('at', type=float))
+    if state is None:
+        return jsonify({'error': 'No capture of this character at that time'}), 404
+    return jsonify(state)
+
 @server.route('/output/<path:filename>')
 def serve_preview(filename):
     from src.models.appdirs import get_output_dir
@@ -576,6 +659,13 @@ def api_search_items():
     query = request.args.get('query', '')
     return jsonify(api.search_items(query))
 
+@server.route('/api/search_suggest')
+def api_search_suggest():
+    """Completions for the last keyword of ?query, best first; ?limit=N (default 10, at most 50)"""
+    query = request.args.get('query', '')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    return jsonify(api.search_suggest(query, limit))
+
 @server.route('/api/capture/settings', methods=['GET', 'POST'])
 def api_capture_settings():
     if request.method == 'GET':
@@ -607,6 +697,21 @@ def capture_switch_restart():
 def api_capture_state():
     return jsonify(api.get_capture_state())
 
+@server.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    """Capture pipeline metrics as JSON, or Prometheus text with ?format=prometheus"""
+    metrics = api.get_capture_metrics()
+    if request.args.get('format') == 'prometheus':
+        return Response(to_prometheus(metrics), mimetype='text/plain; version=0.0.4')
+    return jsonify(metrics)
+
+@server.route('/api/debug/flight_recorder', methods=['GET'])
+def api_flight_recorder():
+    """Dump recent frame metadata; ?limit=N and ?outcome=... narrow the result"""
+    limit = request.args.get('limit', type=int)
+    outcome = request.args.get('outcome')
+    return jsonify(api.get_flight_recorder(limit=limit, outcome=outcome))
+
 @server.route('/api/network_interfaces', methods=['GET'])
 def api_network_interfaces():
     interfaces = list(psutil.net_if_addrs().keys())
@@ -744,9 +849,18 @@ def background_init():
                 
                 # Only load if not already loaded
                 if not api.stash_manager._is_loaded:
+                    # Show the characters from the last run right away, then
+                    # refresh whatever changed on disk since
+                    api.stash_manager.load_startup_cache()
                     logger.info("Loading stash manager data...")
                     api.stash_manager._load_data()
                     logger.info(f"Stash manager data loaded in {time.time() - start_time:.2f} seconds")
+
+                # Pick up character files restored or synced while the app runs
+                try:
+                    api.stash_manager.start_watching(on_change=handle_data_dir_change)
+                except Exception as e:
+                    logger.warning(f"Could not watch the data directory: {e}")
                 
                 # Release loading flag
                 load_data_async.is_loading = False
@@ -969,7 +1083,7 @@ def main():
     for method_name in [
         'minimize', 'toggle_maximize', 'close_window', 'sort_stash', '_save_settings',
         'start_capture', 'start_capture_switch', 'stop_capture_switch', 'restart_capture_switch',
-        'search_items', 'get_characters', 'get_character_stashes', 'get_character_details',
+        'search_items', 'search_suggest', 'get_characters', 'get_character_stashes', 'get_character_details',
         'get_capture_settings', 'set_capture_settings', 'get_character_stash_previews',
         'get_capture_state', 'get_executable_path', 'launch_updater', 'set_sort_order'
     ]:
@@ -991,4 +1105,6 @@ def main():
     webview.start(on_loaded, debug=False)
 
 if __name__ == '__main__':
+    # Worker processes of a frozen build must not start the app again
+    multiprocessing.freeze_support()
     main()
@@ -76,8 +76,24 @@ def get_logs_dir():
     os.makedirs(logs_dir, exist_ok=True)
     return logs_dir
 
+def get_archive_dir():
+    archive_dir = os.path.join(get_appdata_dir(), 'packet_archive')
+    os.makedirs(archive_dir, exist_ok=True)
+    return archive_dir
+
+def get_history_dir():
+    history_dir = os.path.join(get_appdata_dir(), 'history')
+    os.makedirs(history_dir, exist_ok=True)
+    return history_dir
+
 def get_settings_file():
     return os.path.join(get_appdata_dir(), 'settings.json')
 
 def get_capture_state_file():
     return os.path.join(get_appdata_dir(), 'capture_state.json')
+
+def get_startup_cache_file():
+    return os.path.join(get_appdata_dir(), 'startup_cache.bin')
+
+def get_item_cache_file():
+    return os.path.join(get_appdata_dir(), 'items.catalog')
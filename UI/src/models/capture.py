@@ -2,8 +2,6 @@ import os
 import sys
 import subprocess
 import asyncio
-import tempfile
-import glob
 
 # 1) Grab the original asyncio.spawn function
 _orig_create = asyncio.create_subprocess_exec
@@ -26,53 +24,30 @@ async def _create_no_window(*args, **kwargs):
 asyncio.create_subprocess_exec = _create_no_window
 
 
-import pyshark
 import socket
 import psutil
-import struct
 import json
 from datetime import datetime
 import logging
 from typing import Tuple, Optional
 import threading
 import time
-import importlib
 
 from .appdirs import get_capture_state_file, is_frozen
+from .reassembly import TcpReassembler
+from .capture_backends import open_backend, PysharkBackend, PcapFileBackend
+from .proto_registry import registry as proto_registry
+from .frame_pool import FrameWorkerPool, ProcessHandler
+from .metrics import PipelineMetrics
+from .persistence import writer
+from . import flight_recorder
+from .flight_recorder import FlightRecorder
 from networking.protos import _PacketCommand_pb2
 
-# Determine paths
-current_dir = os.path.dirname(os.path.abspath(__file__))
-ui_root     = os.path.abspath(os.path.join(current_dir, "..", ".."))
-protos_path = os.path.join(ui_root, "networking", "protos")
-
-# Ensure the protos path is on sys.path
-if protos_path not in sys.path:
-    sys.path.insert(0, protos_path)
-
-# Dynamically load each _pb2 module under the package name networking.protos.xxx_pb2
-for filename in os.listdir(protos_path):
-    if not filename.endswith("_pb2.py"):
-        continue
-
-    module_name = filename[:-3]  # "Account_pb2"
-    full_name   = f"networking.protos.{module_name}"
-    file_path   = os.path.join(protos_path, filename)
-
-    # Create a module spec
-    spec = importlib.util.spec_from_file_location(full_name, file_path)
-    module = importlib.util.module_from_spec(spec)
-
-    # Insert into sys.modules so relative imports inside will resolve
-    sys.modules[full_name] = module
-
-    # Execute the module
-    spec.loader.exec_module(module)
-
-    # Bring its public names into globals()
-    for attr in dir(module):
-        if not attr.startswith("_"):
-            globals()[attr] = getattr(module, attr)
+# Packet command lookups, built once so the per-frame path never walks the enum
+COMMAND_NAMES = {v.number: v.name for v in _PacketCommand_pb2._PACKETCOMMAND.values}
+VALID_PROTO_TYPES = frozenset(COMMAND_NAMES)
+VALID_PADDINGS = frozenset((0, 256))  # Common padding values
 
 
 # Configure subprocess to hide console windows when in executable mode
@@ -93,21 +68,49 @@ if is_frozen():
     subprocess.Popen = hidden_popen
 
 class PacketCapture:
-    def __init__(self, interface: str = 'Ethernet', port_range: Tuple[int, int] = (20200, 20300)):
+    def __init__(self, interface: str = 'Ethernet', port_range: Tuple[int, int] = (20200, 20300),
+                 backend: str = 'auto', display_filter: bool = False, restore_state: bool = True,
+                 workers: int = 1, queue_size: int = 256, overflow: str = 'drop_oldest',
+                 persist_processes: int = 0):
         self.interface = interface
         self.port_range = port_range
-        self.packet_data = b""
+        self.backend_name = backend  # "auto", "afpacket", "pcap" or "pyshark"
+        self.display_filter = display_filter  # optional tshark second stage behind the capture filter
+        self._current_backend = None
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
-        self.MAX_BUFFER_SIZE = 1024 * 1024  # 1MB
-        self.expected_packet_length = None
-        self.expected_proto_type = None
+        # Must hold one maximum-size frame plus the head of the next one
+        self.MAX_BUFFER_SIZE = 4 * 1024 * 1024  # 4MB
+        self.reassembler = TcpReassembler(
+            validate=self.validate_packet_header,
+            max_buffer_size=self.MAX_BUFFER_SIZE
+        )
+        # Decoding and handlers run on worker threads so the sniff loop never waits
+        # on disk or reloads; workers=0 handles frames inline on the capture thread
+        self.frame_pool = None
+        if workers > 0:
+            self.frame_pool = FrameWorkerPool(
+                self.handle_packet,
+                workers=workers,
+                queue_size=queue_size,
+                overflow=overflow,
+                processes=persist_processes
+            )
+        self.pipeline_metrics = PipelineMetrics()
+        # Recent frames for debugging, instead of logging every frame
+        self.flight_recorder = FlightRecorder()
         self.running = False  # Initialize as False first
         self.capture_thread = None
+        self._dispatch = {}
+        self._shards = {}
+        self._outbound = False
+        # Set while replaying: nothing may be dropped, handing work to processes included
+        self._blocking = False
+        self.capture_info = {}
         self.STATE_FILE = get_capture_state_file()
         
         # Restore state - keep track of what the previous state was
-        self.saved_state = self._restore_state()
+        self.saved_state = self._restore_state() if restore_state else {"running": False}
         self.was_running_before = self.saved_state.get('running', False)
         
         # Automatically restore previous capture state
@@ -135,14 +138,64 @@ class PacketCapture:
         """Return whether capture should auto-start based on previous state"""
         return self.was_running_before
 
-    def parse_proto(self, packet_data, proto_type):
+    @property
+    def capture_info(self) -> dict:
+        """Handlers keyed by proto_type; values are a callable or a list of callables"""
+        return self._capture_info
+
+    @capture_info.setter
+    def capture_info(self, capture_info: dict) -> None:
+        self._capture_info = capture_info
+        self._build_dispatch()
+
+    def _build_dispatch(self) -> None:
+        """Map each subscribed proto_type to its message class and handler list"""
+        dispatch = {}
+        for proto_type, handlers in (self._capture_info or {}).items():
+            if callable(handlers) or isinstance(handlers, ProcessHandler):
+                handlers = [handlers]
+            message_class = self._message_class(proto_type)
+            if message_class is None:
+                self.logger.warning(f"No message class for subscribed packet {COMMAND_NAMES.get(proto_type, proto_type)}")
+                continue
+            handlers = list(handlers)
+            # Such frames need no decoding in this process when a process pool runs them
+            process_only = all(isinstance(handler, ProcessHandler) for handler in handlers)
+            dispatch[proto_type] = (message_class, handlers, process_only)
+        self._dispatch = dispatch
+        # Handlers bound to the same object see their frames in capture order,
+        # e.g. a client request and the server response that answers it
+        shards, owners = {}, {}
+        for proto_type, (_, handlers, _) in dispatch.items():
+            for handler in handlers:
+                owner = getattr(getattr(handler, 'fn', handler), '__self__', None)
+                if owner is not None:
+                    shards[proto_type] = owners.setdefault(id(owner), proto_type)
+                    break
+        self._shards = shards
+        # Client requests are only captured when someone subscribed to one
+        self._outbound = any(COMMAND_NAMES[proto_type].startswith("C2S_") for proto_type in dispatch)
+        if dispatch:
+            report = proto_registry.report()
+            self.logger.info(
+                f"Proto modules loaded: {report['modules_loaded']}/{report['modules_available']} "
+                f"({report['index_ms'] + report['load_ms']:.1f} ms)"
+            )
+
+    @staticmethod
+    def _message_class(proto_type):
+        command_name = COMMAND_NAMES.get(proto_type)
+        if command_name is None:
+            return None
+        # Message classes are named after the command: SS2C_* for server packets, SC2S_* for client ones
+        return proto_registry.get("S" + command_name)
+
+    def parse_proto(self, packet_data, proto_type, message_class=None):
         data = packet_data[8:]
 
-        command_name = _PacketCommand_pb2.PacketCommand.Name(proto_type)
-
         try:
-            # For server packets
-            message_class = globals().get("S" + command_name)
+            if message_class is None:
+                message_class = self._message_class(proto_type)
             if message_class:
                 message = message_class()
                 message.ParseFromString(data)
@@ -166,65 +219,65 @@ class PacketCapture:
         valid_packet_range = (8, 2 * 1024 * 1024)  # Between 100 bytes and 2MB
         return (
             valid_packet_range[0] <= length <= valid_packet_range[1] and
-            proto_type in _PacketCommand_pb2.PacketCommand.values() and 
-            padding in [0, 256]  # Common padding values
+            proto_type in VALID_PROTO_TYPES and
+            padding in VALID_PADDINGS
         )
 
-    def process_packet(self, data: bytes) -> Optional[bool]:
+    def process_packet(self, data: bytes, stream_key=None, seq: Optional[int] = None,
+                       block: Optional[bool] = None) -> Optional[bool]:
+        """
+        Feed a TCP payload into the reassembler and handle every completed frame.
+
+        Args:
+            data: TCP payload bytes
+            stream_key: Identifier of the TCP stream, normally its 4-tuple
+            seq: TCP sequence number of the first payload byte, if known
+            block: Wait for room in the frame queue instead of applying its overflow policy
+        """
         if len(data) > 0:
-            # Add incoming data to buffer
-            self.packet_data += data
-            current_size = len(self.packet_data)
-            
-            # Reset if buffer gets too large
-            if current_size > self.MAX_BUFFER_SIZE:
-                self.logger.warning(f"Buffer exceeded max size ({self.MAX_BUFFER_SIZE} bytes)")
-                self.reset_state()
-                return False
-
-            # Try to parse/validate header
-            if self.expected_packet_length is None and current_size >= 8:
-                try:
-                    packet_length, proto_type, random_padding = struct.unpack('<IHH', self.packet_data[:8])
-                    
-                    # Get packet type name from _PacketCommand_pb2 before validation
-                    packet_type_name = _PacketCommand_pb2._PACKETCOMMAND.values_by_number[proto_type].name if proto_type in _PacketCommand_pb2._PACKETCOMMAND.values_by_number else "Unknown"
-                    
-                    if not self.validate_packet_header(packet_length, proto_type, random_padding):
-                        self.logger.warning(f"Invalid packet: {packet_type_name} (Type={proto_type}, Length={packet_length}, Padding={random_padding})")
-                        self.reset_state()
-                        return False
-                    
-                    self.logger.info(f"New packet: {packet_type_name} (Type={proto_type}, Length={packet_length}, Padding={random_padding})")
-                    
-                    self.expected_packet_length = packet_length
-                    self.expected_proto_type = proto_type
-                except struct.error:
-                    self.reset_state()
-                    return False
-
-            # Process packet data
-            if self.expected_packet_length and self.expected_proto_type:
-                # Handle overflow by trimming
-                if current_size > self.expected_packet_length:
-                    self.logger.info(f"Trimming overflow {current_size} -> {self.expected_packet_length}")
-                    self.packet_data = self.packet_data[:self.expected_packet_length]
-                    current_size = self.expected_packet_length
-
-                # Complete packet
-                if current_size == self.expected_packet_length:
-                    self.handle_packet(self.packet_data, self.expected_proto_type)
-                    self.reset_state()
-                # Progress update
-                elif current_size % 8192 == 0:
-                    self.logger.info(f"Accumulating: {current_size}/{self.expected_packet_length}")
+            self.pipeline_metrics.record_segment(len(data))
+            for proto_type, frame, started in self.reassembler.feed(stream_key, data, seq):
+                if self.frame_pool is not None:
+                    if proto_type in self._dispatch:
+                        if not self.frame_pool.submit(proto_type, frame, block=block, started=started,
+                                                      shard=self._shards.get(proto_type)):
+                            self.flight_recorder.record(proto_type, COMMAND_NAMES[proto_type], len(frame),
+                                                        flight_recorder.DROPPED, started)
+                    else:
+                        self.handle_packet(frame, proto_type, started)
+                else:
+                    self.handle_packet(frame, proto_type, started)
         return False
 
+    def metrics(self) -> dict:
+        """Snapshot of pipeline counters and latency histograms"""
+        reassembler = self.reassembler
+        data = self.pipeline_metrics
+        return {
+            "running": self.running,
+            "backend": self._current_backend.name if self._current_backend is not None else None,
+            "segments": data.segments,
+            "bytes": data.bytes,
+            "reassembly": {
+                "frames": reassembler.frames_extracted,
+                "invalid_headers": reassembler.invalid_headers,
+                "buffer_resets": reassembler.buffer_resets,
+                "dropped_segments": reassembler.dropped_segments,
+                "pending_bytes": reassembler.pending_bytes(),
+                "streams": len(reassembler.streams),
+            },
+            "frames_handled": data.frames_handled,
+            "frames_unsubscribed": data.frames_unsubscribed,
+            "handler_errors": data.handler_errors,
+            "parse_failures": dict(data.parse_failures),
+            "queue": self.frame_pool.stats() if self.frame_pool is not None else None,
+            "frame_latency_seconds": data.frame_latency.snapshot(),
+            "handler_seconds": data.handler_time.snapshot(),
+        }
+
     def reset_state(self) -> None:
         """Reset all packet processing state"""
-        self.packet_data = b""
-        self.expected_packet_length = None
-        self.expected_proto_type = None
+        self.reassembler.reset()
 
     def _save_state(self, running: bool):
         """Save capture state to persistent storage"""
@@ -235,8 +288,7 @@ class PacketCapture:
                 "interface": self.interface,
                 "port_range": self.port_range
             }
-            with open(self.STATE_FILE, "w") as f:
-                json.dump(state, f, indent=2)
+            writer.write(self.STATE_FILE, json.dumps(state, indent=2))
             self.logger.info(f"Saved capture state: running={running}")
         except Exception as e:
             self.logger.error(f"Failed to save capture state: {e}")
@@ -255,42 +307,25 @@ class PacketCapture:
     def capture_loop(self) -> None:
         """Main capture loop that runs in a separate thread"""
         try:
-            # Set up event loop for this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
             local_ip = self.get_local_ip()
             if not local_ip:
                 self.logger.error(f"Could not find IP address for interface {self.interface}")
                 return
-                
-            display_filter = (f'ip.dst == {local_ip} and '
-                              f'tcp.srcport >= {self.port_range[0]} and '
-                              f'tcp.srcport <= {self.port_range[1]}')
-            
+
             self.logger.info(f"Starting capture on interface: {self.interface}, IP: {local_ip}")
-            self.logger.info(f"Display filter: {display_filter}")
-            
-            # Store capture object as instance variable for cleanup
-            try:
-                self._current_capture = pyshark.LiveCapture(
-                    interface=self.interface,
-                    display_filter=display_filter
-                )
-                self._current_loop = loop
-            except Exception as e:
-                self.logger.error(f"Failed to create LiveCapture: {e}")
-                # Check if this is a tshark/executable issue
-                if "tshark" in str(e).lower():
-                    self.logger.error("This appears to be a tshark-related issue. Make sure tshark is properly installed and accessible.")
-                raise
-            
+
+            # Store backend as instance variable for cleanup
+            self._current_backend = open_backend(
+                self.backend_name, self.interface, local_ip, self.port_range,
+                display_filter=self.display_filter, outbound=self._outbound
+            )
+            self.logger.info(f"Using capture backend: {self._current_backend.name}")
+
             try:
-                for packet in self._current_capture.sniff_continuously():
+                for stream_key, seq, payload in self._current_backend.segments():
                     if not self.running:
                         break
-                    if 'TCP' in packet and hasattr(packet.tcp, 'payload'):
-                        self.process_packet(packet.tcp.payload.binary_value)
+                    self.process_packet(payload, stream_key, seq)
             except Exception as e:
                 self.logger.error(f"Capture loop error: {e}")
                 # Log additional details for debugging
@@ -307,66 +342,6 @@ class PacketCapture:
                 self._cleanup_capture()
             except:
                 pass
-            
-    def _cleanup_capture(self):
-        """Clean up capture resources properly"""
-        try:
-            if hasattr(self, '_current_capture'):
-                # Try to close synchronously first
-                try:
-                    if hasattr(self._current_capture, 'close'):
-                        self._current_capture.close()
-                except Exception:
-                    # If sync close fails, try async approach
-                    try:
-                        # Check if we have an event loop and it's not running
-                        if hasattr(self, '_current_loop') and not self._current_loop.is_closed():
-                            if not self._current_loop.is_running():
-                                if hasattr(self._current_capture, 'close_async'):
-                                    # Always create a new task and ensure it's awaited
-                                    future = asyncio.ensure_future(
-                                        self._current_capture.close_async(), 
-                                        loop=self._current_loop
-                                    )
-                                    self._current_loop.run_until_complete(future)
-                        else:
-                            # Create new loop for cleanup
-                            cleanup_loop = asyncio.new_event_loop()
-                            asyncio.set_event_loop(cleanup_loop)
-                            if hasattr(self._current_capture, 'close_async'):
-                                # Wrap in a future and await it properly
-                                future = asyncio.ensure_future(
-                                    self._current_capture.close_async(), 
-                                    loop=cleanup_loop
-                                )
-                                cleanup_loop.run_until_complete(future)
-                            cleanup_loop.close()
-                    except Exception as e:
-                        self.logger.warning(f"Could not close capture async: {e}")
-                
-                # Make sure the reference is deleted
-                del self._current_capture
-                
-                # Clean up the event loop
-                if hasattr(self, '_current_loop'):
-                    try:
-                        if not self._current_loop.is_closed():
-                            # Cancel all running tasks
-                            pending = asyncio.all_tasks(self._current_loop) if hasattr(asyncio, 'all_tasks') else []
-                            for task in pending:
-                                task.cancel()
-                            if pending:
-                                self._current_loop.run_until_complete(
-                                    asyncio.gather(*pending, return_exceptions=True)
-                                )
-                            self._current_loop.close()
-                    except Exception as e:
-                        self.logger.warning(f"Error closing event loop: {e}")
-                    del self._current_loop
-        except Exception as e:
-            self.logger.error(f"Error during capture cleanup: {e}")
-        finally:
-            self.reset_state()
 
     def shutdown(self):
         """Properly shutdown capture and save state"""
@@ -385,56 +360,75 @@ class PacketCapture:
                 self.logger.info("Capture shutdown complete")
             else:
                 self.logger.info("Capture was already stopped, no action needed for shutdown")
+            if self.frame_pool is not None:
+                self.frame_pool.stop()
         except Exception as e:
             self.logger.error(f"Error during capture shutdown: {e}")
 
     
+    def replay(self, path: str, realtime: bool = False) -> dict:
+        """
+        Run recorded pcap/pcapng traffic through the capture pipeline.
+
+        Args:
+            path: Capture file, or directory of capture files replayed in name order
+            realtime: If True, keep the original spacing between packets
+
+        Returns:
+            Throughput statistics for the replay
+        """
+        backend = PcapFileBackend(path, self.port_range, realtime=realtime, outbound=self._outbound)
+        self.reset_state()
+        frames_before = self.reassembler.frames_extracted
+        segments = 0
+        payload_bytes = 0
+
+        start_time = time.perf_counter()
+        backend.open()
+        self._blocking = True
+        try:
+            for stream_key, seq, payload in backend.segments():
+                segments += 1
+                payload_bytes += len(payload)
+                self.process_packet(payload, stream_key, seq, block=True)
+            if self.frame_pool is not None:
+                self.frame_pool.join()
+        finally:
+            self._blocking = False
+            backend.close()
+        elapsed = time.perf_counter() - start_time
+
+        frames = self.reassembler.frames_extracted - frames_before
+        stats = {
+            "files": len(backend.files),
+            "packets": backend.packets_read,
+            "segments": segments,
+            "frames": frames,
+            "bytes": backend.bytes_read,
+            "payload_bytes": payload_bytes,
+            "seconds": elapsed,
+            "packets_per_sec": backend.packets_read / elapsed if elapsed else 0.0,
+            "frames_per_sec": frames / elapsed if elapsed else 0.0,
+            "mb_per_sec": backend.bytes_read / elapsed / (1024 * 1024) if elapsed else 0.0,
+        }
+        self.logger.info(
+            f"Replayed {stats['packets']} packets ({stats['bytes'] / 1024 / 1024:.2f} MB) "
+            f"-> {frames} frames in {elapsed:.2f}s: {stats['packets_per_sec']:.0f} packets/s, "
+            f"{stats['frames_per_sec']:.0f} frames/s, {stats['mb_per_sec']:.2f} MB/s"
+        )
+        return stats
+
     def _cleanup_capture(self):
         """Clean up capture resources properly"""
         try:
-            if hasattr(self, '_current_capture'):
-                # Try to close synchronously first
-                try:
-                    if hasattr(self._current_capture, 'close'):
-                        self._current_capture.close()
-                except Exception:
-                    # If sync close fails, try async approach
-                    try:
-                        # Check if we have an event loop and it's not running
-                        if hasattr(self, '_current_loop') and not self._current_loop.is_closed():
-                            if not self._current_loop.is_running():
-                                if hasattr(self._current_capture, 'close_async'):
-                                    # Always create a new task and ensure it's awaited
-                                    self._current_loop.run_until_complete(
-                                        self._current_capture.close_async()
-                                    )
-                            pending = asyncio.all_tasks(loop=self._current_loop)
-                            for task in pending:
-                                task.cancel()
-                            if pending:
-                                self._current_loop.run_until_complete(
-                                    asyncio.gather(*pending, return_exceptions=True)
-                                )
-                            self._current_loop.close()
-                    except Exception as e:
-                        self.logger.warning(f"Error closing event loop: {e}")
-                    del self._current_loop
+            backend, self._current_backend = self._current_backend, None
+            if backend is not None:
+                backend.close()
         except Exception as e:
             self.logger.error(f"Error during capture cleanup: {e}")
         finally:
             self.reset_state()
 
-            # ——————————————————————
-            # Delete all leftover .pcapng files
-            temp_dir = tempfile.gettempdir()
-            for pcap in glob.glob(os.path.join(temp_dir, '*.pcapng')):
-                try:
-                    os.remove(pcap)
-                    self.logger.info(f"Deleted temp capture file: {pcap}")
-                except Exception as e:
-                    self.logger.warning(f"Could not delete {pcap}: {e}")
-            # ——————————————————————
-
     def start_capture_switch(self) -> None:
         """Start packet capture in background thread if not already running."""
         if self.capture_thread is not None and self.capture_thread.is_alive():
@@ -477,27 +471,85 @@ class PacketCapture:
         self.logger.info("Capture switch turned OFF")
 
     def _process_packet_wrapper(self, packet):
-        if 'TCP' in packet and hasattr(packet.tcp, 'payload'):
-            self.process_packet(packet.tcp.payload.binary_value)
+        segment = PysharkBackend.segment_from_packet(packet)
+        if segment is not None:
+            stream_key, seq, payload = segment
+            self.process_packet(payload, stream_key, seq)
     
-    def handle_packet(self, packet_data, proto_type):
-        name = _PacketCommand_pb2.PacketCommand.Name(proto_type)
-        if self.capture_info:
-            message = self.parse_proto(packet_data, proto_type)
-            if proto_type in self.capture_info:
-                self.logger.info(f"Parsing: {name} {proto_type}")
-                if message:
-                    self.capture_info[proto_type](message)
+    def handle_packet(self, packet_data, proto_type, started: Optional[float] = None):
+        entry = self._dispatch.get(proto_type)
+        if entry is None:
+            # Nobody subscribed: skip without deserializing
+            self.pipeline_metrics.record_unsubscribed()
+            self.flight_recorder.record(proto_type, COMMAND_NAMES.get(proto_type), len(packet_data),
+                                        flight_recorder.UNSUBSCRIBED, started)
+            return
+        handle_start = time.monotonic()
+        if started is None:
+            started = handle_start
+        message_class, handlers, process_only = entry
+        command = COMMAND_NAMES[proto_type]
+        offload = self.frame_pool is not None and self.frame_pool.processes > 0
+        message = None
+        if not (offload and process_only):
+            # Frames only handled in worker processes are decoded there instead
+            message = self.parse_proto(packet_data, proto_type, message_class)
+            if not message:
+                self.pipeline_metrics.record_parse_failure(command)
+                self.flight_recorder.record(proto_type, command, len(packet_data), flight_recorder.PARSE_FAILED, started)
+                self.logger.warning(f"Invalid Packet: {command}")
+                return
+        error = True
+        dropped = False
+        try:
+            for handler in handlers:
+                if isinstance(handler, ProcessHandler):
+                    if offload:
+                        if not self.frame_pool.run_in_process(handler.fn, "S" + command, packet_data,
+                                                              block=self._blocking or None):
+                            dropped = True
+                    else:
+                        handler.fn(message)
                 else:
-                    self.logger.warning("Invalid Packet")
+                    handler(message)
+            error = False
+        finally:
+            end = time.monotonic()
+            self.pipeline_metrics.record_handled(end - started, end - handle_start, error)
+            if error:
+                outcome = flight_recorder.HANDLER_ERROR
+            elif dropped:
+                outcome = flight_recorder.DROPPED
             else:
-                self.logger.info(f"No handle for: {name} {proto_type}")
-                if message:
-                    self.logger.info("Valid Packet")
-                else:
-                    self.logger.warning("Invalid Packet")
+                outcome = flight_recorder.HANDLED
+            self.flight_recorder.record(proto_type, command, len(packet_data), outcome, started)
+
+def replay_main(argv):
+    """
+    Replay recorded captures: capture.py --replay <file|dir> [--realtime] [--import] [--processes N]
+
+    With --import, character packets are saved to the data directory,
+    in N worker processes when --processes is given.
+    """
+    from src.models.character import save_packet_data
+    path = argv[argv.index("--replay") + 1]
+    processes = int(argv[argv.index("--processes") + 1]) if "--processes" in argv else 0
+    capture = PacketCapture(restore_state=False, persist_processes=processes)
+    capture_info = {}
+    if "--import" in argv:
+        # JSON conversion and file writes are CPU heavy, so they can run in worker processes
+        capture_info[_PacketCommand_pb2.PacketCommand.S2C_LOBBY_CHARACTER_INFO_RES] = ProcessHandler(save_packet_data)
+    capture.capture_info = capture_info
+    stats = capture.replay(path, realtime="--realtime" in argv)
+    stats["frame_pool"] = capture.frame_pool.stats()
+    capture.frame_pool.stop()
+    print(json.dumps(stats, indent=2))
 
 def main():
+    if "--replay" in sys.argv:
+        replay_main(sys.argv)
+        return
+
     from src.models.character import policy
     capture = PacketCapture()
     capture_info = {
@@ -0,0 +1,740 @@
+import os
+import sys
+import glob
+import socket
+import struct
+import asyncio
+import tempfile
+import logging
+import ctypes
+import ctypes.util
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+from .pcap_file import list_capture_files, read_capture_file
+
+logger = logging.getLogger(__name__)
+
+# (src_ip, src_port, dst_ip, dst_port), tcp sequence number, tcp payload
+Segment = Tuple[Tuple[str, int, str, int], Optional[int], bytes]
+
+ETH_P_IP = 0x0800
+ETH_P_8021Q = 0x8100
+IPPROTO_TCP = 6
+
+# libpcap link-layer header types
+DLT_NULL = 0
+DLT_EN10MB = 1
+DLT_RAW = 12
+DLT_RAW_OPENBSD = 14
+DLT_LOOP = 108
+DLT_LINUX_SLL = 113
+DLT_IPV4 = 228
+DLT_LINUX_SLL2 = 276
+
+
+# Linux socket option and classic BPF opcodes used by the AF_PACKET filter
+SO_ATTACH_FILTER = 26
+BPF_LDB_ABS = 0x30   # A = byte at [k]
+BPF_LDH_ABS = 0x28   # A = half-word at [k]
+BPF_LDW_ABS = 0x20   # A = word at [k]
+BPF_LDH_IND = 0x48   # A = half-word at [X + k]
+BPF_LDXB_MSH = 0xb1  # X = 4 * ([k] & 0xf)
+BPF_JEQ = 0x15
+BPF_JGE = 0x35
+BPF_JGT = 0x25
+BPF_JSET = 0x45
+BPF_RET = 0x06
+
+
+def build_bpf_filter(local_ip: Optional[str], port_range: Tuple[int, int], outbound: bool = False) -> str:
+    """
+    Return a pcap capture filter matching game server traffic to the local IP.
+
+    Args:
+        outbound: Also match client requests sent from the local IP to the game server
+    """
+    ports = f"{port_range[0]}-{port_range[1]}"
+    if not local_ip:
+        return f"tcp portrange {ports}" if outbound else f"tcp and src portrange {ports}"
+    if outbound:
+        return (f"tcp and ((dst host {local_ip} and src portrange {ports}) or "
+                f"(src host {local_ip} and dst portrange {ports}))")
+    return f"tcp and dst host {local_ip} and src portrange {ports}"
+
+
+def compile_ip_bpf(local_ip: str, port_range: Tuple[int, int], outbound: bool = False):
+    """
+    Hand-assemble the capture filter as a classic BPF program.
+
+    The program expects packets to start at the IPv4 header, as delivered to
+    SOCK_DGRAM packet sockets, and accepts unfragmented TCP packets whose
+    destination is local_ip and source port lies in port_range. With
+    outbound, packets from local_ip to a port in port_range are accepted too.
+
+    Returns:
+        List of (code, jt, jf, k) instructions
+    """
+    ip = struct.unpack('!I', socket.inet_aton(local_ip))[0]
+    if outbound:
+        return [
+            (BPF_LDB_ABS, 0, 0, 9),              # 0: A = ip protocol
+            (BPF_JEQ, 0, 13, IPPROTO_TCP),       # 1: tcp? else drop
+            (BPF_LDH_ABS, 0, 0, 6),              # 2: A = flags/fragment offset
+            (BPF_JSET, 11, 0, 0x3FFF),           # 3: fragment? drop
+            (BPF_LDXB_MSH, 0, 0, 0),             # 4: X = ip header length
+            (BPF_LDW_ABS, 0, 0, 16),             # 5: A = ip dst
+            (BPF_JEQ, 0, 3, ip),                 # 6: to local ip? else try outbound
+            (BPF_LDH_IND, 0, 0, 0),              # 7: A = tcp src port
+            (BPF_JGE, 0, 1, port_range[0]),      # 8: port >= low? else try outbound
+            (BPF_JGT, 0, 6, port_range[1]),      # 9: port <= high? accept, else try outbound
+            (BPF_LDW_ABS, 0, 0, 12),             # 10: A = ip src
+            (BPF_JEQ, 0, 3, ip),                 # 11: from local ip? else drop
+            (BPF_LDH_IND, 0, 0, 2),              # 12: A = tcp dst port
+            (BPF_JGE, 0, 1, port_range[0]),      # 13: port >= low? else drop
+            (BPF_JGT, 0, 1, port_range[1]),      # 14: port > high? drop, else accept
+            (BPF_RET, 0, 0, 0),                  # 15: drop
+            (BPF_RET, 0, 0, 0x40000),            # 16: accept whole packet
+        ]
+    return [
+        (BPF_LDB_ABS, 0, 0, 9),              # 0: A = ip protocol
+        (BPF_JEQ, 0, 8, IPPROTO_TCP),        # 1: tcp? else drop
+        (BPF_LDW_ABS, 0, 0, 16),             # 2: A = ip dst
+        (BPF_JEQ, 0, 6, ip),                 # 3: local ip? else drop
+        (BPF_LDH_ABS, 0, 0, 6),              # 4: A = flags/fragment offset
+        (BPF_JSET, 4, 0, 0x3FFF),            # 5: fragment? drop
+        (BPF_LDXB_MSH, 0, 0, 0),             # 6: X = ip header length
+        (BPF_LDH_IND, 0, 0, 0),              # 7: A = tcp src port
+        (BPF_JGE, 0, 1, port_range[0]),      # 8: port >= low? else drop
+        (BPF_JGT, 0, 1, port_range[1]),      # 9: port > high? drop, else accept
+        (BPF_RET, 0, 0, 0),                  # 10: drop
+        (BPF_RET, 0, 0, 0x40000),            # 11: accept whole packet
+    ]
+
+
+def ip_offset(linktype: int, frame) -> Optional[int]:
+    """Return the offset of the IPv4 header in a link-layer frame, or None if it is not IPv4"""
+    if linktype == DLT_EN10MB:
+        if len(frame) < 14:
+            return None
+        ethertype = (frame[12] << 8) | frame[13]
+        offset = 14
+        while ethertype == ETH_P_8021Q and len(frame) >= offset + 4:
+            ethertype = (frame[offset + 2] << 8) | frame[offset + 3]
+            offset += 4
+        return offset if ethertype == ETH_P_IP else None
+    if linktype in (DLT_NULL, DLT_LOOP):
+        # 4-byte address family in host (NULL) or network (LOOP) byte order
+        if len(frame) < 4:
+            return None
+        return 4 if socket.AF_INET in (frame[0], frame[3]) else None
+    if linktype in (DLT_RAW, DLT_RAW_OPENBSD, DLT_IPV4):
+        return 0
+    if linktype == DLT_LINUX_SLL:
+        if len(frame) < 16:
+            return None
+        return 16 if ((frame[14] << 8) | frame[15]) == ETH_P_IP else None
+    if linktype == DLT_LINUX_SLL2:
+        if len(frame) < 20:
+            return None
+        return 20 if ((frame[0] << 8) | frame[1]) == ETH_P_IP else None
+    return None
+
+
+def parse_ipv4_tcp(packet, offset: int = 0) -> Optional[Tuple[bytes, int, bytes, int, int, memoryview]]:
+    """
+    Parse the IPv4 and TCP headers of a packet.
+
+    Returns:
+        (src_addr, src_port, dst_addr, dst_port, seq, payload) with packed
+        4-byte addresses, or None if the packet is not an unfragmented
+        IPv4/TCP packet
+    """
+    if len(packet) - offset < 20:
+        return None
+    version_ihl = packet[offset]
+    if version_ihl >> 4 != 4 or packet[offset + 9] != IPPROTO_TCP:
+        return None
+    # Skip fragments; the game never relies on IP fragmentation
+    if struct.unpack_from('!H', packet, offset + 6)[0] & 0x3FFF:
+        return None
+    ihl = (version_ihl & 0x0F) * 4
+    total_length = struct.unpack_from('!H', packet, offset + 2)[0]
+    end = min(offset + total_length, len(packet))
+    tcp = offset + ihl
+    if end - tcp < 20:
+        return None
+    src_port, dst_port, seq = struct.unpack_from('!HHI', packet, tcp)
+    payload_start = tcp + (packet[tcp + 12] >> 4) * 4
+    return (
+        bytes(packet[offset + 12:offset + 16]), src_port,
+        bytes(packet[offset + 16:offset + 20]), dst_port,
+        seq, memoryview(packet)[payload_start:end]
+    )
+
+
+class CaptureBackend:
+    """
+    Source of TCP segments for PacketCapture.
+
+    Backends deliver segments sent from the game server port range to the
+    local IP, as (stream_key, seq, payload) tuples. With outbound, segments
+    the local IP sends to the game server are delivered as well.
+    """
+    name = "base"
+
+    def __init__(self, interface: str, local_ip: Optional[str], port_range: Tuple[int, int],
+                 display_filter: bool = False, outbound: bool = False):
+        self.interface = interface
+        self.local_ip = local_ip
+        self.port_range = port_range
+        # Filtering happens in the kernel/driver; display_filter only adds an
+        # optional second userspace stage for backends that support one
+        self.display_filter = display_filter
+        self.outbound = outbound
+        self.bpf_filter = build_bpf_filter(local_ip, port_range, outbound)
+        self._local_ip_packed = socket.inet_aton(local_ip) if local_ip else None
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """Return whether this backend can be used on the current system"""
+        return False
+
+    def open(self) -> None:
+        raise NotImplementedError
+
+    def segments(self) -> Iterator[Segment]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def _segment_from_ip(self, packet, offset: int) -> Optional[Segment]:
+        parsed = parse_ipv4_tcp(packet, offset)
+        if parsed is None:
+            return None
+        src, src_port, dst, dst_port, seq, payload = parsed
+        if not payload:
+            return None
+        low, high = self.port_range
+        local = self._local_ip_packed
+        inbound = low <= src_port <= high and (local is None or dst == local)
+        if not inbound and not (self.outbound and low <= dst_port <= high and (local is None or src == local)):
+            return None
+        key = (socket.inet_ntoa(src), src_port, socket.inet_ntoa(dst), dst_port)
+        return key, seq, payload
+
+
+class AfPacketBackend(CaptureBackend):
+    """Linux raw socket capture; the kernel hands over IP packets without any dissection"""
+    name = "afpacket"
+
+    def __init__(self, interface: str, local_ip: str, port_range: Tuple[int, int], **options):
+        super().__init__(interface, local_ip, port_range, **options)
+        self.sock = None
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return hasattr(socket, 'AF_PACKET')
+
+    def open(self) -> None:
+        # SOCK_DGRAM strips the link-layer header, so every packet starts at the IP header.
+        # The socket is created without a protocol so nothing is queued before the filter is attached.
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, 0)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        self._attach_filter()
+        self.sock.bind((self.interface, ETH_P_IP))
+        # Periodic timeout so the capture loop can notice it was stopped
+        self.sock.settimeout(0.5)
+
+    def _attach_filter(self) -> None:
+        program = compile_ip_bpf(self.local_ip, self.port_range, self.outbound)
+        insns = b"".join(struct.pack('HBBI', *insn) for insn in program)
+        self._filter_buffer = ctypes.create_string_buffer(insns, len(insns))
+        fprog = struct.pack('HL', len(program), ctypes.addressof(self._filter_buffer))
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+        logger.info(f"Attached kernel capture filter: {self.bpf_filter}")
+
+    def segments(self) -> Iterator[Segment]:
+        while self.sock is not None:
+            try:
+                packet = self.sock.recv(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self.sock is None:
+                    break
+                raise
+            segment = self._segment_from_ip(packet, 0)
+            if segment is not None:
+                yield segment
+
+    def close(self) -> None:
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            sock.close()
+
+
+class _PcapPkthdr(ctypes.Structure):
+    _fields_ = [
+        ("tv_sec", ctypes.c_long),
+        ("tv_usec", ctypes.c_long),
+        ("caplen", ctypes.c_uint32),
+        ("len", ctypes.c_uint32),
+    ]
+
+
+class _BpfProgram(ctypes.Structure):
+    _fields_ = [
+        ("bf_len", ctypes.c_uint),
+        ("bf_insns", ctypes.c_void_p),
+    ]
+
+
+PCAP_NETMASK_UNKNOWN = 0xFFFFFFFF
+
+
+class _Sockaddr(ctypes.Structure):
+    _fields_ = [
+        ("sa_family", ctypes.c_uint16),
+        ("sa_data", ctypes.c_ubyte * 14),
+    ]
+
+
+class _PcapAddr(ctypes.Structure):
+    pass
+
+
+_PcapAddr._fields_ = [
+    ("next", ctypes.POINTER(_PcapAddr)),
+    ("addr", ctypes.POINTER(_Sockaddr)),
+    ("netmask", ctypes.POINTER(_Sockaddr)),
+    ("broadaddr", ctypes.POINTER(_Sockaddr)),
+    ("dstaddr", ctypes.POINTER(_Sockaddr)),
+]
+
+
+class _PcapIf(ctypes.Structure):
+    pass
+
+
+_PcapIf._fields_ = [
+    ("next", ctypes.POINTER(_PcapIf)),
+    ("name", ctypes.c_char_p),
+    ("description", ctypes.c_char_p),
+    ("addresses", ctypes.POINTER(_PcapAddr)),
+    ("flags", ctypes.c_uint32),
+]
+
+_pcap_lib = None
+
+
+def load_pcap():
+    """Load libpcap (or Npcap's wpcap.dll on Windows), returning None if it is not installed"""
+    global _pcap_lib
+    if _pcap_lib is not None:
+        return _pcap_lib or None
+    lib = None
+    try:
+        if sys.platform == 'win32':
+            npcap_dir = os.path.join(os.environ.get('SystemRoot', r'C:\Windows'), 'System32', 'Npcap')
+            if os.path.isdir(npcap_dir):
+                os.add_dll_directory(npcap_dir)
+            lib = ctypes.CDLL('wpcap.dll')
+        else:
+            path = ctypes.util.find_library('pcap')
+            if path:
+                lib = ctypes.CDLL(path)
+    except OSError as e:
+        logger.info(f"libpcap not available: {e}")
+        lib = None
+
+    if lib is not None:
+        lib.pcap_open_live.restype = ctypes.c_void_p
+        lib.pcap_open_live.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_char_p]
+        lib.pcap_next_ex.restype = ctypes.c_int
+        lib.pcap_next_ex.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.POINTER(_PcapPkthdr)),
+                                     ctypes.POINTER(ctypes.POINTER(ctypes.c_ubyte))]
+        lib.pcap_datalink.restype = ctypes.c_int
+        lib.pcap_datalink.argtypes = [ctypes.c_void_p]
+        lib.pcap_close.argtypes = [ctypes.c_void_p]
+        lib.pcap_breakloop.argtypes = [ctypes.c_void_p]
+        lib.pcap_geterr.restype = ctypes.c_char_p
+        lib.pcap_geterr.argtypes = [ctypes.c_void_p]
+        lib.pcap_findalldevs.argtypes = [ctypes.POINTER(ctypes.POINTER(_PcapIf)), ctypes.c_char_p]
+        lib.pcap_freealldevs.argtypes = [ctypes.POINTER(_PcapIf)]
+        lib.pcap_compile.argtypes = [ctypes.c_void_p, ctypes.POINTER(_BpfProgram), ctypes.c_char_p,
+                                     ctypes.c_int, ctypes.c_uint32]
+        lib.pcap_setfilter.argtypes = [ctypes.c_void_p, ctypes.POINTER(_BpfProgram)]
+        lib.pcap_freecode.argtypes = [ctypes.POINTER(_BpfProgram)]
+    _pcap_lib = lib or False
+    return lib
+
+
+class PcapBackend(CaptureBackend):
+    """libpcap/Npcap capture through ctypes, parsing link, IP and TCP headers in Python"""
+    name = "pcap"
+    SNAPLEN = 65535
+    TIMEOUT_MS = 500
+
+    def __init__(self, interface: str, local_ip: str, port_range: Tuple[int, int], **options):
+        super().__init__(interface, local_ip, port_range, **options)
+        self.handle = None
+        self.linktype = None
+        # Guards handle against close() from another thread: while segments()
+        # reads, only the capture thread may pcap_close it
+        self._lock = threading.Lock()
+        self._reading = False
+        self._stopped = False
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return load_pcap() is not None
+
+    def _find_device(self, lib) -> str:
+        """
+        Resolve the pcap device name.
+
+        On Windows, interface names such as "Ethernet" do not match Npcap
+        device names, so the device carrying the local IP is used.
+        """
+        devs = ctypes.POINTER(_PcapIf)()
+        errbuf = ctypes.create_string_buffer(256)
+        if lib.pcap_findalldevs(ctypes.byref(devs), errbuf) != 0:
+            raise OSError(f"pcap_findalldevs failed: {errbuf.value.decode(errors='replace')}")
+        try:
+            dev = devs
+            while dev:
+                name = dev.contents.name.decode()
+                if name == self.interface:
+                    return name
+                addr = dev.contents.addresses
+                while addr:
+                    sa = addr.contents.addr
+                    if sa and self._sockaddr_ip(sa.contents) == self.local_ip:
+                        return name
+                    addr = addr.contents.next
+                dev = dev.contents.next
+        finally:
+            lib.pcap_freealldevs(devs)
+        return self.interface
+
+    @staticmethod
+    def _sockaddr_ip(sa: _Sockaddr) -> Optional[str]:
+        family = sa.sa_family
+        if sys.platform == 'darwin':
+            # BSD sockaddr starts with a one byte length field
+            family = family >> 8 if sys.byteorder == 'little' else family & 0xFF
+        if family != socket.AF_INET:
+            return None
+        return socket.inet_ntoa(bytes(sa.sa_data[2:6]))
+
+    def open(self) -> None:
+        lib = load_pcap()
+        if lib is None:
+            raise OSError("libpcap is not installed")
+        device = self._find_device(lib)
+        errbuf = ctypes.create_string_buffer(256)
+        self._stopped = False
+        self.handle = lib.pcap_open_live(device.encode(), self.SNAPLEN, 0, self.TIMEOUT_MS, errbuf)
+        if not self.handle:
+            raise OSError(f"pcap_open_live({device}) failed: {errbuf.value.decode(errors='replace')}")
+        self.linktype = lib.pcap_datalink(self.handle)
+        logger.info(f"Opened pcap device {device} (linktype {self.linktype})")
+
+        program = _BpfProgram()
+        if lib.pcap_compile(self.handle, ctypes.byref(program), self.bpf_filter.encode(), 1, PCAP_NETMASK_UNKNOWN) != 0:
+            raise OSError(f"pcap_compile failed: {lib.pcap_geterr(self.handle).decode(errors='replace')}")
+        try:
+            if lib.pcap_setfilter(self.handle, ctypes.byref(program)) != 0:
+                raise OSError(f"pcap_setfilter failed: {lib.pcap_geterr(self.handle).decode(errors='replace')}")
+        finally:
+            lib.pcap_freecode(ctypes.byref(program))
+        logger.info(f"Capture filter: {self.bpf_filter}")
+
+    def segments(self) -> Iterator[Segment]:
+        lib = load_pcap()
+        header = ctypes.POINTER(_PcapPkthdr)()
+        data = ctypes.POINTER(ctypes.c_ubyte)()
+        with self._lock:
+            handle = self.handle
+            if not handle or self._stopped:
+                return
+            self._reading = True
+        try:
+            while not self._stopped:
+                rc = lib.pcap_next_ex(handle, ctypes.byref(header), ctypes.byref(data))
+                if rc == 0:
+                    continue  # read timeout
+                if rc < 0:
+                    # -2 is pcap_breakloop from close()
+                    if rc == -1 and not self._stopped:
+                        raise OSError(f"pcap_next_ex failed: {lib.pcap_geterr(handle).decode(errors='replace')}")
+                    break
+                # The buffer is reused by libpcap, so copy the frame out
+                frame = ctypes.string_at(data, header.contents.caplen)
+                offset = ip_offset(self.linktype, frame)
+                if offset is None:
+                    continue
+                segment = self._segment_from_ip(frame, offset)
+                if segment is not None:
+                    yield segment
+        finally:
+            with self._lock:
+                self._reading = False
+                if self._stopped:
+                    self._close_handle()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self.handle:
+                return
+            self._stopped = True
+            if self._reading:
+                # pcap_next_ex may be using the handle: wake it up (or let the
+                # read timeout expire) and leave pcap_close to the capture thread
+                load_pcap().pcap_breakloop(self.handle)
+                return
+            self._close_handle()
+
+    def _close_handle(self) -> None:
+        """Close the pcap handle; the caller must hold _lock"""
+        handle, self.handle = self.handle, None
+        if handle:
+            load_pcap().pcap_close(handle)
+
+
+class PysharkBackend(CaptureBackend):
+    """tshark-based capture through pyshark; slowest, but works wherever Wireshark is installed"""
+    name = "pyshark"
+
+    def __init__(self, interface: str, local_ip: str, port_range: Tuple[int, int], **options):
+        super().__init__(interface, local_ip, port_range, **options)
+        self.capture = None
+        self.loop = None
+
+    @classmethod
+    def is_available(cls) -> bool:
+        try:
+            import pyshark  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def open(self) -> None:
+        import pyshark
+
+        # pyshark drives tshark through asyncio, so this thread needs its own loop
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        # The capture filter runs in the kernel/driver, so tshark never dissects unrelated traffic
+        display_filter = None
+        if self.display_filter:
+            display_filter = (f'ip.dst == {self.local_ip} and '
+                              f'tcp.srcport >= {self.port_range[0]} and '
+                              f'tcp.srcport <= {self.port_range[1]}')
+            if self.outbound:
+                display_filter = (f'({display_filter}) or (ip.src == {self.local_ip} and '
+                                  f'tcp.dstport >= {self.port_range[0]} and '
+                                  f'tcp.dstport <= {self.port_range[1]})')
+        logger.info(f"Capture filter: {self.bpf_filter}")
+        if display_filter:
+            logger.info(f"Display filter: {display_filter}")
+        try:
+            self.capture = pyshark.LiveCapture(
+                interface=self.interface,
+                bpf_filter=self.bpf_filter,
+                display_filter=display_filter
+            )
+        except Exception as e:
+            logger.error(f"Failed to create LiveCapture: {e}")
+            # Check if this is a tshark/executable issue
+            if "tshark" in str(e).lower():
+                logger.error("This appears to be a tshark-related issue. Make sure tshark is properly installed and accessible.")
+            raise
+
+    def segments(self) -> Iterator[Segment]:
+        for packet in self.capture.sniff_continuously():
+            segment = self.segment_from_packet(packet)
+            if segment is not None:
+                yield segment
+
+    @staticmethod
+    def segment_from_packet(packet) -> Optional[Segment]:
+        """Extract stream key, sequence number and payload from a pyshark packet"""
+        if 'TCP' not in packet or not hasattr(packet.tcp, 'payload'):
+            return None
+        tcp = packet.tcp
+        stream_key = None
+        if 'IP' in packet:
+            stream_key = (packet.ip.src, int(tcp.srcport), packet.ip.dst, int(tcp.dstport))
+        seq = None
+        if hasattr(tcp, 'seq_raw'):
+            seq = int(tcp.seq_raw)
+        elif hasattr(tcp, 'seq'):
+            seq = int(tcp.seq)
+        return stream_key, seq, tcp.payload.binary_value
+
+    def close(self) -> None:
+        capture, self.capture = self.capture, None
+        loop, self.loop = self.loop, None
+        try:
+            if capture is not None:
+                # Try to close synchronously first
+                try:
+                    capture.close()
+                except Exception:
+                    # If sync close fails, close asynchronously on the capture's loop
+                    if loop is not None and not loop.is_closed() and not loop.is_running():
+                        if hasattr(capture, 'close_async'):
+                            loop.run_until_complete(capture.close_async())
+            if loop is not None and not loop.is_closed() and not loop.is_running():
+                pending = asyncio.all_tasks(loop=loop)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                loop.close()
+        except Exception as e:
+            logger.warning(f"Error closing event loop: {e}")
+        finally:
+            # Delete all leftover .pcapng files
+            temp_dir = tempfile.gettempdir()
+            for pcap in glob.glob(os.path.join(temp_dir, '*.pcapng')):
+                try:
+                    os.remove(pcap)
+                    logger.info(f"Deleted temp capture file: {pcap}")
+                except Exception as e:
+                    logger.warning(f"Could not delete {pcap}: {e}")
+
+
+class PcapFileBackend(CaptureBackend):
+    """
+    Replays recorded pcap/pcapng files.
+
+    Packets are delivered as fast as they can be processed, or with their
+    original spacing when realtime is set. Without a local IP, traffic from
+    the port range to any destination is accepted.
+    """
+    name = "file"
+
+    def __init__(self, path: str, port_range: Tuple[int, int], local_ip: Optional[str] = None,
+                 realtime: bool = False, **options):
+        super().__init__(path, local_ip, port_range, **options)
+        self.path = path
+        self.realtime = realtime
+        self.files = []
+        self.packets_read = 0
+        self.bytes_read = 0
+        self._closed = False
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    def open(self) -> None:
+        self.files = list_capture_files(self.path)
+        if not self.files:
+            raise FileNotFoundError(f"No capture files found in {self.path}")
+        self._closed = False
+        logger.info(f"Replaying {len(self.files)} capture file(s) from {self.path}")
+
+    def segments(self) -> Iterator[Segment]:
+        first_ts = None
+        start = time.monotonic()
+        for path in self.files:
+            for ts, linktype, frame in read_capture_file(path):
+                if self._closed:
+                    return
+                self.packets_read += 1
+                self.bytes_read += len(frame)
+                if self.realtime and ts:
+                    if first_ts is None:
+                        first_ts = ts
+                    delay = (ts - first_ts) - (time.monotonic() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+                offset = ip_offset(linktype, frame)
+                if offset is None:
+                    continue
+                segment = self._segment_from_ip(frame, offset)
+                if segment is not None:
+                    yield segment
+
+    def close(self) -> None:
+        self._closed = True
+
+
+BACKENDS = {
+    AfPacketBackend.name: AfPacketBackend,
+    PcapBackend.name: PcapBackend,
+    PysharkBackend.name: PysharkBackend,
+}
+
+# Order tried by "auto": cheapest first
+AUTO_ORDER = (AfPacketBackend, PcapBackend, PysharkBackend)
+
+
+def open_backend(name: str, interface: str, local_ip: str, port_range: Tuple[int, int],
+                 **options) -> CaptureBackend:
+    """
+    Create and open a capture backend.
+
+    Args:
+        name: Backend name from BACKENDS, or "auto" to use the cheapest
+            backend that opens successfully
+        options: Extra backend options such as display_filter
+
+    Raises:
+        ValueError: If the backend name is unknown
+        RuntimeError: If no backend could be opened in "auto" mode
+    """
+    if name != "auto":
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown capture backend: {name}")
+        backend = BACKENDS[name](interface, local_ip, port_range, **options)
+        try:
+            backend.open()
+        except Exception:
+            # Release whatever open() got as far as acquiring
+            backend.close()
+            raise
+        return backend
+
+    errors = []
+    for cls in AUTO_ORDER:
+        if not cls.is_available():
+            continue
+        backend = cls(interface, local_ip, port_range, **options)
+        try:
+            backend.open()
+            return backend
+        except Exception as e:
+            # Typically missing privileges for raw sockets; fall through to the next backend
+            logger.info(f"Capture backend {cls.name} unavailable: {e}")
+            errors.append(f"{cls.name}: {e}")
+            backend.close()
+    raise RuntimeError(f"No capture backend could be opened ({'; '.join(errors) or 'none installed'})")
+
+
+def main():
+    """Sniff loopback with the cheapest backend and print the segments seen"""
+    interface = sys.argv[1] if len(sys.argv) > 1 else 'lo'
+    low = int(sys.argv[2]) if len(sys.argv) > 2 else 20200
+    high = int(sys.argv[3]) if len(sys.argv) > 3 else 20300
+    logging.basicConfig(level=logging.INFO)
+    backend = open_backend("auto", interface, "127.0.0.1", (low, high))
+    print(f"Capturing on {interface} with {backend.name} backend, ports {low}-{high}")
+    try:
+        for key, seq, payload in backend.segments():
+            print(f"{key} seq={seq} len={len(payload)}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
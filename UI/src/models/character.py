@@ -1,8 +1,11 @@
 import os
-from datetime import datetime
-from google.protobuf.json_format import MessageToJson
+from google.protobuf.json_format import MessageToDict
 from networking.protos import _Defins_pb2
 from .appdirs import get_data_dir
+from .snapshot import load_packet_data, save_character_snapshot, snapshot_path
+from .character_history import history
+from .packet_archive import archive
+from .persistence import writer
 import logging
 logger = logging.getLogger(__name__)
 
@@ -14,26 +17,45 @@ def policy(message):
 data_dir = get_data_dir()
 os.makedirs(data_dir, exist_ok=True)
 
+def _record_history(char_id, message):
+    # History is a bonus; failing to record it must not lose the capture
+    try:
+        previous_file = snapshot_path(data_dir, char_id)
+        if not history.has_history(char_id) and os.path.exists(previous_file):
+            # Start the history with the capture this one replaces
+            header, previous = load_packet_data(previous_file)
+            history.record(char_id, previous, header.captured_at)
+        history.record(char_id, MessageToDict(message))
+    except Exception as e:
+        logger.error(f"Failed to record history for {char_id}: {e}")
+
+def _remove_legacy_file(legacy_file):
+    # Only called once the snapshot that replaces it is on disk
+    if os.path.exists(legacy_file):
+        os.remove(legacy_file)
+        logger.info(f"Removed {legacy_file}, replaced by its snapshot")
+
 def save_packet_data(message) -> bool:
     try:
 
-        json_data = MessageToJson(message)
-        # Overwrite file if characterId matches (no date in filename)
-        if '"result": 1' in json_data and '"characterDataBase": {' in json_data:
-            char_data = message.characterDataBase
-            char_id = str(char_data.characterId)
-            data_file = os.path.join(data_dir, f"{char_id}.json")
-            with open(data_file, "w", encoding='utf-8') as f:
-                f.write(json_data)
+        # Overwrite snapshot if characterId matches (no date in filename)
+        fields = message.DESCRIPTOR.fields_by_name
+        if 'characterDataBase' in fields and message.result == 1 and message.HasField('characterDataBase'):
+            char_id = str(message.characterDataBase.characterId)
+            _record_history(char_id, message)
+            # Bursts of captures of one character end up as a single write
+            data_file = save_character_snapshot(data_dir, message, coalesce=True)
+            # The snapshot replaces the JSON file written by older versions,
+            # which is kept until the snapshot has actually been written
+            legacy_file = os.path.join(data_dir, f"{char_id}.json")
+            if os.path.exists(legacy_file):
+                writer.when_written(data_file, lambda: _remove_legacy_file(legacy_file))
             logger.info(f"Saved/updated target packet data to {data_file} (characterId={char_id})")
             return True
 
-        # Save other packets to timestamped files as before
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        data_file = os.path.join(data_dir, f"{timestamp}.json")
-        with open(data_file, "w", encoding='utf-8') as f:
-            f.write(json_data)
-        logger.info(f"Successfully saved packet data to {data_file}")
+        # Other packets go to the packet archive, away from the character files
+        archive.append_message(message)
+        logger.info(f"Archived {message.DESCRIPTOR.name} packet")
         return False
 
     except Exception as e:
@@ -0,0 +1,360 @@
+import os
+import json
+import time
+import zlib
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+HISTORY_EXTENSION = ".hist"
+MAGIC = b"DNDH"
+FORMAT_VERSION = 1
+# A full state is stored after this many deltas, bounding how many deltas
+# have to be replayed to reconstruct any point in time
+KEYFRAME_INTERVAL = 32
+
+KIND_FULL = 0
+KIND_DELTA = 1
+
+_FILE_HEADER = struct.Struct("<4sH")
+# capture time, kind, payload length, payload crc32
+_RECORD = struct.Struct("<dBII")
+
+# Item fields covered by the move and count deltas; any other difference is an update
+_POSITION_FIELDS = ("inventoryId", "slotId")
+_COUNT_FIELD = "itemCount"
+_ITEM_LISTS = ("CharacterItemList", "CharacterStorageInfos")
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Hold an exclusive lock on path's lock file, shared by every process writing path"""
+    with open(path + ".lock", "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def character_state(packet_data: dict) -> dict:
+    """
+    Reduce a character info packet in dict form to the state the history tracks.
+
+    Returns:
+        {"meta": characterDataBase without its item lists,
+         "items": {unique id: item dict including its inventoryId}}
+    """
+    base = packet_data.get("characterDataBase", {})
+    items = {}
+    for item in base.get("CharacterItemList", []):
+        items[str(item.get("itemUniqueId"))] = item
+    for storage in base.get("CharacterStorageInfos", []):
+        for item in storage.get("CharacterStorageItemList", []):
+            if "inventoryId" not in item:
+                item = dict(item, inventoryId=storage.get("inventoryId"))
+            items[str(item.get("itemUniqueId"))] = item
+    meta = {k: v for k, v in base.items() if k not in _ITEM_LISTS}
+    return {"meta": meta, "items": items}
+
+
+def diff_states(old: dict, new: dict) -> dict:
+    """
+    Item-level changes from one state to the next.
+
+    Returns:
+        Only the non-empty parts of {"added": {id: item}, "removed": [id],
+        "moved": {id: [inventoryId, slotId]}, "count": {id: itemCount},
+        "updated": {id: item}, "meta": {field: value or None if removed}}
+    """
+    old_items, new_items = old["items"], new["items"]
+    added = {uid: new_items[uid] for uid in new_items.keys() - old_items.keys()}
+    removed = sorted(old_items.keys() - new_items.keys())
+    moved, count, updated = {}, {}, {}
+    for uid in old_items.keys() & new_items.keys():
+        before, after = old_items[uid], new_items[uid]
+        if before == after:
+            continue
+        ignored = _POSITION_FIELDS + (_COUNT_FIELD,)
+        if ({k: v for k, v in before.items() if k not in ignored}
+                != {k: v for k, v in after.items() if k not in ignored}):
+            updated[uid] = after
+            continue
+        if any(before.get(f) != after.get(f) for f in _POSITION_FIELDS):
+            moved[uid] = [after.get(f) for f in _POSITION_FIELDS]
+        if before.get(_COUNT_FIELD) != after.get(_COUNT_FIELD):
+            count[uid] = after.get(_COUNT_FIELD)
+    meta = {k: new["meta"].get(k) for k in old["meta"].keys() | new["meta"].keys()
+            if old["meta"].get(k) != new["meta"].get(k)}
+    delta = {"added": added, "removed": removed, "moved": moved,
+             "count": count, "updated": updated, "meta": meta}
+    return {k: v for k, v in delta.items() if v}
+
+
+def apply_delta(state: dict, delta: dict) -> dict:
+    """Return the state after delta; the given state is not modified"""
+    items = dict(state["items"])
+    for uid in delta.get("removed", ()):
+        items.pop(uid, None)
+    items.update(delta.get("added", {}))
+    items.update(delta.get("updated", {}))
+    for uid, position in delta.get("moved", {}).items():
+        if uid in items:
+            item = dict(items[uid])
+            for field, value in zip(_POSITION_FIELDS, position):
+                if value is None:
+                    item.pop(field, None)
+                else:
+                    item[field] = value
+            items[uid] = item
+    for uid, value in delta.get("count", {}).items():
+        if uid in items:
+            item = dict(items[uid])
+            if value is None:
+                item.pop(_COUNT_FIELD, None)
+            else:
+                item[_COUNT_FIELD] = value
+            items[uid] = item
+    meta = dict(state["meta"])
+    for field, value in delta.get("meta", {}).items():
+        if value is None:
+            meta.pop(field, None)
+        else:
+            meta[field] = value
+    return {"meta": meta, "items": items}
+
+
+class CharacterHistory:
+    """
+    Append-only capture history per character.
+
+    Each <characterId>.hist file starts with a full state, followed by one
+    item-level delta per capture that changed anything. Every
+    KEYFRAME_INTERVAL deltas the full state is appended again, so any point
+    in time is reconstructed from the nearest earlier full state plus at
+    most that many deltas. Records are zlib-compressed JSON behind a small
+    header with the capture time, so the time index is built from headers
+    alone.
+
+    Captures may be recorded by several processes (the app, replay import
+    workers), so appends take a lock file per character and cached indexes
+    are checked against the file's size and modification time.
+    """
+
+    def __init__(self, history_dir: Optional[str] = None, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self._history_dir = history_dir
+        self.keyframe_interval = keyframe_interval
+        self._lock = threading.Lock()
+        # character id -> (file signature, record index, end of the last complete record)
+        self._indexes: Dict[str, Tuple[Tuple[int, int], List[Tuple[float, int, int, int]], int]] = {}
+        # character id -> (file signature, latest state)
+        self._latest: Dict[str, Tuple[Tuple[int, int], dict]] = {}
+
+    @property
+    def history_dir(self) -> str:
+        if self._history_dir is None:
+            from .appdirs import get_history_dir
+            self._history_dir = get_history_dir()
+        return self._history_dir
+
+    def history_path(self, character_id: str) -> str:
+        return os.path.join(self.history_dir, f"{character_id}{HISTORY_EXTENSION}")
+
+    def has_history(self, character_id: str) -> bool:
+        return os.path.exists(self.history_path(str(character_id)))
+
+    def record(self, character_id: str, packet_data: dict, captured_at: Optional[float] = None) -> Optional[str]:
+        """
+        Add a capture of a character.
+
+        Returns:
+            "full" for the first capture, "delta" otherwise, or None if
+            nothing changed since the previous capture
+        """
+        character_id = str(character_id)
+        captured_at = time.time() if captured_at is None else captured_at
+        state = character_state(packet_data)
+        path = self.history_path(character_id)
+        with self._lock, _file_lock(path):
+            index = self._index(character_id)
+            if not index:
+                self._append(path, [(captured_at, KIND_FULL, state)], new_file=True)
+                kind = "full"
+            else:
+                if captured_at < index[-1][0]:
+                    logger.warning(f"Capture of {character_id} is older than its history, not recorded")
+                    return None
+                previous = self._state_at_record(character_id, len(index) - 1)
+                delta = diff_states(previous, state)
+                if not delta:
+                    return None
+                records = [(captured_at, KIND_DELTA, delta)]
+                deltas_since_full = next(i for i, r in enumerate(reversed(index)) if r[1] == KIND_FULL)
+                if deltas_since_full + 1 >= self.keyframe_interval:
+                    records.append((captured_at, KIND_FULL, state))
+                self._append(path, records, truncate_at=self._indexes[character_id][2])
+                kind = "delta"
+            self._latest[character_id] = (_file_signature(path), state)
+        return kind
+
+    def _append(self, path: str, records, new_file: bool = False, truncate_at: Optional[int] = None) -> None:
+        with open(path, "wb" if new_file else "r+b") as f:
+            if not new_file:
+                # Drop a record left incomplete by a crash before appending after it
+                f.truncate(truncate_at)
+                f.seek(0, os.SEEK_END)
+            else:
+                f.write(_FILE_HEADER.pack(MAGIC, FORMAT_VERSION))
+            for captured_at, kind, payload in records:
+                data = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 6)
+                f.write(_RECORD.pack(captured_at, kind, len(data), zlib.crc32(data)))
+                f.write(data)
+
+    def _index(self, character_id: str) -> List[Tuple[float, int, int, int]]:
+        """(capture time, kind, payload offset, payload length) of every record, from headers only"""
+        path = self.history_path(character_id)
+        signature = _file_signature(path)
+        if signature is None:
+            return []
+        size = signature[0]
+        cached = self._indexes.get(character_id)
+        if cached and cached[0] == signature:
+            return cached[1]
+        with open(path, "rb") as f:
+            if cached and cached[0][0] < size:
+                # Appended since the last scan, possibly by another process: only read the new headers
+                index, offset = list(cached[1]), cached[2]
+            else:
+                magic, version = _FILE_HEADER.unpack(f.read(_FILE_HEADER.size))
+                if magic != MAGIC or version > FORMAT_VERSION:
+                    raise ValueError(f"Not a supported history file: {path}")
+                index, offset = [], _FILE_HEADER.size
+            while offset + _RECORD.size <= size:
+                f.seek(offset)
+                captured_at, kind, length, _ = _RECORD.unpack(f.read(_RECORD.size))
+                if offset + _RECORD.size + length > size:
+                    break
+                index.append((captured_at, kind, offset + _RECORD.size, length))
+                offset += _RECORD.size + length
+        if offset < size:
+            logger.warning(f"Ignoring {size - offset} bytes of an incomplete record at the end of {path}")
+        self._indexes[character_id] = (signature, index, offset)
+        return index
+
+    def _read_payload(self, character_id: str, entry) -> dict:
+        _, _, offset, length = entry
+        with open(self.history_path(character_id), "rb") as f:
+            f.seek(offset - _RECORD.size)
+            _, _, _, crc = _RECORD.unpack(f.read(_RECORD.size))
+            data = f.read(length)
+        if zlib.crc32(data) != crc:
+            raise ValueError(f"Checksum mismatch in history of {character_id} at offset {offset}")
+        return json.loads(zlib.decompress(data))
+
+    def _state_at_record(self, character_id: str, position: int) -> dict:
+        """State after the record at position in the index"""
+        index = self._index(character_id)
+        latest = self._latest.get(character_id)
+        if position == len(index) - 1 and latest and latest[0] == self._indexes[character_id][0]:
+            return latest[1]
+        start = max(i for i in range(position + 1) if index[i][1] == KIND_FULL)
+        state = self._read_payload(character_id, index[start])
+        for entry in index[start + 1:position + 1]:
+            if entry[1] == KIND_DELTA:
+                state = apply_delta(state, self._read_payload(character_id, entry))
+        return state
+
+    def timeline(self, character_id: str) -> List[dict]:
+        """Capture times that changed the character, oldest first"""
+        character_id = str(character_id)
+        with self._lock:
+            index = self._index(character_id)
+        entries = []
+        for i, (captured_at, kind, _, length) in enumerate(index):
+            # The keyframe after a delta repeats that capture
+            if kind == KIND_FULL and i > 0:
+                continue
+            entries.append({"ts": captured_at, "kind": "full" if kind == KIND_FULL else "delta", "size": length})
+        return entries
+
+    def state_at(self, character_id: str, ts: Optional[float] = None) -> Optional[dict]:
+        """
+        Reconstruct a character as it was last captured at or before ts.
+
+        Returns:
+            {"ts": capture time, "meta": ..., "items": ...}, or None if
+            there is no capture that early
+        """
+        character_id = str(character_id)
+        with self._lock:
+            index = self._index(character_id)
+            positions = [i for i, entry in enumerate(index) if ts is None or entry[0] <= ts]
+            if not positions:
+                return None
+            position = positions[-1]
+            state = self._state_at_record(character_id, position)
+        return {"ts": index[position][0], "meta": dict(state["meta"]), "items": dict(state["items"])}
+
+    def changes(self, character_id: str, start: Optional[float] = None,
+                end: Optional[float] = None) -> List[dict]:
+        """
+        Deltas captured within [start, end], oldest first.
+
+        Returns:
+            [{"ts": capture time, **delta}], see diff_states
+        """
+        character_id = str(character_id)
+        with self._lock:
+            index = self._index(character_id)
+            entries = [entry for entry in index if entry[1] == KIND_DELTA
+                       and (start is None or entry[0] >= start) and (end is None or entry[0] <= end)]
+            return [{"ts": entry[0], **self._read_payload(character_id, entry)} for entry in entries]
+
+
+history = CharacterHistory()
+
+
+def main():
+    """Print the capture history of characters and its size"""
+    import sys
+    store = history
+    for character_id in sys.argv[1:]:
+        timeline = store.timeline(character_id)
+        path = store.history_path(character_id)
+        latest = store.state_at(character_id)
+        full_size = len(json.dumps({"meta": latest["meta"], "items": latest["items"]})) if latest else 0
+        print(f"{character_id}: {len(timeline)} captures, {os.path.getsize(path)} bytes on disk "
+              f"(one uncompressed full state is {full_size} bytes)")
+        for change in store.changes(character_id):
+            summary = ", ".join(f"{len(v)} {k}" for k, v in change.items() if k != "ts")
+            print(f"  {time.ctime(change['ts'])}: {summary}")
+
+
+if __name__ == "__main__":
+    main()
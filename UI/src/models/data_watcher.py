@@ -0,0 +1,274 @@
+import os
+import sys
+import time
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import logging
+import threading
+from typing import Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Called with the names of changed entries, or None when changes were lost
+# and the whole directory has to be rescanned
+ChangeCallback = Callable[[Optional[Set[str]]], None]
+
+DEBOUNCE_SECONDS = 0.5
+# Upper bound on how long a steady stream of changes can hold back a callback
+MAX_DELAY_SECONDS = 5.0
+POLL_INTERVAL = 2.0
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+
+class DirectoryWatcher:
+    """
+    Reports changed entries of one directory to a callback.
+
+    Changes are debounced: the callback runs once no change arrived for
+    debounce seconds (or max_delay passed), with every name changed since
+    the previous call. It runs on the watcher thread.
+    """
+
+    name = "base"
+
+    def __init__(self, path: str, callback: ChangeCallback,
+                 debounce: float = DEBOUNCE_SECONDS, max_delay: float = MAX_DELAY_SECONDS):
+        self.path = path
+        self.callback = callback
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pending: Set[str] = set()
+        self._rescan = False
+        self._first_change: Optional[float] = None
+        self._last_change: Optional[float] = None
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._open()
+        self._thread = threading.Thread(target=self._run, name=f"DataWatcher-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.path} for changes ({self.name})")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._close()
+
+    def _open(self) -> None:
+        pass
+
+    def _close(self) -> None:
+        pass
+
+    def _wait(self, timeout: float) -> None:
+        """Wait up to timeout for changes, passing them to _changed"""
+        raise NotImplementedError
+
+    def _changed(self, names: Optional[Set[str]]) -> None:
+        now = time.monotonic()
+        if names is None:
+            self._rescan = True
+        elif names:
+            self._pending.update(names)
+        else:
+            return
+        if self._first_change is None:
+            self._first_change = now
+        self._last_change = now
+
+    def _due(self) -> bool:
+        if self._first_change is None:
+            return False
+        now = time.monotonic()
+        return now - self._last_change >= self.debounce or now - self._first_change >= self.max_delay
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            timeout = self.debounce if self._first_change is not None else 1.0
+            try:
+                self._wait(timeout)
+            except Exception as e:
+                logger.error(f"Watching {self.path} failed: {e}")
+                self._stop.wait(timeout)
+            if self._due():
+                names = None if self._rescan else self._pending
+                self._pending = set()
+                self._rescan = False
+                self._first_change = self._last_change = None
+                try:
+                    self.callback(names)
+                except Exception as e:
+                    logger.error(f"Data directory change handler failed: {e}")
+
+
+class PollingWatcher(DirectoryWatcher):
+    """Compares the size and modification time of every entry at an interval"""
+
+    name = "polling"
+
+    def __init__(self, path: str, callback: ChangeCallback, poll_interval: float = POLL_INTERVAL, **options):
+        super().__init__(path, callback, **options)
+        self.poll_interval = poll_interval
+        self._entries: Dict[str, Tuple[int, int]] = {}
+        self._next_scan = 0.0
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        entries = {}
+        with os.scandir(self.path) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries[entry.name] = (st.st_mtime_ns, st.st_size)
+        return entries
+
+    def _open(self) -> None:
+        self._entries = self._scan()
+        self._next_scan = time.monotonic() + self.poll_interval
+
+    def _wait(self, timeout: float) -> None:
+        delay = self._next_scan - time.monotonic()
+        if delay > 0:
+            self._stop.wait(min(delay, timeout))
+            return
+        self._next_scan = time.monotonic() + self.poll_interval
+        entries = self._scan()
+        old = self._entries
+        self._entries = entries
+        self._changed({name for name in entries.keys() | old.keys() if entries.get(name) != old.get(name)})
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatcher(DirectoryWatcher):
+    """Linux inotify, called through ctypes"""
+
+    name = "inotify"
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+    def __init__(self, path: str, callback: ChangeCallback, **options):
+        options.pop("poll_interval", None)
+        super().__init__(path, callback, **options)
+        self._fd: Optional[int] = None
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return _load_libc() is not None
+
+    def _open(self) -> None:
+        libc = _load_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        if libc.inotify_add_watch(fd, os.fsencode(self.path), self.MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, f"inotify_add_watch failed: {os.strerror(err)}")
+        self._fd = fd
+
+    def _close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _wait(self, timeout: float) -> None:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return
+            raise
+        names = set()
+        pos = 0
+        while pos + _INOTIFY_EVENT.size <= len(data):
+            _, mask, _, length = _INOTIFY_EVENT.unpack_from(data, pos)
+            pos += _INOTIFY_EVENT.size
+            name = data[pos:pos + length].rstrip(b"\0")
+            pos += length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning(f"inotify queue overflowed for {self.path}, rescanning")
+                self._changed(None)
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                logger.warning(f"Watched directory {self.path} was removed")
+                self._stop.set()
+            elif name:
+                names.add(os.fsdecode(name))
+        self._changed(names)
+
+
+WATCHERS = (InotifyWatcher, PollingWatcher)
+
+
+def create_watcher(path: str, callback: ChangeCallback, **options) -> DirectoryWatcher:
+    """
+    Create the best available watcher for a directory.
+
+    Args:
+        options: debounce, max_delay and, for polling, poll_interval
+    """
+    for cls in WATCHERS:
+        if cls.is_available():
+            return cls(path, callback, **options)
+    return PollingWatcher(path, callback, **options)
+
+
+def main():
+    """Print debounced changes of a directory until interrupted"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Watch a directory for changes")
+    parser.add_argument("path", nargs="?", default=".")
+    parser.add_argument("--poll", action="store_true", help="Use the polling watcher")
+    args = parser.parse_args()
+
+    def report(names):
+        print(f"{time.strftime('%H:%M:%S')} {'rescan' if names is None else sorted(names)}")
+
+    watcher = PollingWatcher(args.path, report) if args.poll else create_watcher(args.path, report)
+    watcher.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import threading
+from typing import Dict, List, Tuple
+
+ITEM_PREFIX = "DesignDataItem:Id_Item_"
+PROPERTY_EFFECT_PREFIX = "DesignDataItemPropertyType:Id_ItemPropertyType_Effect_"
+CLASS_PREFIX = "DesignDataPlayerCharacter:Id_PlayerCharacter_"
+RANK_PREFIX = "LeaderboardRankData:Id_LeaderboardRank_"
+
+
+class InternTable:
+    """
+    Canonical names and small integer ids for the design strings of one kind.
+
+    Packets repeat the same few thousand design strings for every item and
+    property, so each raw string is converted once and the result is kept
+    for the life of the process. Ids are assigned in first-seen order and
+    are only meaningful within the process.
+    """
+
+    def __init__(self, prefix: str, spaces: bool = False):
+        """
+        Args:
+            prefix: Design string prefix removed to get the canonical name
+            spaces: Show underscores in the name as spaces
+        """
+        self.prefix = prefix
+        self.spaces = spaces
+        self.names: List[str] = []
+        # raw design string -> (id, canonical name)
+        self._entries: Dict[str, Tuple[int, str]] = {}
+        # canonical name -> id, so raw strings with and without the prefix share an id
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, raw: str) -> Tuple[int, str]:
+        name = raw.replace(self.prefix, "")
+        if self.spaces:
+            name = name.replace("_", " ")
+        with self._lock:
+            entry = self._entries.get(raw)
+            if entry is None:
+                index = self._ids.get(name)
+                if index is None:
+                    index = self._ids[name] = len(self.names)
+                    self.names.append(name)
+                entry = self._entries[raw] = (index, name)
+        return entry
+
+    def intern(self, raw: str) -> Tuple[int, str]:
+        """(id, canonical name) of a raw design string"""
+        entry = self._entries.get(raw)
+        return entry if entry is not None else self._add(raw)
+
+    def name(self, raw: str) -> str:
+        entry = self._entries.get(raw)
+        return (entry if entry is not None else self._add(raw))[1]
+
+    def id(self, raw: str) -> int:
+        entry = self._entries.get(raw)
+        return (entry if entry is not None else self._add(raw))[0]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+item_designs = InternTable(ITEM_PREFIX)
+property_types = InternTable(PROPERTY_EFFECT_PREFIX)
+character_classes = InternTable(CLASS_PREFIX)
+ranks = InternTable(RANK_PREFIX, spaces=True)
+
+
+def item_properties(data: dict, key: str) -> List[Tuple[str, object]]:
+    """
+    (property name, value) pairs of an item's property array.
+
+    Args:
+        data: Raw item dict as saved from the packet
+        key: "primaryPropertyArray" or "secondaryPropertyArray"
+    """
+    properties = []
+    for p in data.get(key, []):
+        if isinstance(p, dict) and "propertyTypeId" in p and "propertyValue" in p:
+            properties.append((property_types.name(p["propertyTypeId"]), p["propertyValue"]))
+    return properties
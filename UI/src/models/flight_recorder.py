@@ -0,0 +1,80 @@
+import time
+import logging
+import threading
+from collections import deque, Counter
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Frame outcomes
+HANDLED = "handled"
+UNSUBSCRIBED = "unsubscribed"
+PARSE_FAILED = "parse_failed"
+HANDLER_ERROR = "handler_error"
+DROPPED = "dropped"
+
+_FIELDS = ("time", "proto_type", "command", "length", "latency_ms", "outcome")
+
+
+class FlightRecorder:
+    """
+    Fixed-size ring buffer of recent frame metadata.
+
+    Recording a frame is a tuple append to a bounded deque, so it is cheap
+    enough for every frame; the buffer is only formatted when someone asks
+    for it.
+    Per-frame lines are still written to the log at DEBUG level.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self._records = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def record(self, proto_type: int, command: str, length: int, outcome: str,
+               started: Optional[float] = None) -> None:
+        """
+        Record the outcome of one frame.
+
+        Args:
+            started: Monotonic time the frame was first seen, used for latency
+        """
+        latency_ms = (time.monotonic() - started) * 1000 if started is not None else None
+        with self._lock:
+            self._records.append((time.time(), proto_type, command, length, latency_ms, outcome))
+            self.recorded += 1
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Frame {command} (Type={proto_type}, Length={length}): {outcome}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def dump(self, limit: Optional[int] = None, outcome: Optional[str] = None) -> List[dict]:
+        """
+        Return recorded frames, oldest first.
+
+        Args:
+            limit: Only return the most recent limit frames
+            outcome: Only return frames with this outcome
+        """
+        with self._lock:
+            records = list(self._records)
+        if outcome is not None:
+            records = [r for r in records if r[5] == outcome]
+        if limit is not None:
+            records = records[-limit:] if limit > 0 else []
+        return [dict(zip(_FIELDS, r)) for r in records]
+
+    def summary(self) -> dict:
+        """Outcome and command counts over the frames currently in the buffer"""
+        with self._lock:
+            records = list(self._records)
+        return {
+            "capacity": self.capacity,
+            "size": len(records),
+            "recorded": self.recorded,
+            "outcomes": dict(Counter(r[5] for r in records)),
+            "commands": dict(Counter(r[2] for r in records).most_common(20)),
+        }
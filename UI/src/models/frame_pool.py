@@ -0,0 +1,275 @@
+import queue
+import threading
+import time
+import logging
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+
+class ProcessHandler:
+    """
+    Marks a packet handler to run in a worker process.
+
+    The handler must be a module-level function; it receives the message
+    decoded inside the worker process. Only use this for work that does not
+    touch in-process state, such as persisting a packet to disk.
+    """
+
+    def __init__(self, fn: Callable):
+        self.fn = fn
+
+    def __repr__(self):
+        return f"ProcessHandler({getattr(self.fn, '__name__', self.fn)})"
+
+
+def _run_process_handler(fn: Callable, message_name: str, frame: bytes):
+    """Decode a frame and run a handler inside a worker process"""
+    from src.models.proto_registry import registry
+    message = registry.get(message_name)()
+    message.ParseFromString(frame[8:])
+    return fn(message)
+
+
+class FrameWorkerPool:
+    """
+    Bounded hand-off between the capture thread and packet handling.
+
+    Frames are sharded across worker threads by proto_type, or by an explicit
+    shard key, so packets of the same type (or shard) are always handled in
+    arrival order. When a shard's queue
+    is full the overflow policy decides what happens:
+
+    - "block": the capture thread waits up to block_timeout, then drops the frame
+    - "drop_newest": the incoming frame is dropped
+    - "drop_oldest": the oldest queued frame is dropped to make room
+
+    ProcessHandler work is handed to the process pool without waiting for
+    it. At most max_in_flight frames are in the pool at a time; beyond that
+    "block" waits like a full queue and the other policies drop the frame.
+    """
+
+    def __init__(self,
+                 handler: Callable[[bytes, int, float], None],
+                 workers: int = 1,
+                 queue_size: int = 256,
+                 overflow: str = "drop_oldest",
+                 block_timeout: float = 1.0,
+                 processes: int = 0,
+                 max_in_flight: Optional[int] = None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.processes = processes
+        self.max_in_flight = max(1, max_in_flight if max_in_flight is not None else queue_size)
+        self._queues: List[queue.Queue] = []
+        self._threads: List[threading.Thread] = []
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Signalled whenever a frame handed to the process pool finishes
+        self._process_done_cond = threading.Condition(self._lock)
+        self._running = False
+
+        # Counters, updated under _lock
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.blocked_seconds = 0.0
+        self.offloaded = 0
+        self.in_flight = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._queues = [queue.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+            self._threads = []
+            for i, q in enumerate(self._queues):
+                thread = threading.Thread(target=self._worker, args=(q,), name=f"frame-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop workers after the frames already queued have been handled"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            queues, threads = self._queues, self._threads
+        for q in queues:
+            q.put(None)
+        for thread in threads:
+            thread.join(timeout=timeout)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+
+    def submit(self, proto_type: int, frame: bytes, block: Optional[bool] = None,
+               started: Optional[float] = None, shard: Optional[int] = None) -> bool:
+        """
+        Queue a frame for handling.
+
+        Args:
+            block: Override the overflow policy and wait for room (True)
+            started: Monotonic time the frame was first seen, passed on to the handler
+            shard: Queue frames with the same shard key on the same worker, defaults to proto_type
+
+        Returns:
+            True if the frame was queued, False if it was dropped
+        """
+        if not self._running:
+            self.start()
+        q = self._queues[(proto_type if shard is None else shard) % len(self._queues)]
+        item = (proto_type, frame, time.monotonic() if started is None else started)
+        with self._lock:
+            self.submitted += 1
+
+        if block or self.overflow == "block":
+            start = time.monotonic()
+            try:
+                q.put(item, timeout=None if block else self.block_timeout)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                logger.warning(f"Frame queue full, dropped frame (Type={proto_type})")
+                return False
+            finally:
+                with self._lock:
+                    self.blocked_seconds += time.monotonic() - start
+        else:
+            try:
+                q.put_nowait(item)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                if self.overflow == "drop_newest":
+                    logger.warning(f"Frame queue full, dropped frame (Type={proto_type})")
+                    return False
+                try:
+                    old_type = q.get_nowait()[0]
+                    q.task_done()
+                    logger.warning(f"Frame queue full, dropped oldest frame (Type={old_type})")
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait(item)
+                except queue.Full:
+                    return False
+
+        depth = q.qsize()
+        with self._lock:
+            if depth > self.max_depth:
+                self.max_depth = depth
+        return True
+
+    def join(self) -> None:
+        """Wait until every queued frame has been handled, including work handed to processes"""
+        for q in list(self._queues):
+            q.join()
+        with self._lock:
+            self._process_done_cond.wait_for(lambda: self.in_flight == 0)
+
+    def depth(self) -> int:
+        """Number of frames waiting across all queues"""
+        return sum(q.qsize() for q in self._queues)
+
+    def run_in_process(self, fn: Callable, message_name: str, frame: bytes, block: Optional[bool] = None) -> bool:
+        """
+        Hand a ProcessHandler function to the process pool without waiting for it.
+
+        Failures are counted and logged when the work finishes.
+
+        Args:
+            block: Override the overflow policy and wait for room (True)
+
+        Returns:
+            True if the frame was handed off, False if it was dropped because
+            max_in_flight frames are already in the pool
+        """
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.processes)
+            if self.in_flight >= self.max_in_flight:
+                if block or self.overflow == "block":
+                    start = time.monotonic()
+                    room = self._process_done_cond.wait_for(lambda: self.in_flight < self.max_in_flight,
+                                                            timeout=None if block else self.block_timeout)
+                    self.blocked_seconds += time.monotonic() - start
+                else:
+                    room = False
+                if not room:
+                    self.dropped += 1
+                    logger.warning(f"Process pool busy, dropped frame ({message_name})")
+                    return False
+            self.in_flight += 1
+            self.offloaded += 1
+            pool = self._process_pool
+        try:
+            future = pool.submit(_run_process_handler, fn, message_name, frame)
+        except Exception:
+            self._process_done(message_name, None)
+            raise
+        future.add_done_callback(functools.partial(self._process_done, message_name))
+        return True
+
+    def _process_done(self, message_name: str, future) -> None:
+        error = None
+        if future is None or future.cancelled():
+            error = "cancelled"
+        elif future.exception() is not None:
+            error = future.exception()
+        with self._lock:
+            self.in_flight -= 1
+            if error is not None:
+                self.failed += 1
+            self._process_done_cond.notify_all()
+        if error is not None:
+            logger.error(f"Error handling frame in worker process ({message_name}): {error}")
+
+    def stats(self) -> dict:
+        depth = self.depth()
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "processes": self.processes,
+                "queue_size": self.queue_size,
+                "overflow": self.overflow,
+                "depth": depth,
+                "max_depth": self.max_depth,
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "blocked_seconds": self.blocked_seconds,
+                "offloaded": self.offloaded,
+                "in_flight": self.in_flight,
+            }
+
+    def _worker(self, q: queue.Queue) -> None:
+        while True:
+            item = q.get()
+            try:
+                if item is None:
+                    return
+                proto_type, frame, started = item
+                try:
+                    self.handler(frame, proto_type, started)
+                    with self._lock:
+                        self.processed += 1
+                except Exception as e:
+                    with self._lock:
+                        self.failed += 1
+                    logger.error(f"Error handling frame (Type={proto_type}): {e}", exc_info=True)
+            finally:
+                q.task_done()
@@ -1,52 +1,208 @@
+import os
 import json
+import time
+import logging
+import threading
 from pathlib import Path
+from typing import Dict, List, Optional
+
+from .appdirs import get_item_cache_file
+from .design_ids import item_designs
+from .item_cache import load_item_cache, save_item_cache, source_hash
+
+logger = logging.getLogger(__name__)
+
+RARITY_IDS = {
+    "None": 0,
+    "Poor": 1,
+    "Common": 2,
+    "Uncommon": 3,
+    "Rare": 4,
+    "Epic": 5,
+    "Legendary": 6,
+    "Unique": 7,
+    "Artifact": 8
+}
+
+
+class CatalogItem:
+    """Everything the UI needs about one item, resolved once when items.json is loaded"""
+
+    __slots__ = ("index", "item_id", "name", "rarity", "rarity_id", "width", "height",
+                 "icon_path", "image_url", "vendor_price")
+
+    def __init__(self, index, item_id, name="", rarity=0, width=1, height=1, icon_path=None, vendor_price=0):
+        self.index = index
+        self.item_id = item_id
+        self.name = name
+        self.rarity = rarity
+        self.rarity_id = RARITY_IDS.get(rarity)
+        self.width = width
+        self.height = height
+        self.icon_path = icon_path
+        # URL the web UI loads the icon from
+        self.image_url = f"/assets/{icon_path}".replace("\\", "/") if icon_path else None
+        self.vendor_price = vendor_price
+
+    @classmethod
+    def from_data(cls, index, item_id, item):
+        return cls(
+            index,
+            item_id,
+            name=item.get("name", ""),
+            rarity=item.get("rarity", 0),
+            width=item.get("inventory_width", 1),
+            height=item.get("inventory_height", 1),
+            icon_path=item.get("iconPath") or None,
+            vendor_price=item.get("vendor_price", 0),
+        )
+
+
+# CatalogItem fields stored in the compiled catalog, in constructor order after the index
+CATALOG_COLUMNS = ("item_id", "name", "rarity", "width", "height", "icon_path", "vendor_price")
+# Compiled catalog shipped next to items.json by the build, see main()
+BUNDLED_CACHE_NAME = "items.catalog"
+
 
 class ItemDataManager:
-    def __init__(self):
-        file_path = Path(__file__).resolve().parent.parent.parent / "assets" / "items.json"
-        with open(file_path, "r", encoding="utf-8") as file:
-            self.data = json.load(file)
+    """
+    Item database from assets/items.json.
+
+    Nothing is read until the first lookup. The catalog is then loaded from
+    a compiled copy (bundled next to items.json, or written to the app data
+    directory on first run) whose items.json hash matches, and items.json is
+    only parsed when no such copy exists.
+    """
+
+    def __init__(self, file_path: Optional[str] = None):
+        if file_path is None:
+            file_path = Path(__file__).resolve().parent.parent.parent / "assets" / "items.json"
+        self.file_path = str(file_path)
+        self.bundled_cache_file = os.path.join(os.path.dirname(self.file_path), BUNDLED_CACHE_NAME)
+        self._lock = threading.Lock()
+        self._source_hash: Optional[str] = None
+        self._data: Optional[dict] = None
+        self._items: Optional[List[CatalogItem]] = None
+        self._catalog: Optional[Dict[str, CatalogItem]] = None
+        # Raw design string -> catalog entry, for items found in the catalog
+        self._by_design: Dict[str, CatalogItem] = {}
+
+    @property
+    def data(self) -> dict:
+        """The raw items.json contents; parsed on first access"""
+        if self._data is None:
+            with open(self.file_path, "r", encoding="utf-8") as file:
+                self._data = json.load(file)
+        return self._data
+
+    @property
+    def source_hash(self) -> str:
+        """Hash of the items.json contents, computed once; caches built from items.json are checked against it"""
+        if self._source_hash is None:
+            with open(self.file_path, "rb") as file:
+                self._source_hash = source_hash(file.read())
+        return self._source_hash
+
+    @property
+    def items(self) -> List[CatalogItem]:
+        if self._items is None:
+            self._load()
+        return self._items
+
+    @property
+    def catalog(self) -> Dict[str, CatalogItem]:
+        if self._catalog is None:
+            self._load()
+        return self._catalog
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._catalog is not None:
+                return
+            start = time.perf_counter()
+            digest = self.source_hash
+            source = "compiled catalog"
+            cache_file = get_item_cache_file()
+            columns = load_item_cache(self.bundled_cache_file, digest)
+            if columns is None:
+                columns = load_item_cache(cache_file, digest)
+            if columns is None:
+                source = "items.json"
+                columns = self.compile_columns()
+                try:
+                    save_item_cache(cache_file, columns, digest)
+                except OSError as e:
+                    # Only costs parsing items.json again on the next start
+                    logger.warning(f"Could not save item cache: {e}")
+            self._build_catalog(columns)
+            logger.info(f"Loaded {len(self._items)} items from {source} "
+                        f"in {time.perf_counter() - start:.3f} seconds")
+
+    def compile_columns(self) -> dict:
+        """The catalog as parallel lists, one per CATALOG_COLUMNS entry"""
+        columns = {name: [] for name in CATALOG_COLUMNS}
+        for index, (item_id, item) in enumerate(self.data.items()):
+            entry = CatalogItem.from_data(index, item_id, item)
+            for name in CATALOG_COLUMNS:
+                columns[name].append(getattr(entry, name))
+        return columns
+
+    def _build_catalog(self, columns: dict) -> None:
+        """One CatalogItem per item, numbered in items.json order"""
+        items = [CatalogItem(index, *values)
+                 for index, values in enumerate(zip(*(columns[name] for name in CATALOG_COLUMNS)))]
+        self._items = items
+        self._catalog = {entry.item_id: entry for entry in items}
+        self._by_design = {}
+
+    def lookup(self, item_id) -> CatalogItem:
+        """
+        Catalog entry of an item id.
+
+        Returns:
+            The entry, or a placeholder with the same defaults as the
+            get_item_* methods for ids missing from items.json
+        """
+        catalog = self._catalog
+        if catalog is None:
+            catalog = self.catalog
+        entry = catalog.get(item_id)
+        if entry is None:
+            entry = CatalogItem(-1, item_id)
+        return entry
+
+    def lookup_design_str(self, design_str) -> CatalogItem:
+        """Catalog entry of a DesignDataItem string as found in packets"""
+        entry = self._by_design.get(design_str)
+        if entry is None:
+            entry = self.lookup(item_designs.name(design_str))
+            if entry.index >= 0:
+                self._by_design[design_str] = entry
+        return entry
 
     def get_item_dimensions_from_id(self, item_id):
-        item = self.data.get(item_id, {})
-        width = item.get("inventory_width", 1)
-        height = item.get("inventory_height", 1)
-        return width, height
+        entry = self.lookup(item_id)
+        return entry.width, entry.height
 
     def get_item_rarity_from_id(self, item_id):
-        item = self.data.get(item_id, {})
-        return item.get("rarity", 0)
+        return self.lookup(item_id).rarity
 
     def get_item_name_from_id(self, item_id):
-        item = self.data.get(item_id, {})
-        return item.get("name", "")
+        return self.lookup(item_id).name
 
-    def get_item_image_path_from_id(self, item_id):
-        item = self.data.get(item_id, {})
-        icon_path = item.get("iconPath", None)
+    def get_item_image_path_from_id(self, item_id) -> Optional[Path]:
+        icon_path = self.lookup(item_id).icon_path
         if icon_path:
             # Return just the icon path without 'assets/' prefix
             return Path(icon_path)
         return None
 
     def get_item_id_from_design_str(self, item_id):
-        design_str = "DesignDataItem:Id_Item_"
-        return item_id.replace(design_str, "")
+        return item_designs.name(item_id)
     
     @staticmethod
     def rarity_to_id(rarity_name):
-        mapping = {
-            "None": 0,
-            "Poor": 1,
-            "Common": 2,
-            "Uncommon": 3,
-            "Rare": 4,
-            "Epic": 5,
-            "Legendary": 6,
-            "Unique": 7,
-            "Artifact": 8
-        }
-        return mapping.get(rarity_name, None)
+        return RARITY_IDS.get(rarity_name, None)
     
     @staticmethod
     def id_to_rarity(rarity_id):
@@ -66,8 +222,21 @@ class ItemDataManager:
 item_data_manager = ItemDataManager()
 
 def main():
+    """Compile items.json with --build, or print a sample item"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Item database tools")
+    parser.add_argument("--build", action="store_true",
+                        help=f"Compile items.json into {BUNDLED_CACHE_NAME} next to it, for bundling with the app")
+    parser.add_argument("--output", help="Where to write the compiled catalog")
+    args = parser.parse_args()
     manager = ItemDataManager()
 
+    if args.build:
+        output = args.output or manager.bundled_cache_file
+        size = save_item_cache(output, manager.compile_columns(), manager.source_hash)
+        print(f"Wrote {output} ({size} bytes)")
+        return
+
     width, height = manager.get_item_dimensions_from_id("WizardShoes_6001")
     print("Dimensions:", width, height)
 
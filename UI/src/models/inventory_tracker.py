@@ -0,0 +1,408 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+from google.protobuf.json_format import MessageToDict
+from networking.protos import _PacketCommand_pb2
+from .appdirs import get_data_dir
+from .persistence import writer
+from .stash_preview import stash_item
+
+logger = logging.getLogger(__name__)
+
+PacketCommand = _PacketCommand_pb2.PacketCommand
+
+# Journal of inventory deltas applied on top of <characterId>.json
+DELTA_SUFFIX = ".deltas.jsonl"
+
+# Server responses and the client request each one answers. Most responses are
+# empty, so what changed has to be taken from the request.
+REQUEST_FOR_RESPONSE = {
+    PacketCommand.S2C_INVENTORY_ALL_UPDATE_RES: PacketCommand.C2S_INVENTORY_ALL_UPDATE_REQ,
+    PacketCommand.S2C_INVENTORY_MOVE_RES: PacketCommand.C2S_INVENTORY_MOVE_REQ,
+    PacketCommand.S2C_INVENTORY_MERGE_RES: PacketCommand.C2S_INVENTORY_MERGE_REQ,
+    PacketCommand.S2C_INVENTORY_SWAP_RES: PacketCommand.C2S_INVENTORY_SWAP_REQ,
+    PacketCommand.S2C_INVENTORY_SPLIT_MOVE_RES: PacketCommand.C2S_INVENTORY_SPLIT_MOVE_REQ,
+    PacketCommand.S2C_INVENTORY_SPLIT_MERGE_RES: PacketCommand.C2S_INVENTORY_SPLIT_MERGE_REQ,
+    PacketCommand.S2C_INVENTORY_SPLIT_SWAP_RES: PacketCommand.C2S_INVENTORY_SPLIT_SWAP_REQ,
+}
+
+RESULT_OK = 1
+# Responses carry no request id and requests the server rejects get no
+# response, so requests are paired in order and dropped once this old
+REQUEST_TIMEOUT = 5.0
+PENDING_REQUESTS = 32
+
+
+def delta_path(character_id: str, data_dir: Optional[str] = None) -> str:
+    return os.path.join(data_dir or get_data_dir(), f"{character_id}{DELTA_SUFFIX}")
+
+
+def _unique_id(value) -> str:
+    # MessageToJson writes uint64 fields as strings
+    return str(value)
+
+
+def _item_dict(item) -> dict:
+    """Convert an SItem message to the dict layout stored in character files"""
+    return MessageToDict(item)
+
+
+def apply_ops(items: Dict[str, dict], ops: Iterable[dict]) -> set:
+    """
+    Apply inventory delta ops to raw items keyed by itemUniqueId.
+
+    Ops:
+        {"op": "upsert", "item": {...}}
+        {"op": "remove", "uniqueId": id}
+        {"op": "move", "uniqueId": id, "inventoryId": n, "slotId": n}
+        {"op": "count", "uniqueId": id, "delta": n}
+        {"op": "merge", "uniqueId": id, "dstUniqueId": id}
+        {"op": "split", "uniqueId": id, "newUniqueId": id, "count": n, "inventoryId": n, "slotId": n}
+        {"op": "replace", "inventoryIds": [n, ...], "items": [{...}, ...]}
+
+    Returns:
+        Set of inventory ids whose contents changed
+    """
+    changed = set()
+    for op in ops:
+        kind = op.get("op")
+        uid = op.get("uniqueId")
+        item = items.get(uid) if uid is not None else None
+
+        if kind == "upsert":
+            new = op["item"]
+            old = items.get(_unique_id(new.get("itemUniqueId")))
+            if old is not None:
+                changed.add(old.get("inventoryId", 0))
+            items[_unique_id(new.get("itemUniqueId"))] = new
+            changed.add(new.get("inventoryId", 0))
+        elif kind == "remove":
+            if item is not None:
+                del items[uid]
+                changed.add(item.get("inventoryId", 0))
+        elif kind == "move":
+            if item is not None:
+                changed.add(item.get("inventoryId", 0))
+                item["inventoryId"] = op["inventoryId"]
+                item["slotId"] = op["slotId"]
+                changed.add(op["inventoryId"])
+        elif kind == "count":
+            if item is not None:
+                count = item.get("itemCount", 1) + op["delta"]
+                changed.add(item.get("inventoryId", 0))
+                if count > 0:
+                    item["itemCount"] = count
+                else:
+                    del items[uid]
+        elif kind == "merge":
+            dst = items.get(op["dstUniqueId"])
+            if item is not None and dst is not None:
+                dst["itemCount"] = dst.get("itemCount", 1) + item.get("itemCount", 1)
+                del items[uid]
+                changed.add(item.get("inventoryId", 0))
+                changed.add(dst.get("inventoryId", 0))
+        elif kind == "split":
+            if item is not None:
+                new = dict(item)
+                new.update(itemUniqueId=op["newUniqueId"], itemCount=op["count"],
+                           inventoryId=op["inventoryId"], slotId=op["slotId"])
+                items[op["newUniqueId"]] = new
+                item["itemCount"] = item.get("itemCount", 1) - op["count"]
+                if item["itemCount"] <= 0:
+                    del items[uid]
+                changed.add(item.get("inventoryId", 0))
+                changed.add(op["inventoryId"])
+        elif kind == "replace":
+            inventory_ids = set(op["inventoryIds"])
+            for key in [k for k, v in items.items() if v.get("inventoryId", 0) in inventory_ids]:
+                del items[key]
+            for new in op["items"]:
+                items[_unique_id(new.get("itemUniqueId"))] = new
+            changed |= inventory_ids
+        else:
+            logger.warning(f"Unknown inventory delta op: {kind}")
+    return changed
+
+
+def apply_ops_to_stashes(stashes: Dict[str, list], ops: Iterable[dict]) -> set:
+    """
+    Apply delta ops to parsed stashes (inventoryId string -> stash entries) in place.
+
+    Only the stashes that changed are rebuilt. Item dicts are copied before
+    they are changed, so entries shared with other readers stay untouched.
+
+    Returns:
+        Set of inventory ids whose contents changed
+    """
+    items = {}
+    for stash_id, entries in stashes.items():
+        for entry in entries:
+            data = dict(entry.get("data", {}))
+            # Storage items take their inventory from the storage they were listed under
+            data.setdefault("inventoryId", int(stash_id))
+            items[_unique_id(data.get("itemUniqueId"))] = data
+    changed = apply_ops(items, ops)
+    for inventory_id in changed:
+        entries = [stash_item(data) for data in items.values() if data.get("inventoryId", 0) == inventory_id]
+        entries.sort(key=lambda e: e["slotId"])
+        if entries:
+            stashes[str(inventory_id)] = entries
+        else:
+            stashes.pop(str(inventory_id), None)
+    return changed
+
+
+def load_deltas(path: str) -> List[dict]:
+    """Read all ops from a delta journal, skipping a torn last line"""
+    ops = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ops.extend(json.loads(line)["ops"])
+                except (ValueError, KeyError):
+                    logger.warning(f"Skipping corrupt delta record in {path}")
+    except FileNotFoundError:
+        pass
+    return ops
+
+
+class InventoryTracker:
+    """
+    Keeps the in-memory character model current from S2C_INVENTORY_* packets.
+
+    Requests are queued until the matching response arrives, then turned
+    into delta ops that patch StashManager and are appended to the
+    character's delta journal. A new full character packet replaces the
+    journal.
+
+    Changes the packets do not fully describe, such as how much of a stack
+    a merge moved, mark the character for resync instead: its stashes are
+    only trusted again after the next full character packet. So do
+    responses that cannot be paired with a request.
+    """
+
+    def __init__(self, apply: Callable[[str, List[dict]], None], data_dir: Optional[str] = None,
+                 resync: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            apply: Called with (character_id, ops) to patch the in-memory model
+            data_dir: Directory holding character files and journals
+            resync: Called with character_id when the character first needs a resync
+        """
+        self.apply = apply
+        self.data_dir = data_dir
+        self.resync = resync
+        self.character_id: Optional[str] = None
+        # Characters whose tracked stashes may differ from the game
+        self.needs_resync = set()
+        # request type -> (monotonic time, request message), oldest first
+        self._pending: Dict[int, deque] = {req: deque() for req in REQUEST_FOR_RESPONSE.values()}
+        self._lock = threading.Lock()
+        self.deltas_applied = 0
+
+    def capture_info(self) -> dict:
+        """Handlers for PacketCapture.capture_info"""
+        return {
+            PacketCommand.C2S_INVENTORY_ALL_UPDATE_REQ: self.on_all_update_request,
+            PacketCommand.C2S_INVENTORY_MOVE_REQ: self.on_move_request,
+            PacketCommand.C2S_INVENTORY_MERGE_REQ: self.on_merge_request,
+            PacketCommand.C2S_INVENTORY_SWAP_REQ: self.on_swap_request,
+            PacketCommand.C2S_INVENTORY_SPLIT_MOVE_REQ: self.on_split_move_request,
+            PacketCommand.C2S_INVENTORY_SPLIT_MERGE_REQ: self.on_split_merge_request,
+            PacketCommand.C2S_INVENTORY_SPLIT_SWAP_REQ: self.on_split_swap_request,
+            PacketCommand.S2C_INVENTORY_MOVE_RES: self.on_move,
+            PacketCommand.S2C_INVENTORY_MERGE_RES: self.on_merge,
+            PacketCommand.S2C_INVENTORY_SWAP_RES: self.on_swap,
+            PacketCommand.S2C_INVENTORY_SPLIT_MOVE_RES: self.on_split_move,
+            PacketCommand.S2C_INVENTORY_SPLIT_MERGE_RES: self.on_split_merge,
+            PacketCommand.S2C_INVENTORY_SPLIT_SWAP_RES: self.on_split_swap,
+            PacketCommand.S2C_INVENTORY_SINGLE_UPDATE_RES: self.on_single_update,
+            PacketCommand.S2C_INVENTORY_ALL_UPDATE_RES: self.on_all_update,
+        }
+
+    def set_character(self, character_id: str) -> None:
+        """Start tracking a character whose full state was just saved"""
+        # Under the lock _commit appends with, so no delta lands in the new journal twice
+        with self._lock:
+            self.character_id = str(character_id)
+            self.needs_resync.discard(self.character_id)
+            for pending in self._pending.values():
+                pending.clear()
+            try:
+                writer.remove(delta_path(self.character_id, self.data_dir))
+            except OSError as e:
+                logger.warning(f"Could not clear delta journal for {character_id}: {e}")
+
+    def _queue_request(self, request_type: int, message) -> None:
+        with self._lock:
+            pending = self._pending[request_type]
+            overflow = len(pending) >= PENDING_REQUESTS
+            if overflow:
+                pending.popleft()
+            pending.append((time.monotonic(), message))
+        if overflow:
+            # Some of those requests were answered without being seen, so pairing is off
+            self._mark_resync(request_type)
+
+    def on_all_update_request(self, message) -> None:
+        self._queue_request(PacketCommand.C2S_INVENTORY_ALL_UPDATE_REQ, message)
+
+    def on_move_request(self, message) -> None:
+        self._queue_request(PacketCommand.C2S_INVENTORY_MOVE_REQ, message)
+
+    def on_merge_request(self, message) -> None:
+        self._queue_request(PacketCommand.C2S_INVENTORY_MERGE_REQ, message)
+
+    def on_swap_request(self, message) -> None:
+        self._queue_request(PacketCommand.C2S_INVENTORY_SWAP_REQ, message)
+
+    def on_split_move_request(self, message) -> None:
+        self._queue_request(PacketCommand.C2S_INVENTORY_SPLIT_MOVE_REQ, message)
+
+    def on_split_merge_request(self, message) -> None:
+        self._queue_request(PacketCommand.C2S_INVENTORY_SPLIT_MERGE_REQ, message)
+
+    def on_split_swap_request(self, message) -> None:
+        self._queue_request(PacketCommand.C2S_INVENTORY_SPLIT_SWAP_REQ, message)
+
+    def _take_request(self, response_type: int):
+        """The oldest pending request for a response, skipping requests the server never answered"""
+        now = time.monotonic()
+        with self._lock:
+            pending = self._pending[REQUEST_FOR_RESPONSE[response_type]]
+            while pending and now - pending[0][0] > REQUEST_TIMEOUT:
+                pending.popleft()
+                logger.debug(f"Dropped unanswered request for {PacketCommand.Name(response_type)}")
+            return pending.popleft()[1] if pending else None
+
+    def _commit(self, command: int, ops: List[dict]) -> None:
+        if not ops:
+            return
+        character_id = self.character_id
+        if character_id is None:
+            logger.debug("Inventory update before any character was captured, ignoring")
+            return
+        record = {"ts": time.time(), "command": PacketCommand.Name(command), "ops": ops}
+        # Journal first: once the ops are applied, the character matches snapshot plus journal
+        with self._lock:
+            if self.character_id != character_id:
+                # A new capture of the character replaced it meanwhile
+                return
+            try:
+                writer.append(delta_path(character_id, self.data_dir), json.dumps(record, separators=(",", ":")) + "\n")
+            except OSError as e:
+                logger.error(f"Failed to append inventory delta for {character_id}: {e}")
+        self.apply(character_id, ops)
+        self.deltas_applied += len(ops)
+
+    def _mark_resync(self, command: int) -> None:
+        character_id = self.character_id
+        if character_id is None:
+            return
+        with self._lock:
+            if character_id in self.needs_resync:
+                return
+            self.needs_resync.add(character_id)
+        logger.info(f"{PacketCommand.Name(command)} cannot be tracked exactly, "
+                    f"{character_id} needs a resync from the next character capture")
+        if self.resync:
+            self.resync(character_id)
+
+    def _request_for(self, response_type: int):
+        request = self._take_request(response_type)
+        if request is None:
+            # The request was missed, so whatever the response confirmed is unknown
+            logger.warning(f"No pending request for {PacketCommand.Name(response_type)}")
+            self._mark_resync(response_type)
+        return request
+
+    def on_move(self, message) -> None:
+        req = self._request_for(PacketCommand.S2C_INVENTORY_MOVE_RES)
+        if req is None:
+            return
+        self._commit(PacketCommand.S2C_INVENTORY_MOVE_RES, [
+            {"op": "move", "uniqueId": _unique_id(req.srcInfo.uniqueId),
+             "inventoryId": req.dstInventoryId, "slotId": req.dstSlotId},
+        ])
+
+    def on_merge(self, message) -> None:
+        if self._request_for(PacketCommand.S2C_INVENTORY_MERGE_RES) is None:
+            return
+        # Neither the request nor the response says how much moved, and the
+        # destination's stack limit is not in the item data, so the counts of
+        # both stacks are unknown until the character is captured again
+        self._mark_resync(PacketCommand.S2C_INVENTORY_MERGE_RES)
+
+    def on_swap(self, message) -> None:
+        req = self._request_for(PacketCommand.S2C_INVENTORY_SWAP_RES)
+        if req is None:
+            return
+        ops = [{"op": "move", "uniqueId": _unique_id(req.srcInfo.uniqueId),
+                "inventoryId": req.dstInfo.inventoryId, "slotId": req.dstInfo.slotId}]
+        if req.swapInfos:
+            for info in req.swapInfos:
+                ops.append({"op": "move", "uniqueId": _unique_id(info.dstInfo.uniqueId),
+                            "inventoryId": info.newInventoryId, "slotId": info.newSlotId})
+        else:
+            ops.append({"op": "move", "uniqueId": _unique_id(req.dstInfo.uniqueId),
+                        "inventoryId": req.srcInfo.inventoryId, "slotId": req.srcInfo.slotId})
+        self._commit(PacketCommand.S2C_INVENTORY_SWAP_RES, ops)
+
+    def on_split_move(self, message) -> None:
+        req = self._request_for(PacketCommand.S2C_INVENTORY_SPLIT_MOVE_RES)
+        if req is None:
+            return
+        self._commit(PacketCommand.S2C_INVENTORY_SPLIT_MOVE_RES, [
+            {"op": "split", "uniqueId": _unique_id(req.srcInfo.uniqueId),
+             "newUniqueId": _unique_id(message.newUniqueId), "count": req.count,
+             "inventoryId": message.newInventoryId, "slotId": message.newSlotId},
+        ])
+
+    def on_split_merge(self, message) -> None:
+        req = self._request_for(PacketCommand.S2C_INVENTORY_SPLIT_MERGE_RES)
+        if req is None:
+            return
+        self._commit(PacketCommand.S2C_INVENTORY_SPLIT_MERGE_RES, [
+            {"op": "count", "uniqueId": _unique_id(req.srcInfo.uniqueId), "delta": -req.count},
+            {"op": "count", "uniqueId": _unique_id(req.dstInfo.uniqueId), "delta": req.count},
+        ])
+
+    def on_split_swap(self, message) -> None:
+        req = self._request_for(PacketCommand.S2C_INVENTORY_SPLIT_SWAP_RES)
+        if req is None:
+            return
+        # The split stack takes the destination's place, which moves to the requested slot
+        self._commit(PacketCommand.S2C_INVENTORY_SPLIT_SWAP_RES, [
+            {"op": "move", "uniqueId": _unique_id(req.dstInfo.uniqueId),
+             "inventoryId": req.newInventoryId, "slotId": req.newSlotId},
+            {"op": "split", "uniqueId": _unique_id(req.srcInfo.uniqueId),
+             "newUniqueId": _unique_id(message.newUniqueId), "count": req.count,
+             "inventoryId": message.newInventoryId, "slotId": message.newSlotId},
+        ])
+
+    def on_single_update(self, message) -> None:
+        if message.result != RESULT_OK:
+            return
+        ops = [{"op": "remove", "uniqueId": _unique_id(item.itemUniqueId)} for item in message.oldItem]
+        ops += [{"op": "upsert", "item": _item_dict(item)} for item in message.newItem]
+        self._commit(PacketCommand.S2C_INVENTORY_SINGLE_UPDATE_RES, ops)
+
+    def on_all_update(self, message) -> None:
+        # The response lists the items itself; the request only adds inventories that are empty now
+        req = self._take_request(PacketCommand.S2C_INVENTORY_ALL_UPDATE_RES)
+        if message.result != RESULT_OK:
+            return
+        items = [_item_dict(item) for item in message.inventoryItems]
+        # Inventories the client asked about are replaced even if they are empty now
+        inventory_ids = {item.inventoryId for item in req.inventoryItems} if req is not None else set()
+        inventory_ids.update(item.get("inventoryId", 0) for item in items)
+        inventory_ids = sorted(inventory_ids)
+        self._commit(PacketCommand.S2C_INVENTORY_ALL_UPDATE_RES, [
+            {"op": "replace", "inventoryIds": inventory_ids, "items": items},
+        ])
@@ -0,0 +1,80 @@
+import marshal
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from .persistence import atomic_write
+from .startup_cache import python_tag
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DNDI"
+# Bump whenever the columns stored for the catalog change
+CACHE_VERSION = 1
+
+# Column name -> list with one value per item, in catalog order
+Columns = Dict[str, List]
+
+
+def source_hash(data: bytes) -> str:
+    """Hash of items.json the cache is checked against"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def encode_item_cache(columns: Columns, digest: str) -> bytes:
+    """
+    Contents of a compiled item catalog file.
+
+    Args:
+        columns: The catalog as parallel lists, see ItemDataManager
+        digest: source_hash() of the items.json it was compiled from
+    """
+    return MAGIC + marshal.dumps({
+        "version": CACHE_VERSION,
+        "python": python_tag(),
+        "source": digest,
+        "columns": columns,
+    })
+
+
+def save_item_cache(path: str, columns: Columns, digest: str) -> int:
+    """
+    Write a compiled item catalog.
+
+    Returns:
+        Size of the cache file in bytes
+    """
+    return atomic_write(path, encode_item_cache(columns, digest), fsync=False)
+
+
+def load_item_cache(path: str, digest: str) -> Optional[Columns]:
+    """
+    Load a compiled item catalog.
+
+    Returns:
+        The catalog columns, or None if the file is missing, unreadable,
+        written by another version, or compiled from a different items.json
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning(f"Could not read item cache {path}: {e}")
+        return None
+    if not data.startswith(MAGIC):
+        logger.warning(f"Ignoring item cache with unknown format: {path}")
+        return None
+    try:
+        cache = marshal.loads(data[len(MAGIC):])
+    except (EOFError, ValueError, TypeError) as e:
+        logger.warning(f"Ignoring corrupt item cache {path}: {e}")
+        return None
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION or cache.get("python") != python_tag():
+        logger.info(f"Item cache {path} was written by another version, ignoring it")
+        return None
+    if cache.get("source") != digest:
+        logger.info(f"items.json changed since {path} was compiled, ignoring it")
+        return None
+    return cache.get("columns")
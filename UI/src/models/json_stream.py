@@ -0,0 +1,216 @@
+import re
+import json
+import logging
+from typing import Any, Iterator, Optional, Set, TextIO
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# Character JSON files above this size are streamed instead of read with json.load
+STREAMING_JSON_SIZE = 10 * 1024 * 1024
+
+# characterDataBase fields the stash manager builds characters from
+CHARACTER_KEYS = frozenset({
+    "characterId", "nickName", "characterClass", "level",
+    "CharacterStorageInfos", "CharacterItemList",
+})
+# Arrays decoded one element at a time, so a huge one is never a single JSON value
+_STREAMED_ARRAYS = ("CharacterStorageInfos", "CharacterItemList")
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Characters that can continue a number; "1." or "1e+" at the end of a chunk decode as 1
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+# Strings and brackets, for skipping containers; group 1 is a string cut by the buffer end
+_SKIP_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|(")|[\[\]{}]')
+_decoder = json.JSONDecoder()
+
+
+class JsonStream:
+    """
+    Incremental reader for one JSON document.
+
+    Values are decoded with the standard decoder one at a time from a
+    sliding buffer, so memory is bounded by the chunk size plus the largest
+    value decoded whole, not by the document size. Objects and arrays can
+    instead be walked member by member with members() and items().
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size: Optional[int] = None) -> bool:
+        """Drop consumed input and read more; False at end of file"""
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, without consuming it"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r} in JSON document")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next value whole"""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                obj, end = None, None
+            if end is not None:
+                # A value ending at the buffer end, or followed only by a partial
+                # exponent or fraction, may be a number cut short
+                tail = self.buf[end:end + 3]
+                if self.eof or len(tail) == 3 or not all(c in _NUMBER_CHARS for c in tail):
+                    self.pos = end
+                    return obj
+            # Grow by at least the pending size, so retrying a long value stays linear
+            self._fill(max(self.chunk_size, len(self.buf) - self.pos))
+
+    def members(self) -> Iterator[str]:
+        """
+        Walk an object, yielding its keys.
+
+        The caller must consume each member's value (value(), skip(),
+        members() or items()) before asking for the next key.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            separator = self.peek()
+            self.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or '}}' but found {separator!r} in JSON document")
+
+    def items(self) -> Iterator[Any]:
+        """Walk an array, decoding one element at a time"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or ']' but found {separator!r} in JSON document")
+
+    def skip(self) -> None:
+        """
+        Consume the next value without keeping it.
+
+        Objects and arrays are scanned for their closing bracket rather than
+        decoded, which is much faster and needs no memory for their content.
+        """
+        if self.peek() not in "[{":
+            self.value()
+            return
+        depth = 0
+        while True:
+            for match in _SKIP_TOKENS.finditer(self.buf, self.pos):
+                if match.group(1) is not None:
+                    # Read on from the start of the unfinished string
+                    self.pos = match.start()
+                    break
+                token = match.group()
+                if token == "[" or token == "{":
+                    depth += 1
+                elif token == "]" or token == "}":
+                    depth -= 1
+                    if depth == 0:
+                        self.pos = match.end()
+                        return
+            else:
+                self.pos = len(self.buf)
+            if not self._fill(max(self.chunk_size, len(self.buf) - self.pos)):
+                raise ValueError("Unexpected end of JSON document")
+
+def load_character_json(path: str, keys: Optional[Set[str]] = CHARACTER_KEYS,
+                        chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Read a character info packet from a JSON file without loading the document at once.
+
+    Args:
+        keys: characterDataBase fields to keep, or None to keep all of them
+        chunk_size: Characters read from the file at a time
+
+    Returns:
+        The packet in the same dict layout as json.load, holding only the
+        result and the selected characterDataBase fields; {} for files
+        without a characterDataBase
+    """
+    packet_data = {}
+    with open(path, "r", encoding="utf-8") as f:
+        stream = JsonStream(f, chunk_size)
+        if stream.peek() != "{":
+            return {}
+        for key in stream.members():
+            if key == "characterDataBase":
+                packet_data[key] = _read_character_base(stream, keys)
+            elif key == "result":
+                packet_data[key] = stream.value()
+            else:
+                stream.skip()
+    return packet_data
+
+
+def _read_character_base(stream: JsonStream, keys: Optional[Set[str]]) -> dict:
+    char_data = {}
+    for key in stream.members():
+        if keys is not None and key not in keys:
+            stream.skip()
+        elif key in _STREAMED_ARRAYS and stream.peek() == "[":
+            char_data[key] = list(stream.items())
+        else:
+            char_data[key] = stream.value()
+    return char_data
+
+
+def main():
+    """Stream character JSON files and check the result against json.load"""
+    import sys
+    import time
+    for path in sys.argv[1:]:
+        start = time.perf_counter()
+        streamed = load_character_json(path, keys=None)
+        elapsed = time.perf_counter() - start
+        with open(path, "r", encoding="utf-8") as f:
+            full = json.load(f)
+        expected = {k: v for k, v in full.items() if k in ("result", "characterDataBase")}
+        char_data = streamed.get("characterDataBase", {})
+        print(f"{path}: {len(char_data.get('CharacterStorageInfos', []))} storages, "
+              f"{len(char_data.get('CharacterItemList', []))} items in {elapsed:.2f}s, "
+              f"{'matches' if streamed == expected else 'DIFFERS from'} json.load")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional
+
+# Seconds; capture-to-handler latency spans sub-millisecond parses to multi-second reloads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus-style cumulative output"""
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+            self.count = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = []
+        running = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            running += n
+            cumulative.append(("+Inf" if bound == float("inf") else bound, running))
+        return {
+            "count": count,
+            "sum": total,
+            "avg": total / count if count else 0.0,
+            "buckets": cumulative,
+        }
+
+
+class PipelineMetrics:
+    """
+    Counters for the capture pipeline that are not owned by the reassembler
+    or the frame pool: input volume, handler outcomes and latency.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.segments = 0
+        self.bytes = 0
+        self.frames_handled = 0
+        self.frames_unsubscribed = 0
+        self.handler_errors = 0
+        self.parse_failures: Dict[str, int] = {}
+        # First segment of a frame -> all of its handlers finished
+        self.frame_latency = Histogram()
+        # Parse plus handlers only, excluding reassembly and queueing
+        self.handler_time = Histogram()
+
+    def record_segment(self, size: int) -> None:
+        # Only the capture thread records input, so no lock is needed
+        self.segments += 1
+        self.bytes += size
+
+    def record_parse_failure(self, command: str) -> None:
+        with self._lock:
+            self.parse_failures[command] = self.parse_failures.get(command, 0) + 1
+
+    def record_handled(self, latency: float, handler_time: float, error: bool = False) -> None:
+        with self._lock:
+            self.frames_handled += 1
+            if error:
+                self.handler_errors += 1
+        self.frame_latency.observe(latency)
+        self.handler_time.observe(handler_time)
+
+    def record_unsubscribed(self) -> None:
+        with self._lock:
+            self.frames_unsubscribed += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.segments = 0
+            self.bytes = 0
+            self.frames_handled = 0
+            self.frames_unsubscribed = 0
+            self.handler_errors = 0
+            self.parse_failures = {}
+        self.frame_latency.reset()
+        self.handler_time.reset()
+
+
+# name -> (help text, type); flattened metric names from PacketCapture.metrics()
+_PROMETHEUS_METRICS = {
+    "segments_total": ("TCP segments with payload received from the capture backend", "counter"),
+    "bytes_total": ("TCP payload bytes received from the capture backend", "counter"),
+    "frames_total": ("Frames with a valid header extracted by reassembly", "counter"),
+    "invalid_headers_total": ("Frame headers that failed validation", "counter"),
+    "buffer_resets_total": ("Stream buffers discarded after invalid headers or overflow", "counter"),
+    "dropped_segments_total": ("Out-of-order segments discarded by reassembly", "counter"),
+    "pending_bytes": ("Reassembled bytes waiting for the rest of their frame", "gauge"),
+    "streams": ("TCP streams tracked by reassembly", "gauge"),
+    "frames_handled_total": ("Subscribed frames that went through their handlers", "counter"),
+    "frames_unsubscribed_total": ("Frames skipped because no handler is subscribed", "counter"),
+    "handler_errors_total": ("Frames whose handler raised", "counter"),
+    "queue_depth": ("Frames waiting in the worker queues", "gauge"),
+    "queue_max_depth": ("Highest worker queue depth seen", "gauge"),
+    "queue_dropped_total": ("Frames dropped because a worker queue was full", "counter"),
+    "queue_blocked_seconds_total": ("Time the capture thread spent waiting for queue space", "counter"),
+    "persistence_writes_total": ("Files written through the shared persistence layer", "counter"),
+    "persistence_coalesced_total": ("File writes merged into a later write of the same file", "counter"),
+    "persistence_bytes_total": ("Bytes written through the shared persistence layer", "counter"),
+    "persistence_errors_total": ("File writes that failed", "counter"),
+    "persistence_pending": ("Coalesced file writes waiting to be written", "gauge"),
+}
+
+
+def to_prometheus(metrics: dict, prefix: str = "dndtools_capture") -> str:
+    """
+    Render PacketCapture.metrics() in the Prometheus text exposition format.
+
+    Args:
+        metrics: Snapshot returned by PacketCapture.metrics()
+        prefix: Metric name prefix
+    """
+    lines: List[str] = []
+
+    def emit(name: str, value, help_text: Optional[str] = None, kind: Optional[str] = None, labels: str = ""):
+        if help_text:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+        lines.append(f"{prefix}_{name}{labels} {value}")
+
+    flat = {
+        "segments_total": metrics["segments"],
+        "bytes_total": metrics["bytes"],
+        "frames_total": metrics["reassembly"]["frames"],
+        "invalid_headers_total": metrics["reassembly"]["invalid_headers"],
+        "buffer_resets_total": metrics["reassembly"]["buffer_resets"],
+        "dropped_segments_total": metrics["reassembly"]["dropped_segments"],
+        "pending_bytes": metrics["reassembly"]["pending_bytes"],
+        "streams": metrics["reassembly"]["streams"],
+        "frames_handled_total": metrics["frames_handled"],
+        "frames_unsubscribed_total": metrics["frames_unsubscribed"],
+        "handler_errors_total": metrics["handler_errors"],
+    }
+    queue = metrics.get("queue")
+    if queue:
+        flat.update({
+            "queue_depth": queue["depth"],
+            "queue_max_depth": queue["max_depth"],
+            "queue_dropped_total": queue["dropped"],
+            "queue_blocked_seconds_total": queue["blocked_seconds"],
+        })
+    persistence = metrics.get("persistence")
+    if persistence:
+        flat.update({
+            "persistence_writes_total": persistence["writes"],
+            "persistence_coalesced_total": persistence["coalesced"],
+            "persistence_bytes_total": persistence["bytes"],
+            "persistence_errors_total": persistence["errors"],
+            "persistence_pending": persistence["pending"],
+        })
+    for name, value in flat.items():
+        help_text, kind = _PROMETHEUS_METRICS[name]
+        emit(name, value, help_text, kind)
+
+    failures = metrics["parse_failures"]
+    lines.append(f"# HELP {prefix}_parse_failures_total Frames that failed to deserialize, by command")
+    lines.append(f"# TYPE {prefix}_parse_failures_total counter")
+    for command, count in sorted(failures.items()):
+        emit("parse_failures_total", count, labels=f'{{command="{command}"}}')
+
+    histograms = [
+        ("frame_latency_seconds", "Time from a frame's first TCP segment to its handlers finishing",
+         metrics["frame_latency_seconds"]),
+        ("handler_seconds", "Time spent parsing a frame and running its handlers", metrics["handler_seconds"]),
+    ]
+    if persistence:
+        histograms.append(("persistence_write_seconds", "Time spent writing a file atomically",
+                           persistence["write_seconds"]))
+    for name, help_text, histogram in histograms:
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} histogram")
+        for bound, count in histogram["buckets"]:
+            emit(f"{name}_bucket", count, labels=f'{{le="{bound}"}}')
+        emit(f"{name}_sum", histogram["sum"])
+        emit(f"{name}_count", histogram["count"])
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,310 @@
+import os
+import re
+import json
+import time
+import zlib
+import gzip
+import atexit
+import struct
+import logging
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+from .persistence import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_EXTENSION = ".pkt.gz"
+INDEX_EXTENSION = ".idx.json"
+
+# Rotation and retention defaults
+MAX_SEGMENT_BYTES = 8 * 1024 * 1024
+MAX_TOTAL_BYTES = 256 * 1024 * 1024
+MAX_AGE_DAYS = 30
+
+# Record payload encodings
+ENCODING_PROTOBUF = 0
+ENCODING_JSON = 1  # dumps written by older versions, imported as they were
+
+# capture time, payload encoding, message name length, payload length
+_RECORD = struct.Struct("<dBHI")
+
+# Packet dumps older versions wrote next to the character files, e.g. 2025-01-31_12-00-00.json
+_DUMP_NAME_RE = re.compile(r"^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}")
+_DUMP_TIME_FORMAT = "%Y-%m-%d_%H-%M-%S"
+
+
+def is_packet_dump(filename: str) -> bool:
+    """Whether a data directory file name is a timestamped packet dump"""
+    return bool(_DUMP_NAME_RE.match(os.path.basename(filename)))
+
+
+def read_segment(path: str) -> Iterator[Tuple[float, int, str, bytes]]:
+    """
+    Read the records of a segment.
+
+    A segment that was still being written when the app stopped ends in an
+    unfinished gzip member; records up to the last complete one are returned.
+
+    Yields:
+        (capture time, encoding, message name, payload)
+    """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    buf = b""
+    corrupt = False
+    with open(path, "rb") as f:
+        while not corrupt:
+            chunk = f.read(256 * 1024)
+            if not chunk:
+                break
+            while chunk:
+                try:
+                    buf += decompressor.decompress(chunk)
+                except zlib.error as e:
+                    logger.warning(f"Corrupt data in {path}, ignoring the rest of it: {e}")
+                    corrupt = True
+                    break
+                chunk = b""
+                if decompressor.eof:
+                    # Every time the segment was reopened a new gzip member was started
+                    chunk = decompressor.unused_data
+                    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            pos = 0
+            while len(buf) - pos >= _RECORD.size:
+                captured_at, encoding, name_len, size = _RECORD.unpack_from(buf, pos)
+                end = pos + _RECORD.size + name_len + size
+                if end > len(buf):
+                    break
+                name = buf[pos + _RECORD.size:pos + _RECORD.size + name_len].decode("utf-8")
+                yield captured_at, encoding, name, buf[end - size:end]
+                pos = end
+            buf = buf[pos:]
+
+
+class PacketArchive:
+    """
+    Append-only, gzip-compressed log of packets that are not character snapshots.
+
+    Packets are appended to the current segment, which is rotated once it
+    reaches max_segment_bytes. Every closed segment gets an index file with
+    its time range and message counts, so the archive can be browsed without
+    decompressing it. The oldest segments are deleted once the archive
+    exceeds max_total_bytes or they are older than max_age_days.
+
+    Each process writes its own segments, so worker processes can archive
+    packets too.
+    """
+
+    def __init__(self, archive_dir: Optional[str] = None,
+                 max_segment_bytes: int = MAX_SEGMENT_BYTES,
+                 max_total_bytes: int = MAX_TOTAL_BYTES,
+                 max_age_days: float = MAX_AGE_DAYS):
+        self._archive_dir = archive_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._file = None
+        self._gzip = None
+        self._segment = None
+        self._stats = None
+        self._atexit_registered = False
+
+    @property
+    def archive_dir(self) -> str:
+        if self._archive_dir is None:
+            from .appdirs import get_archive_dir
+            self._archive_dir = get_archive_dir()
+        return self._archive_dir
+
+    def append_message(self, message, captured_at: Optional[float] = None) -> None:
+        """Archive a protobuf message"""
+        self.append(message.DESCRIPTOR.name, message.SerializeToString(), ENCODING_PROTOBUF, captured_at)
+
+    def append(self, name: str, payload: bytes, encoding: int = ENCODING_PROTOBUF,
+               captured_at: Optional[float] = None) -> None:
+        """Append one record to the current segment, rotating it when full"""
+        captured_at = time.time() if captured_at is None else captured_at
+        name_bytes = name.encode("utf-8")
+        with self._lock:
+            if self._gzip is None:
+                self._open_segment()
+            self._gzip.write(_RECORD.pack(captured_at, encoding, len(name_bytes), len(payload)))
+            self._gzip.write(name_bytes)
+            self._gzip.write(payload)
+            # Sync flush: everything written so far survives a crash
+            self._gzip.flush()
+            stats = self._stats
+            stats["records"] += 1
+            stats["raw_bytes"] += _RECORD.size + len(name_bytes) + len(payload)
+            stats["first_ts"] = min(stats["first_ts"] or captured_at, captured_at)
+            stats["last_ts"] = max(stats["last_ts"] or captured_at, captured_at)
+            stats["commands"][name] = stats["commands"].get(name, 0) + 1
+            if self._file.tell() >= self.max_segment_bytes:
+                self._close_segment()
+                self._enforce_retention()
+
+    def close(self) -> None:
+        """Close the current segment and write its index"""
+        with self._lock:
+            self._close_segment()
+
+    def _open_segment(self) -> None:
+        # Names sort oldest first; the sequence number covers rotating twice within a second
+        prefix = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        sequence = 0
+        while True:
+            path = os.path.join(self.archive_dir, f"{prefix}-{sequence:02d}{SEGMENT_EXTENSION}")
+            if not os.path.exists(path):
+                break
+            sequence += 1
+        self._file = open(path, "ab")
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode="ab")
+        self._segment = path
+        self._stats = {"segment": os.path.basename(path), "records": 0, "raw_bytes": 0,
+                       "first_ts": None, "last_ts": None, "commands": {}}
+        # Limits are checked whenever a segment starts, not only on rotation
+        self._enforce_retention()
+        if not self._atexit_registered:
+            atexit.register(self.close)
+            self._atexit_registered = True
+
+    def _close_segment(self) -> None:
+        if self._gzip is None:
+            return
+        self._gzip.close()
+        self._file.close()
+        self._stats["bytes"] = os.path.getsize(self._segment)
+        self._write_index(self._segment, self._stats)
+        logger.info(f"Closed packet archive segment {self._stats['segment']} "
+                    f"({self._stats['records']} packets, {self._stats['bytes']} bytes)")
+        self._gzip = self._file = self._segment = self._stats = None
+
+    @staticmethod
+    def _write_index(segment_path: str, stats: dict) -> None:
+        atomic_write_json(segment_path[:-len(SEGMENT_EXTENSION)] + INDEX_EXTENSION, stats)
+
+    def segments(self) -> List[str]:
+        """Segment paths, oldest first"""
+        return sorted(os.path.join(self.archive_dir, name) for name in os.listdir(self.archive_dir)
+                      if name.endswith(SEGMENT_EXTENSION))
+
+    def index(self) -> List[dict]:
+        """
+        Index entries of all segments, oldest first.
+
+        Segments without an index file (still being written, or left by a
+        crash or a worker process) are scanned.
+        """
+        entries = []
+        for path in self.segments():
+            index_path = path[:-len(SEGMENT_EXTENSION)] + INDEX_EXTENSION
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    entries.append(json.load(f))
+                continue
+            except (OSError, ValueError):
+                pass
+            stats = {"segment": os.path.basename(path), "records": 0, "raw_bytes": 0,
+                     "first_ts": None, "last_ts": None, "commands": {}, "open": True}
+            try:
+                for captured_at, _, name, payload in read_segment(path):
+                    stats["records"] += 1
+                    stats["raw_bytes"] += _RECORD.size + len(name) + len(payload)
+                    stats["first_ts"] = min(stats["first_ts"] or captured_at, captured_at)
+                    stats["last_ts"] = max(stats["last_ts"] or captured_at, captured_at)
+                    stats["commands"][name] = stats["commands"].get(name, 0) + 1
+                stats["bytes"] = os.path.getsize(path)
+            except OSError:
+                continue
+            entries.append(stats)
+        return entries
+
+    def _enforce_retention(self) -> None:
+        """Delete the oldest segments beyond the size and age limits"""
+        cutoff = time.time() - self.max_age_days * 86400
+        segments = [(path, os.path.getsize(path), os.path.getmtime(path))
+                    for path in self.segments() if path != self._segment]
+        total = sum(size for _, size, _ in segments)
+        for path, size, mtime in segments:
+            if total <= self.max_total_bytes and mtime >= cutoff:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                # Still open in another process
+                logger.debug(f"Could not remove archive segment {path}: {e}")
+                continue
+            index_path = path[:-len(SEGMENT_EXTENSION)] + INDEX_EXTENSION
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            total -= size
+            logger.info(f"Removed archive segment {os.path.basename(path)} ({size} bytes)")
+
+    def import_dumps(self, data_dir: str) -> int:
+        """
+        Move timestamped packet dumps written by older versions into the archive.
+
+        Returns:
+            Number of dumps imported
+        """
+        imported = 0
+        for name in sorted(os.listdir(data_dir)):
+            if not name.endswith(".json") or not is_packet_dump(name):
+                continue
+            path = os.path.join(data_dir, name)
+            try:
+                captured_at = time.mktime(time.strptime(name[:19], _DUMP_TIME_FORMAT))
+                with open(path, "rb") as f:
+                    self.append("", f.read(), ENCODING_JSON, captured_at)
+                os.remove(path)
+                imported += 1
+            except Exception as e:
+                logger.warning(f"Could not archive packet dump {path}: {e}")
+        if imported:
+            self.close()
+            with self._lock:
+                self._enforce_retention()
+            logger.info(f"Moved {imported} packet dumps from {data_dir} to the packet archive")
+        return imported
+
+
+archive = PacketArchive()
+
+
+def main():
+    """List the archive index, or print the packets of a segment as JSON lines"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect the packet archive")
+    parser.add_argument("segment", nargs="?", help="Segment file to print")
+    parser.add_argument("--dir", help="Archive directory (default: app data directory)")
+    args = parser.parse_args()
+    packet_archive = PacketArchive(args.dir) if args.dir else archive
+
+    if not args.segment:
+        total = 0
+        for entry in packet_archive.index():
+            total += entry.get("bytes", 0)
+            first = time.ctime(entry["first_ts"]) if entry["first_ts"] else "-"
+            top = ", ".join(f"{k or 'legacy JSON'}={v}" for k, v in
+                            sorted(entry["commands"].items(), key=lambda kv: -kv[1])[:3])
+            print(f"{entry['segment']}: {entry['records']} packets since {first}, "
+                  f"{entry.get('bytes', 0)} bytes ({entry['raw_bytes']} raw){' [open]' if entry.get('open') else ''}: {top}")
+        print(f"Total {total} bytes")
+        return
+
+    from google.protobuf.json_format import MessageToDict
+    from .proto_registry import registry as proto_registry
+    path = args.segment if os.path.exists(args.segment) else os.path.join(packet_archive.archive_dir, args.segment)
+    for captured_at, encoding, name, payload in read_segment(path):
+        if encoding == ENCODING_JSON:
+            packet = json.loads(payload)
+        else:
+            message = proto_registry.get(name)()
+            message.ParseFromString(payload)
+            packet = MessageToDict(message)
+        print(json.dumps({"ts": captured_at, "message": name, "packet": packet}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import os
+import struct
+import logging
+from typing import BinaryIO, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_EXTENSIONS = ('.pcap', '.pcapng', '.cap')
+
+# Classic pcap magic numbers (as read little-endian)
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+
+# pcapng block types
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_OPT_IF_TSRESOL = 9
+# Block type, block length and the trailing copy of the length
+PCAPNG_MIN_BLOCK = 12
+# Body sizes before options/packet data
+PCAPNG_SHB_MIN = PCAPNG_MIN_BLOCK + 16
+PCAPNG_IDB_BODY = 8
+PCAPNG_EPB_BODY = 20
+PCAPNG_SPB_BODY = 4
+
+# (timestamp in seconds, link-layer type, frame bytes)
+Record = Tuple[float, int, bytes]
+
+
+def list_capture_files(path: str) -> List[str]:
+    """Return the capture file at path, or all capture files in the directory sorted by name"""
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(CAPTURE_EXTENSIONS)
+        )
+    return [path]
+
+
+def read_capture_file(path: str) -> Iterator[Record]:
+    """
+    Read packets from a pcap or pcapng file.
+
+    A file that ends in the middle of a record, such as one still being
+    written, yields the records before it.
+
+    Raises:
+        ValueError: If the file is neither pcap nor pcapng, or a pcapng
+            block is malformed
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+        if len(magic) < 4:
+            return
+        if struct.unpack('<I', magic)[0] == PCAPNG_SHB:
+            yield from _read_pcapng(f, magic)
+        else:
+            yield from _read_pcap(f, magic)
+
+
+def _read_pcap(f: BinaryIO, magic: bytes) -> Iterator[Record]:
+    for endian in '<>':
+        value = struct.unpack(endian + 'I', magic)[0]
+        if value in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            break
+    else:
+        raise ValueError(f"Not a pcap/pcapng file (magic {magic.hex()})")
+
+    ts_scale = 1e-9 if value == PCAP_MAGIC_NS else 1e-6
+    header = f.read(20)
+    if len(header) < 20:
+        return
+    linktype = struct.unpack(endian + 'I', header[16:20])[0] & 0x0FFFFFFF
+    record_header = struct.Struct(endian + 'IIII')
+
+    while True:
+        raw = f.read(record_header.size)
+        if len(raw) < record_header.size:
+            return
+        ts_sec, ts_frac, incl_len, _orig_len = record_header.unpack(raw)
+        data = f.read(incl_len)
+        if len(data) < incl_len:
+            logger.warning(f"Truncated pcap record in {f.name}")
+            return
+        yield ts_sec + ts_frac * ts_scale, linktype, data
+
+
+def _read_pcapng(f: BinaryIO, first_type: bytes) -> Iterator[Record]:
+    endian = '<'
+    # Per section: list of (linktype, timestamp units per second)
+    interfaces = []
+    block_type_raw = first_type
+
+    while True:
+        if block_type_raw is None:
+            block_type_raw = f.read(4)
+        if len(block_type_raw) < 4:
+            return
+
+        raw_length = f.read(4)
+        if len(raw_length) < 4:
+            return
+        offset = f.tell() - 8
+
+        if struct.unpack('<I', block_type_raw)[0] == PCAPNG_SHB:
+            # Byte order can change with every section
+            body_start = f.read(4)
+            if len(body_start) < 4:
+                return
+            endian = '<' if struct.unpack('<I', body_start)[0] == PCAPNG_BYTE_ORDER_MAGIC else '>'
+            block_length = struct.unpack(endian + 'I', raw_length)[0]
+            _check_block_length(f, offset, block_length, PCAPNG_SHB_MIN)
+            f.read(block_length - 12)
+            interfaces = []
+            block_type_raw = None
+            continue
+
+        block_type = struct.unpack(endian + 'I', block_type_raw)[0]
+        block_length = struct.unpack(endian + 'I', raw_length)[0]
+        minimum = PCAPNG_MIN_BLOCK + {PCAPNG_IDB: PCAPNG_IDB_BODY, PCAPNG_EPB: PCAPNG_EPB_BODY,
+                                      PCAPNG_SPB: PCAPNG_SPB_BODY}.get(block_type, 0)
+        _check_block_length(f, offset, block_length, minimum)
+        body = f.read(block_length - 8)
+        block_type_raw = None
+        if len(body) < block_length - 8:
+            logger.warning(f"Truncated pcapng block in {f.name}")
+            return
+        if struct.unpack_from(endian + 'I', body, len(body) - 4)[0] != block_length:
+            raise ValueError(f"pcapng block at offset {offset} in {f.name} does not end with its length")
+        body = body[:-4]  # trailing copy of the block length
+
+        if block_type == PCAPNG_IDB:
+            linktype = struct.unpack_from(endian + 'H', body, 0)[0]
+            interfaces.append((linktype, _pcapng_ts_resolution(body[8:], endian)))
+        elif block_type == PCAPNG_EPB:
+            interface_id, ts_high, ts_low, cap_len, _orig_len = struct.unpack_from(endian + 'IIIII', body, 0)
+            if cap_len > len(body) - PCAPNG_EPB_BODY:
+                raise ValueError(f"pcapng packet at offset {offset} in {f.name} is longer than its block")
+            if interface_id >= len(interfaces):
+                continue
+            linktype, units = interfaces[interface_id]
+            yield ((ts_high << 32) | ts_low) / units, linktype, body[20:20 + cap_len]
+        elif block_type == PCAPNG_SPB:
+            if not interfaces:
+                continue
+            # Simple packets carry no timestamp or captured length; the original
+            # length tells the packet from the block's padding
+            orig_len = struct.unpack_from(endian + 'I', body, 0)[0]
+            yield 0.0, interfaces[0][0], body[4:4 + orig_len]
+
+
+def _check_block_length(f: BinaryIO, offset: int, block_length: int, minimum: int) -> None:
+    """Reject block lengths that would misalign or overrun the next block"""
+    if block_length < minimum or block_length % 4:
+        raise ValueError(f"Invalid pcapng block length {block_length} at offset {offset} in {f.name}")
+
+
+def _pcapng_ts_resolution(options: bytes, endian: str) -> float:
+    """Return timestamp units per second from an interface description's options"""
+    offset = 0
+    while offset + 4 <= len(options):
+        code, length = struct.unpack_from(endian + 'HH', options, offset)
+        if code == 0:
+            break
+        if code == PCAPNG_OPT_IF_TSRESOL and length >= 1:
+            value = options[offset + 4]
+            if value & 0x80:
+                return float(2 ** (value & 0x7F))
+            return float(10 ** value)
+        offset += 4 + ((length + 3) & ~3)
+    return 1e6
@@ -0,0 +1,331 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+import weakref
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Writes to the same file within this many seconds are merged into one
+COALESCE_WINDOW = 0.5
+# Windows refuses to replace a file another process has open, e.g. a virus scanner
+_REPLACE_RETRIES = 5
+
+Data = Union[bytes, str]
+# A producer is called when the write actually happens, so serializing is
+# skipped for versions that are superseded before they reach the disk
+Payload = Union[Data, Callable[[], Data]]
+
+
+def atomic_write(path: str, data: Data, fsync: bool = True) -> int:
+    """
+    Replace a file in one step: write a temporary file next to it, then rename it over the target.
+
+    Readers see either the old or the new contents, never a torn file.
+
+    Returns:
+        Number of bytes written
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        for attempt in range(_REPLACE_RETRIES):
+            try:
+                os.replace(tmp_path, path)
+                break
+            except PermissionError:
+                if attempt == _REPLACE_RETRIES - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(data)
+
+
+def atomic_write_json(path: str, obj, fsync: bool = True, **json_options) -> int:
+    """atomic_write for a JSON document; json_options are passed to json.dumps"""
+    return atomic_write(path, json.dumps(obj, **json_options), fsync)
+
+
+# Every Persistence, so a forked child can reset the locks it inherited
+_writers = weakref.WeakSet()
+
+
+class Persistence:
+    """
+    Shared write path for files that are rewritten as a whole.
+
+    Every write is atomic. Coalesced writes are held for the coalesce window
+    and only the last version of a file is written, so a burst of captures
+    or settings changes costs a single write. Pending writes are flushed on
+    exit. Other processes, forked ones included, always write immediately,
+    as worker processes may exit without running exit handlers.
+
+    Work that must wait until a file is on disk is registered with
+    when_written(). Journals that grow by records go through append().
+    """
+
+    def __init__(self, window: float = COALESCE_WINDOW):
+        self.window = window
+        self._cond = threading.Condition()
+        # path -> (due time, payload, fsync, version)
+        self._pending: Dict[str, Tuple[float, Payload, bool, int]] = {}
+        # path -> callbacks to run once the pending write of the path lands
+        self._callbacks: Dict[str, List[Callable[[], None]]] = {}
+        # path -> (writes of the path under way, callbacks to run once the last one lands)
+        self._writing: Dict[str, Tuple[int, List[Callable[[], None]]]] = {}
+        # Versions order writes to the same path that race between threads
+        self._version = 0
+        self._written: Dict[str, int] = {}
+        self._io_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # Only the process that created the writer holds writes back; see write()
+        self._owner_pid = os.getpid()
+        _writers.add(self)
+
+        # Metrics
+        self.writes = 0
+        self.coalesced = 0
+        self.bytes = 0
+        self.errors = 0
+        self.write_time = Histogram()
+
+    def write(self, path: str, payload: Payload, coalesce: bool = False, fsync: bool = True) -> None:
+        """
+        Write a whole file atomically.
+
+        Args:
+            payload: Bytes, text, or a callable returning either when the write happens
+            coalesce: Hold the write for the coalesce window, replacing any
+                pending write to the same path
+
+        Raises:
+            OSError: If an immediate write fails; failed coalesced writes are logged
+        """
+        with self._cond:
+            self._version += 1
+            version = self._version
+            immediate = not coalesce or self.window <= 0 or os.getpid() != self._owner_pid
+            pending = self._pending.pop(path, None)
+            if pending is not None:
+                # Superseded before it reached the disk; callbacks were about that version
+                self.coalesced += 1
+                self._callbacks.pop(path, None)
+            if not immediate:
+                due = pending[0] if pending is not None else time.monotonic() + self.window
+                self._pending[path] = (due, payload, fsync, version)
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="PersistenceWriter", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+                self._cond.notify()
+            else:
+                self._start_write(path, [])
+        if immediate:
+            self._write(path, payload, fsync, version, raise_errors=True)
+
+    def append(self, path: str, data: Data, fsync: bool = False) -> int:
+        """
+        Append to a file, such as a journal of records, creating it if needed.
+
+        Appends take the same I/O lock as whole-file writes, so they never
+        interleave with a replacement of the file.
+
+        Returns:
+            Number of bytes written
+
+        Raises:
+            OSError: If the append fails
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self._io_lock:
+            start = time.perf_counter()
+            try:
+                with open(path, "ab") as f:
+                    f.write(data)
+                    if fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+            except OSError:
+                with self._cond:
+                    self.errors += 1
+                raise
+            elapsed = time.perf_counter() - start
+        with self._cond:
+            self.writes += 1
+            self.bytes += len(data)
+        self.write_time.observe(elapsed)
+        return len(data)
+
+    def remove(self, path: str) -> bool:
+        """
+        Delete a file, such as a journal, taking the I/O lock so it never
+        interleaves with an append to it.
+
+        Returns:
+            True if the file was removed, False if it did not exist
+
+        Raises:
+            OSError: If the file cannot be removed
+        """
+        with self._io_lock:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def pending(self, path: str) -> bool:
+        """Whether a write of the path is waiting or under way"""
+        with self._cond:
+            return path in self._pending or path in self._writing
+
+    def when_written(self, path: str, callback: Callable[[], None]) -> None:
+        """
+        Run a callback once the last write of a file has reached the disk.
+
+        The callback runs right away if no write of the path is pending or
+        under way. It is dropped if the write fails or is superseded by a
+        newer write before landing.
+        """
+        with self._cond:
+            if path in self._pending:
+                self._callbacks.setdefault(path, []).append(callback)
+                return
+            if path in self._writing:
+                self._writing[path][1].append(callback)
+                return
+        self._run_callbacks(path, [callback])
+
+    def flush(self, path: Optional[str] = None) -> None:
+        """Write pending data now, for one path or all of them"""
+        with self._cond:
+            if path is None:
+                items = list(self._pending.items())
+                self._pending.clear()
+            elif path in self._pending:
+                items = [(path, self._pending.pop(path))]
+            else:
+                items = []
+            for item_path, _ in items:
+                self._start_write(item_path, self._callbacks.pop(item_path, []))
+        for item_path, (_, payload, fsync, version) in items:
+            self._write(item_path, payload, fsync, version)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                path, (due, _, _, _) = min(self._pending.items(), key=lambda item: item[1][0])
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                _, payload, fsync, version = self._pending.pop(path)
+                self._start_write(path, self._callbacks.pop(path, []))
+            self._write(path, payload, fsync, version)
+
+    def _after_fork(self) -> None:
+        """Drop the parent's writer state in a forked child, which writes its own files immediately"""
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        # The parent writes these; the child has no writer thread anyway
+        self._pending.clear()
+        self._callbacks.clear()
+        self._writing.clear()
+        self._thread = None
+
+    def _start_write(self, path: str, callbacks: List[Callable[[], None]]) -> None:
+        """Mark a write of path as under way; the caller must hold _cond"""
+        count, waiting = self._writing.get(path, (0, []))
+        self._writing[path] = (count + 1, waiting + callbacks)
+
+    def _finish_write(self, path: str, ok: bool) -> None:
+        with self._cond:
+            count, callbacks = self._writing.pop(path)
+            if count > 1:
+                # Callbacks wait for the last write under way
+                self._writing[path] = (count - 1, callbacks)
+                return
+        if ok and callbacks:
+            self._run_callbacks(path, callbacks)
+
+    def _write(self, path: str, payload: Payload, fsync: bool, version: int, raise_errors: bool = False) -> None:
+        """Perform a write started with _start_write"""
+        ok = False
+        try:
+            with self._io_lock:
+                if self._written.get(path, 0) > version:
+                    # A newer version of the file already reached the disk
+                    with self._cond:
+                        self.coalesced += 1
+                    ok = True
+                    return
+                start = time.perf_counter()
+                try:
+                    size = atomic_write(path, payload() if callable(payload) else payload, fsync)
+                except Exception as e:
+                    with self._cond:
+                        self.errors += 1
+                    if raise_errors:
+                        raise
+                    logger.error(f"Failed to write {path}: {e}")
+                    return
+                elapsed = time.perf_counter() - start
+                self._written[path] = version
+            with self._cond:
+                self.writes += 1
+                self.bytes += size
+            self.write_time.observe(elapsed)
+            logger.debug(f"Wrote {path} ({size} bytes in {elapsed * 1000:.1f} ms)")
+            ok = True
+        finally:
+            self._finish_write(path, ok)
+
+    @staticmethod
+    def _run_callbacks(path: str, callbacks: List[Callable[[], None]]) -> None:
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error after writing {path}: {e}")
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return {
+                "writes": self.writes,
+                "coalesced": self.coalesced,
+                "bytes": self.bytes,
+                "errors": self.errors,
+                "pending": len(self._pending),
+                "write_seconds": self.write_time.snapshot(),
+            }
+
+
+def _after_fork() -> None:
+    # Another thread may have held a writer's lock at the time of the fork
+    for instance in list(_writers):
+        instance._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+writer = Persistence()
@@ -0,0 +1,163 @@
+import os
+import re
+import sys
+import time
+import importlib
+import importlib.util
+import logging
+import subprocess
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+ui_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+protos_path = os.path.join(ui_root, "networking", "protos")
+
+# Top-level message definitions; nested messages are indented and not matched
+_MESSAGE_RE = re.compile(r'^message\s+(\w+)', re.MULTILINE)
+
+
+class ProtoRegistry:
+    """
+    Resolves protobuf message classes by name, importing the owning _pb2
+    module only the first time one of its messages is needed.
+
+    The name -> module index is built from the .proto sources, which is far
+    cheaper than executing every generated module.
+    """
+
+    def __init__(self, path: str = protos_path):
+        self.path = path
+        self._index: Optional[Dict[str, str]] = None
+        self._classes = {}
+        self._lock = threading.Lock()
+        self.load_times: Dict[str, float] = {}  # module name -> seconds spent importing
+        self.index_time = 0.0
+
+        # The generated modules import each other as top-level modules
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    def _build_index(self) -> Dict[str, str]:
+        start = time.perf_counter()
+        index = {}
+        for filename in os.listdir(self.path):
+            if not filename.endswith(".proto"):
+                continue
+            module_name = filename[:-len(".proto")] + "_pb2"
+            if not os.path.exists(os.path.join(self.path, module_name + ".py")):
+                continue
+            with open(os.path.join(self.path, filename), "r", encoding="utf-8") as f:
+                for name in _MESSAGE_RE.findall(f.read()):
+                    index[name] = module_name
+        self.index_time = time.perf_counter() - start
+        return index
+
+    def module_for(self, message_name: str) -> Optional[str]:
+        """Return the _pb2 module name defining message_name"""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._build_index()
+        return self._index.get(message_name)
+
+    def load_module(self, module_name: str):
+        """Import networking.protos.<module_name>, timing the first import"""
+        full_name = f"networking.protos.{module_name}"
+        module = sys.modules.get(full_name)
+        if module is not None:
+            return module
+        with self._lock:
+            module = sys.modules.get(full_name)
+            if module is not None:
+                return module
+            start = time.perf_counter()
+            # Load from the file directly so this also works when the protos
+            # are shipped as data files next to a frozen executable
+            file_path = os.path.join(self.path, module_name + ".py")
+            spec = importlib.util.spec_from_file_location(full_name, file_path)
+            module = importlib.util.module_from_spec(spec)
+            # Insert into sys.modules so relative imports inside will resolve
+            sys.modules[full_name] = module
+            try:
+                spec.loader.exec_module(module)
+            except Exception:
+                del sys.modules[full_name]
+                raise
+            self.load_times[module_name] = time.perf_counter() - start
+        logger.debug(f"Loaded {module_name} in {self.load_times[module_name] * 1000:.1f} ms")
+        return module
+
+    def get(self, message_name: str):
+        """Return the message class called message_name, or None if no proto defines it"""
+        message_class = self._classes.get(message_name)
+        if message_class is not None:
+            return message_class
+        module_name = self.module_for(message_name)
+        if module_name is None:
+            return None
+        message_class = getattr(self.load_module(module_name), message_name, None)
+        if message_class is not None:
+            self._classes[message_name] = message_class
+        return message_class
+
+    def report(self) -> dict:
+        """Summary of how many modules were imported and the time it took"""
+        available = len(set(self._index.values())) if self._index is not None else len(
+            [f for f in os.listdir(self.path) if f.endswith("_pb2.py")])
+        return {
+            "modules_available": available,
+            "modules_loaded": len(self.load_times),
+            "loaded": sorted(self.load_times),
+            "index_ms": self.index_time * 1000,
+            "load_ms": sum(self.load_times.values()) * 1000,
+        }
+
+
+registry = ProtoRegistry()
+
+
+_EAGER_SNIPPET = """
+import os, sys, time, importlib
+sys.path.insert(0, {path!r}); sys.path.insert(0, {ui_root!r})
+start = time.perf_counter()
+for f in sorted(os.listdir({path!r})):
+    if f.endswith("_pb2.py"):
+        importlib.import_module("networking.protos." + f[:-3])
+print(time.perf_counter() - start)
+"""
+
+_LAZY_SNIPPET = """
+import sys, time
+sys.path.insert(0, {ui_root!r})
+start = time.perf_counter()
+from src.models.proto_registry import registry
+registry.get({message!r})
+print(time.perf_counter() - start)
+"""
+
+
+def main():
+    """Compare cold-start cost of importing every _pb2 module with lazy loading"""
+    message = sys.argv[1] if len(sys.argv) > 1 else "SS2C_LOBBY_CHARACTER_INFO_RES"
+    runs = 5
+
+    def measure(snippet):
+        code = snippet.format(path=protos_path, ui_root=ui_root, message=message)
+        times = []
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+            times.append(float(out.stdout.strip().splitlines()[-1]))
+        return min(times)
+
+    eager = measure(_EAGER_SNIPPET)
+    lazy = measure(_LAZY_SNIPPET)
+    print(f"Eager import of all _pb2 modules: {eager * 1000:.1f} ms")
+    print(f"Lazy load of {message}:  {lazy * 1000:.1f} ms")
+    print(f"Saved at startup: {(eager - lazy) * 1000:.1f} ms ({(1 - lazy / eager) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
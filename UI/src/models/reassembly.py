@@ -0,0 +1,221 @@
+import struct
+import time
+import logging
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Every game message starts with <length:u32><proto_type:u16><padding:u16>
+FRAME_HEADER = struct.Struct('<IHH')
+HEADER_SIZE = FRAME_HEADER.size
+
+SEQ_MOD = 1 << 32
+SEQ_HALF = 1 << 31
+
+
+def seq_diff(a: int, b: int) -> int:
+    """Signed distance from sequence number b to a, honouring 32-bit wrap-around"""
+    d = (a - b) % SEQ_MOD
+    return d - SEQ_MOD if d >= SEQ_HALF else d
+
+
+class TcpStream:
+    """Reassembly state for a single TCP direction"""
+
+    def __init__(self, max_pending_segments: int = 256):
+        self.buffer = bytearray()
+        self.start = 0  # read offset of the first unconsumed byte in buffer
+        self.next_seq = None
+        self.pending: Dict[int, bytes] = {}
+        self.max_pending_segments = max_pending_segments
+        self.last_seen = time.monotonic()
+        self.frame_started = self.last_seen  # arrival of the first byte of the frame at the read offset
+
+    def __len__(self):
+        return len(self.buffer) - self.start
+
+    def reset(self) -> None:
+        """Drop buffered bytes; the next segment resynchronises the stream"""
+        self.buffer = bytearray()
+        self.start = 0
+        self.next_seq = None
+        self.pending.clear()
+
+    def add_segment(self, data: bytes, seq: Optional[int] = None) -> int:
+        """
+        Add a segment to the stream in sequence order.
+
+        Segments without a sequence number are appended as-is. Retransmitted
+        bytes are trimmed and segments arriving ahead of a gap are held until
+        the gap is filled.
+
+        Returns:
+            Number of segments that had to be discarded
+        """
+        self.last_seen = time.monotonic()
+        if not len(self):
+            self.frame_started = self.last_seen
+        if seq is None:
+            self.buffer += data
+            return 0
+
+        if self.next_seq is None:
+            self.next_seq = seq
+
+        offset = seq_diff(seq, self.next_seq)
+        if offset > 0:
+            # Out of order: hold until the missing bytes arrive
+            if len(self.pending) >= self.max_pending_segments:
+                logger.warning(f"Too many out-of-order segments ({len(self.pending)}), resetting stream")
+                dropped = len(self.pending) + 1
+                self.reset()
+                return dropped
+            self.pending.setdefault(seq, data)
+            return 0
+        if offset < 0:
+            # Retransmission overlapping bytes we already have
+            if -offset >= len(data):
+                return 0
+            data = data[-offset:]
+
+        self.buffer += data
+        self.next_seq = (self.next_seq + len(data)) % SEQ_MOD
+        self._drain_pending()
+        return 0
+
+    def _drain_pending(self) -> None:
+        while self.pending:
+            progressed = False
+            for seq in list(self.pending):
+                offset = seq_diff(seq, self.next_seq)
+                if offset > 0:
+                    continue
+                data = self.pending.pop(seq)
+                if -offset < len(data):
+                    data = data[-offset:]
+                    self.buffer += data
+                    self.next_seq = (self.next_seq + len(data)) % SEQ_MOD
+                progressed = True
+            if not progressed:
+                break
+
+    def frames(self, validate: Callable[[int, int, int], bool]) -> Iterator[Tuple[int, bytes, float]]:
+        """
+        Yield (proto_type, frame, first_seen) for every complete frame in the buffer.
+
+        first_seen is the monotonic time the segment carrying the frame's
+        first byte arrived.
+
+        Raises:
+            ValueError: If a frame header fails validation. The buffer is
+                reset before raising so the stream can resynchronise.
+        """
+        buffer = self.buffer
+        while len(buffer) - self.start >= HEADER_SIZE:
+            length, proto_type, padding = FRAME_HEADER.unpack_from(buffer, self.start)
+            if not validate(length, proto_type, padding):
+                self.reset()
+                raise ValueError((length, proto_type, padding))
+            end = self.start + length
+            if end > len(buffer):
+                break
+            frame = bytes(memoryview(buffer)[self.start:end])
+            self.start = end
+            started = self.frame_started
+            # Bytes left over belong to a frame that began in the latest segment
+            self.frame_started = self.last_seen
+            yield proto_type, frame, started
+        self._compact()
+
+    def _compact(self) -> None:
+        # Release consumed bytes once they make up most of the buffer, so the
+        # cost of moving the remaining tail is amortised over many frames
+        if self.start and self.start * 2 >= len(self.buffer):
+            del self.buffer[:self.start]
+            self.start = 0
+
+
+class TcpReassembler:
+    """
+    Reassembles length-prefixed game frames from TCP segments.
+
+    State is kept per stream (normally the TCP 4-tuple), so interleaved
+    connections never corrupt each other and a segment carrying the tail of
+    one frame and the head of the next yields both.
+    """
+
+    def __init__(self,
+                 validate: Callable[[int, int, int], bool],
+                 max_buffer_size: int = 4 * 1024 * 1024,
+                 stream_idle_timeout: float = 300.0,
+                 max_streams: int = 64):
+        self.validate = validate
+        self.max_buffer_size = max_buffer_size
+        self.stream_idle_timeout = stream_idle_timeout
+        self.max_streams = max_streams
+        self.streams: Dict[Hashable, TcpStream] = {}
+
+        # Counters
+        self.frames_extracted = 0
+        self.invalid_headers = 0
+        self.buffer_resets = 0
+        self.dropped_segments = 0
+
+    def feed(self, key: Hashable, data: bytes, seq: Optional[int] = None) -> List[Tuple[int, bytes, float]]:
+        """
+        Add a TCP payload to its stream and return all frames it completed.
+
+        Args:
+            key: Stream identifier, e.g. (src_ip, src_port, dst_ip, dst_port)
+            data: TCP payload bytes
+            seq: TCP sequence number of the first payload byte, if known
+
+        Returns:
+            List of (proto_type, frame_bytes, first_seen) tuples in stream order,
+            first_seen being the monotonic time the frame's first segment arrived
+        """
+        if not data:
+            return []
+
+        stream = self.streams.get(key)
+        if stream is None:
+            if len(self.streams) >= self.max_streams:
+                self._expire_streams()
+            stream = self.streams[key] = TcpStream()
+
+        self.dropped_segments += stream.add_segment(data, seq)
+
+        frames = []
+        try:
+            for frame in stream.frames(self.validate):
+                frames.append(frame)
+        except ValueError as e:
+            length, proto_type, padding = e.args[0]
+            logger.warning(f"Invalid packet header on {key}: Type={proto_type}, Length={length}, Padding={padding}")
+            self.invalid_headers += 1
+            self.buffer_resets += 1
+
+        if len(stream) > self.max_buffer_size:
+            logger.warning(f"Stream buffer exceeded max size ({self.max_buffer_size} bytes) on {key}")
+            stream.reset()
+            self.buffer_resets += 1
+
+        self.frames_extracted += len(frames)
+        return frames
+
+    def pending_bytes(self) -> int:
+        """Total number of buffered, not yet framed bytes across all streams"""
+        return sum(len(s) for s in self.streams.values())
+
+    def reset(self) -> None:
+        """Forget all streams"""
+        self.streams.clear()
+
+    def _expire_streams(self) -> None:
+        now = time.monotonic()
+        idle = [k for k, s in self.streams.items() if now - s.last_seen > self.stream_idle_timeout]
+        if not idle:
+            # Every stream is active; evict the least recently used one
+            idle = [min(self.streams, key=lambda k: self.streams[k].last_seen)]
+        for key in idle:
+            del self.streams[key]
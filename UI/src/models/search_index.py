@@ -0,0 +1,352 @@
+import difflib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Mapping, Optional, Set, Tuple
+
+from src.models.game_data import item_data_manager
+from .design_ids import item_properties
+
+logger = logging.getLogger(__name__)
+
+# Keywords whose matching terms are remembered; typing a query repeats most of them
+MAX_CACHED_KEYWORDS = 512
+
+SUGGEST_LIMIT = 10
+# Share of a query's trigrams a term needs before it is scored as a suggestion
+MIN_TRIGRAM_OVERLAP = 0.34
+# Terms sharing the most trigrams that are compared for typos per suggestion query
+MAX_FUZZY_CANDIDATES = 50
+# difflib ratio a term needs to be suggested for a query it does not contain
+MIN_FUZZY_RATIO = 0.6
+
+# Kinds of terms, by their position in a document's terms
+KIND_ITEM = "item"
+KIND_RARITY = "rarity"
+KIND_PROPERTY = "property"
+
+
+def trigrams(text: str, partial_last_word: bool = False) -> Set[str]:
+    """
+    Trigrams of each word, padded so that word starts are trigrams of their own.
+
+    Args:
+        partial_last_word: The last word may still be being typed, so its
+            end is not marked; it then matches every word it is a prefix of
+    """
+    grams = set()
+    words = text.split()
+    for i, word in enumerate(words):
+        padded = f"  {word}" if partial_last_word and i == len(words) - 1 else f"  {word} "
+        for j in range(len(padded) - 2):
+            grams.add(padded[j:j + 3])
+    return grams
+
+
+class TrigramIndex:
+    """Terms by trigram, for finding terms close to a partial or misspelled query"""
+
+    def __init__(self):
+        self._terms: Dict[str, Set[str]] = {}
+
+    def add(self, term: str) -> None:
+        for gram in trigrams(term):
+            self._terms.setdefault(gram, set()).add(term)
+
+    def remove(self, term: str) -> None:
+        for gram in trigrams(term):
+            terms = self._terms.get(gram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._terms[gram]
+
+    def candidates(self, query: str) -> Dict[str, int]:
+        """Terms sharing enough trigrams with a query typed so far, with the number shared"""
+        grams = trigrams(query, partial_last_word=True)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for term in self._terms.get(gram, ()):
+                shared[term] = shared.get(term, 0) + 1
+        needed = max(1, int(len(grams) * MIN_TRIGRAM_OVERLAP + 0.999))
+        return {term: n for term, n in shared.items() if n >= needed}
+
+
+def match_score(query: str, term: str) -> Tuple[int, float]:
+    """
+    How well a term completes a query it contains.
+
+    Returns:
+        (tier, similarity): tier 4 for an exact match, 3 for a prefix, 2 for
+        the start of a later word, 1 for any other substring, 0 if the query
+        is not in the term; similarity orders terms within a tier
+    """
+    if term == query:
+        return 4, 1.0
+    if query not in term:
+        return 0, 0.0
+    # Shorter completions first
+    similarity = len(query) / len(term)
+    if term.startswith(query):
+        return 3, similarity
+    if f" {query}" in term:
+        return 2, similarity
+    return 1, similarity
+
+
+def fuzzy_score(query: str, term: str) -> float:
+    """difflib ratio of a query to the closest part of a term starting at a word, or 0.0 below MIN_FUZZY_RATIO"""
+    best = 0.0
+    matcher = difflib.SequenceMatcher(None, b=query)
+    starts = [0] + [i + 1 for i, c in enumerate(term) if c == " "]
+    for start in starts:
+        matcher.set_seq1(term[start:start + len(query) + 1])
+        if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best:
+            best = max(best, matcher.ratio())
+    return best if best >= MIN_FUZZY_RATIO else 0.0
+
+
+class SearchIndex:
+    """
+    Inverted index over the items of all characters, for search_items.
+
+    Every item is a document whose terms are its lowercased name, rarity and
+    property names. A keyword matches every term it is a substring of, so
+    the item set of a keyword is the union of those terms' posting lists and
+    a query intersects the sets of its keywords. Terms are the game's item
+    and property vocabulary, so matching a keyword does not get slower as
+    characters are added.
+
+    The index follows the published characters: sync() reindexes only the
+    characters whose dict was replaced since the last sync.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # char id -> character dict the documents were built from, in snapshot order
+        self._characters: Dict[str, dict] = {}
+        self._char_docs: Dict[str, List[int]] = {}
+        # doc id -> search result, built when the item is indexed
+        self._docs: Dict[int, dict] = {}
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._next_doc = 0
+        # doc id -> position in character, stash and slot order
+        self._rank: Dict[int, int] = {}
+        # keyword -> terms containing it; cleared whenever the vocabulary changes
+        self._matches: "OrderedDict[str, FrozenSet[str]]" = OrderedDict()
+        # Suggestion vocabulary: terms of indexed items, and item names from the catalog
+        self._term_index = TrigramIndex()
+        # term -> (display text, kind)
+        self._term_info: Dict[str, Tuple[str, str]] = {}
+        self._catalog_index: Optional[TrigramIndex] = None
+        self._catalog_names: Dict[str, str] = {}
+        self._catalog_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def sync(self, characters: Mapping[str, dict]) -> int:
+        """
+        Bring the index in line with a set of characters.
+
+        Returns:
+            Number of characters that were (re)indexed or removed
+        """
+        with self._lock:
+            changed = 0
+            order = list(self._characters)
+            for char_id in list(self._characters):
+                if char_id not in characters:
+                    self._remove(char_id)
+                    changed += 1
+            for char_id, char in characters.items():
+                if self._characters.get(char_id) is not char:
+                    self._remove(char_id)
+                    self._add(char_id, char)
+                    changed += 1
+            self._characters = {char_id: characters[char_id] for char_id in characters}
+            if changed or order != list(self._characters):
+                self._rank = {doc_id: i for i, doc_id in enumerate(
+                    doc_id for char_id in self._characters for doc_id in self._char_docs[char_id])}
+        if changed:
+            logger.debug(f"Search index: {changed} characters updated, {len(self._docs)} items, "
+                         f"{len(self._postings)} terms")
+        return changed
+
+    def _add(self, char_id: str, char: dict) -> None:
+        doc_ids = []
+        for stash_id, stash in char.get('stashes', {}).items():
+            if not isinstance(stash, list):
+                continue
+            for item in stash:
+                try:
+                    entry = item_data_manager.lookup_design_str(item.get("itemId", ""))
+                    data = item.get("data", {})
+                    pp = item_properties(data, "primaryPropertyArray")
+                    sp = item_properties(data, "secondaryPropertyArray")
+                    terms = (entry.name.lower(), entry.rarity.lower(),
+                             *[p[0].lower() for p in pp], *[p[0].lower() for p in sp])
+                except Exception as e:
+                    logger.error(f"Error indexing item for search: {str(e)}")
+                    continue
+                doc_id = self._next_doc
+                self._next_doc += 1
+                # Character fields cannot go stale: a changed character dict is reindexed
+                self._docs[doc_id] = {
+                    'nickname': char['nickname'],
+                    'id': char['id'],
+                    'class': char['class'],
+                    'level': char['level'],
+                    'itemCount': item.get("itemCount", 1),
+                    'slotId': item.get("slotId", 0),
+                    'item': {
+                        'name': entry.name,
+                        'rarity': entry.rarity,
+                        'pp': pp,
+                        'sp': sp
+                    },
+                    'stash_id': stash_id
+                }
+                self._doc_terms[doc_id] = terms
+                for position, term in enumerate(terms):
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = set()
+                        self._matches.clear()
+                        self._term_index.add(term)
+                        if position == 0:
+                            self._term_info[term] = (entry.name, KIND_ITEM)
+                        elif position == 1:
+                            self._term_info[term] = (entry.rarity, KIND_RARITY)
+                        else:
+                            self._term_info[term] = ((pp + sp)[position - 2][0], KIND_PROPERTY)
+                    postings.add(doc_id)
+                doc_ids.append(doc_id)
+        self._char_docs[char_id] = doc_ids
+        self._characters[char_id] = char
+
+    def _remove(self, char_id: str) -> None:
+        for doc_id in self._char_docs.pop(char_id, ()):
+            del self._docs[doc_id]
+            for term in self._doc_terms.pop(doc_id):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[term]
+                    self._matches.clear()
+                    self._term_index.remove(term)
+                    self._term_info.pop(term, None)
+        self._characters.pop(char_id, None)
+
+    def _terms_matching(self, keyword: str) -> FrozenSet[str]:
+        terms = self._matches.get(keyword)
+        if terms is not None:
+            self._matches.move_to_end(keyword)
+            return terms
+        # While typing, the keyword without its last character was usually just looked up
+        candidates = self._matches.get(keyword[:-1]) if len(keyword) > 1 else None
+        terms = frozenset(term for term in (candidates if candidates is not None else self._postings)
+                          if keyword in term)
+        self._matches[keyword] = terms
+        if len(self._matches) > MAX_CACHED_KEYWORDS:
+            self._matches.popitem(last=False)
+        return terms
+
+    def search(self, keywords: List[str], limit: Optional[int] = None) -> List[dict]:
+        """
+        Items matching every keyword, in character, stash and slot order.
+
+        Args:
+            keywords: Lowercased keywords; an empty keyword matches everything
+            limit: Return at most this many results
+        """
+        with self._lock:
+            keywords = [k for k in keywords if k]
+            if keywords:
+                # Smallest sets first keeps the intersection cheap
+                matches = []
+                for keyword in set(keywords):
+                    docs = set()
+                    for term in self._terms_matching(keyword):
+                        docs.update(self._postings[term])
+                    if not docs:
+                        return []
+                    matches.append(docs)
+                matches.sort(key=len)
+                doc_ids = matches[0].intersection(*matches[1:])
+            else:
+                doc_ids = self._docs.keys()
+            ranked = sorted(doc_ids, key=self._rank.__getitem__)
+            if limit is not None:
+                ranked = ranked[:limit]
+            docs = self._docs
+            # Copies, so callers cannot change the indexed results
+            return [dict(docs[doc_id]) for doc_id in ranked]
+
+    def _catalog(self) -> Tuple[TrigramIndex, Dict[str, str]]:
+        """Trigram index over the names of all catalog items, built on first use"""
+        with self._catalog_lock:
+            if self._catalog_index is None:
+                index, names = TrigramIndex(), {}
+                try:
+                    for entry in item_data_manager.items:
+                        term = entry.name.lower() if isinstance(entry.name, str) else ""
+                        if term and term not in names:
+                            names[term] = entry.name
+                            index.add(term)
+                except Exception as e:
+                    # Suggestions still cover owned items
+                    logger.warning(f"Item catalog unavailable for suggestions: {e}")
+                    index, names = TrigramIndex(), {}
+                self._catalog_index, self._catalog_names = index, names
+            return self._catalog_index, self._catalog_names
+
+    def suggest(self, query: str, limit: int = SUGGEST_LIMIT) -> List[dict]:
+        """
+        Ranked completions for the last keyword of a search query.
+
+        Owned items, rarities and properties are suggested along with catalog
+        items that are not in any stash. Prefix and word-prefix matches come
+        first, then other substrings, then likely typos; within a tier, terms
+        with owned items and then closer matches rank higher.
+
+        Returns:
+            [{"text", "kind", "count": matching owned items, "query": the
+            whole query with the keyword completed}]
+        """
+        head, _, keyword = query.rpartition(",")
+        keyword = " ".join(keyword.lower().split())
+        if not keyword:
+            return []
+        prefix = f"{head}, " if head else ""
+        catalog_index, catalog_names = self._catalog()
+        with self._lock:
+            shared = catalog_index.candidates(keyword)
+            for term, n in self._term_index.candidates(keyword).items():
+                shared[term] = max(n, shared.get(term, 0))
+            scored = []
+            for term in shared:
+                tier, similarity = match_score(keyword, term)
+                if tier:
+                    scored.append((term, tier, similarity))
+            # Typos rank below every substring match, so they are only looked for to fill the list
+            if len(scored) < limit:
+                matched = {term for term, _, _ in scored}
+                candidates = sorted((term for term in shared if term not in matched),
+                                    key=shared.__getitem__, reverse=True)[:MAX_FUZZY_CANDIDATES]
+                for term in candidates:
+                    similarity = fuzzy_score(keyword, term)
+                    if similarity:
+                        scored.append((term, 0, similarity))
+            ranked = []
+            for term, tier, similarity in scored:
+                postings = self._postings.get(term)
+                count = len(postings) if postings else 0
+                text, kind = self._term_info.get(term) or (catalog_names[term], KIND_ITEM)
+                ranked.append(((tier, count > 0, similarity, count), term, text, kind, count))
+        ranked.sort(key=lambda r: (tuple(-v for v in r[0]), r[1]))
+        return [{"text": text, "kind": kind, "count": count, "query": prefix + text}
+                for _, _, text, kind, count in ranked[:limit]]
@@ -0,0 +1,225 @@
+import os
+import time
+import zlib
+import shutil
+import struct
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from .packet_archive import is_packet_dump
+from .persistence import atomic_write, writer
+from .json_stream import STREAMING_JSON_SIZE, load_character_json
+from .proto_registry import registry as proto_registry
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_EXTENSION = ".snap"
+LEGACY_JSON_DIR = "legacy_json"
+
+MAGIC = b"DNDS"
+FORMAT_VERSION = 1
+# Bump when the captured message changes in a way old snapshots cannot be parsed with
+SCHEMA_VERSION = 1
+SNAPSHOT_MESSAGE = "SS2C_LOBBY_CHARACTER_INFO_RES"
+
+FLAG_ZLIB = 0x1
+
+# magic, format version, flags, schema version, character id length,
+# capture time, payload length, payload crc32
+_HEADER = struct.Struct("<4sHHHHdII")
+
+
+@dataclass
+class SnapshotHeader:
+    character_id: str
+    captured_at: float
+    schema_version: int
+    compressed: bool
+    payload_size: int
+
+
+def snapshot_path(data_dir: str, character_id: str) -> str:
+    return os.path.join(data_dir, f"{character_id}{SNAPSHOT_EXTENSION}")
+
+
+def legacy_json_path(data_dir: str, character_id: str) -> str:
+    """Where migrate_json_files keeps the JSON file a snapshot was converted from"""
+    return os.path.join(data_dir, LEGACY_JSON_DIR, f"{character_id}.json")
+
+
+def encode_snapshot(payload: bytes, character_id: str,
+                    captured_at: Optional[float] = None, compress: bool = True) -> bytes:
+    """Serialized protobuf bytes as the contents of a snapshot file"""
+    flags = 0
+    if compress:
+        payload = zlib.compress(payload, 6)
+        flags |= FLAG_ZLIB
+    char_id = str(character_id).encode("utf-8")
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, flags, SCHEMA_VERSION, len(char_id),
+                          time.time() if captured_at is None else captured_at,
+                          len(payload), zlib.crc32(payload))
+    return header + char_id + payload
+
+
+def write_snapshot(path: str, payload: bytes, character_id: str,
+                   captured_at: Optional[float] = None, compress: bool = True) -> int:
+    """
+    Write serialized protobuf bytes as a snapshot file.
+
+    The file is replaced atomically, so readers never see a partial snapshot.
+
+    Returns:
+        Size of the written file in bytes
+    """
+    return atomic_write(path, encode_snapshot(payload, character_id, captured_at, compress))
+
+
+def read_snapshot(path: str, header_only: bool = False) -> Tuple[SnapshotHeader, Optional[bytes]]:
+    """
+    Read a snapshot file.
+
+    Returns:
+        (header, serialized message bytes), the bytes being None with header_only
+
+    Raises:
+        ValueError: If the file is not a snapshot, is truncated, fails its
+            checksum, or holds a message schema other than SCHEMA_VERSION
+            (the header alone is still returned with header_only)
+    """
+    with open(path, "rb") as f:
+        raw = f.read(_HEADER.size)
+        if len(raw) < _HEADER.size:
+            raise ValueError(f"Truncated snapshot header in {path}")
+        magic, version, flags, schema, id_len, captured_at, size, crc = _HEADER.unpack(raw)
+        if magic != MAGIC:
+            raise ValueError(f"Not a snapshot file: {path}")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Snapshot format {version} is newer than supported ({FORMAT_VERSION}): {path}")
+        header = SnapshotHeader(
+            character_id=f.read(id_len).decode("utf-8"),
+            captured_at=captured_at,
+            schema_version=schema,
+            compressed=bool(flags & FLAG_ZLIB),
+            payload_size=size,
+        )
+        if header_only:
+            return header, None
+        if schema != SCHEMA_VERSION:
+            # No migrations between schemas exist yet
+            raise ValueError(f"Snapshot schema {schema} is not supported ({SCHEMA_VERSION}): {path}")
+        payload = f.read(size)
+    if len(payload) < size:
+        raise ValueError(f"Truncated snapshot payload in {path}")
+    if zlib.crc32(payload) != crc:
+        raise ValueError(f"Snapshot checksum mismatch in {path}")
+    if header.compressed:
+        payload = zlib.decompress(payload)
+    return header, payload
+
+
+def save_character_snapshot(data_dir: str, message, captured_at: Optional[float] = None,
+                            coalesce: bool = False) -> str:
+    """
+    Save a character info packet as <characterId>.snap, returning the path.
+
+    Args:
+        coalesce: Let the shared writer merge captures of the same character
+            that arrive in a burst; only the last one is compressed and written
+    """
+    character_id = str(message.characterDataBase.characterId)
+    path = snapshot_path(data_dir, character_id)
+    payload = message.SerializeToString()
+    captured_at = time.time() if captured_at is None else captured_at
+    writer.write(path, lambda: encode_snapshot(payload, character_id, captured_at), coalesce=coalesce)
+    return path
+
+
+def load_character_message(path: str):
+    """
+    Parse a snapshot into a character info message.
+
+    Returns:
+        (header, message)
+    """
+    header, payload = read_snapshot(path)
+    message = proto_registry.get(SNAPSHOT_MESSAGE)()
+    message.ParseFromString(payload)
+    return header, message
+
+
+def load_packet_data(path: str) -> Tuple[SnapshotHeader, dict]:
+    """
+    Load a snapshot as the dict layout used by character JSON files.
+
+    The message is converted straight to dicts, with no JSON text in between.
+    """
+    from google.protobuf.json_format import MessageToDict
+    header, message = load_character_message(path)
+    return header, MessageToDict(message)
+
+
+def migrate_json_files(data_dir: str) -> List[str]:
+    """
+    Convert <characterId>.json files from older versions to snapshots.
+
+    Converted JSON files are moved to legacy_json/ in the data directory
+    rather than deleted. Timestamped packet dumps are left alone.
+
+    Returns:
+        Character ids that were migrated
+    """
+    from google.protobuf.json_format import Parse, ParseDict
+    migrated = []
+    for name in sorted(os.listdir(data_dir)):
+        if not name.endswith(".json") or is_packet_dump(name):
+            continue
+        path = os.path.join(data_dir, name)
+        try:
+            message = proto_registry.get(SNAPSHOT_MESSAGE)()
+            if os.path.getsize(path) > STREAMING_JSON_SIZE:
+                packet_data = load_character_json(path, keys=None)
+                if "characterDataBase" not in packet_data:
+                    continue
+                ParseDict(packet_data, message, ignore_unknown_fields=True)
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+                if '"characterDataBase"' not in text:
+                    continue
+                Parse(text, message, ignore_unknown_fields=True)
+            character_id = str(message.characterDataBase.characterId)
+            if not character_id:
+                continue
+            target = snapshot_path(data_dir, character_id)
+            mtime = os.path.getmtime(path)
+            # A snapshot captured after this file already holds newer data
+            if not os.path.exists(target) or os.path.getmtime(target) < mtime:
+                write_snapshot(target, message.SerializeToString(), character_id, captured_at=mtime)
+            legacy_dir = os.path.join(data_dir, LEGACY_JSON_DIR)
+            os.makedirs(legacy_dir, exist_ok=True)
+            shutil.move(path, os.path.join(legacy_dir, name))
+            migrated.append(character_id)
+        except Exception as e:
+            # Keep the JSON file; the loader still reads it as before
+            logger.warning(f"Could not migrate {path} to a snapshot: {e}")
+    if migrated:
+        logger.info(f"Migrated {len(migrated)} character files to snapshots")
+    return migrated
+
+
+def main():
+    """Show snapshot headers and compare their size with the equivalent JSON"""
+    import sys
+    from google.protobuf.json_format import MessageToJson
+    for path in sys.argv[1:]:
+        header, message = load_character_message(path)
+        json_size = len(MessageToJson(message).encode("utf-8"))
+        snap_size = os.path.getsize(path)
+        print(f"{path}: character={header.character_id} schema={header.schema_version} "
+              f"captured={time.ctime(header.captured_at)} compressed={header.compressed} "
+              f"size={snap_size} bytes (JSON {json_size} bytes, {json_size / snap_size:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
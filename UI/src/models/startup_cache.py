@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import marshal
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DNDC"
+# Bump whenever the layout of a parsed character entry changes
+CACHE_VERSION = 1
+
+# file path -> (file signature, parsed result or None)
+Entries = Dict[str, Tuple[tuple, Optional[dict]]]
+
+
+def python_tag() -> str:
+    """Interpreter that wrote a marshal cache; marshal data is only guaranteed to load on the same version"""
+    return f"{sys.implementation.name}-{sys.version_info[0]}.{sys.version_info[1]}"
+
+
+def encode_startup_cache(entries: Entries, dependencies) -> bytes:
+    """
+    Contents of the startup cache file.
+
+    Args:
+        entries: StashManager's per-file cache
+        dependencies: Signature of everything else the parsed entries depend
+            on, such as the item database; a mismatch discards the cache
+    """
+    return MAGIC + marshal.dumps({
+        "version": CACHE_VERSION,
+        "python": python_tag(),
+        "dependencies": dependencies,
+        "saved": time.time(),
+        "entries": entries,
+    })
+
+
+def load_startup_cache(path: str, dependencies) -> Entries:
+    """
+    Load the persisted per-file cache.
+
+    Entries still have to be validated against the files on disk; an
+    unusable cache (missing, corrupt, other version) yields no entries.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return {}
+    except OSError as e:
+        logger.warning(f"Could not read startup cache: {e}")
+        return {}
+    if not data.startswith(MAGIC):
+        logger.warning("Ignoring startup cache with unknown format")
+        return {}
+    try:
+        cache = marshal.loads(data[len(MAGIC):])
+    except (EOFError, ValueError, TypeError) as e:
+        logger.warning(f"Ignoring corrupt startup cache: {e}")
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION or cache.get("python") != python_tag():
+        logger.info("Startup cache was written by another version, ignoring it")
+        return {}
+    if cache.get("dependencies") != dependencies:
+        logger.info("Game data changed since the startup cache was written, ignoring it")
+        return {}
+    return cache.get("entries", {})
@@ -4,26 +4,183 @@ import os
 import time
 from typing import Dict, List, Optional
 import glob
+import uuid
 from datetime import datetime
-from .stash_preview import parse_stashes, StashPreviewGenerator, ItemInfo
-from .storage import Storage, StashType
-from .sort import StashSorter
+from .stash_preview import parse_stashes, stash_item, StashPreviewGenerator, ItemInfo
+from .character_history import history
+from .inventory_tracker import DELTA_SUFFIX, apply_ops_to_stashes, load_deltas, delta_path
+from .data_watcher import create_watcher
+from .snapshot import (SNAPSHOT_EXTENSION, legacy_json_path, load_packet_data, migrate_json_files,
+                       snapshot_path)
+from .json_stream import STREAMING_JSON_SIZE, load_character_json
+from .packet_archive import archive as packet_archive, is_packet_dump
+from .startup_cache import encode_startup_cache, load_startup_cache
+from .persistence import atomic_write_json, writer
 from src.models.game_data import item_data_manager
-import pygetwindow as gw
-from .appdirs import get_data_dir, get_output_dir, resource_path
-from concurrent.futures import ThreadPoolExecutor as ThreadPool
+from .design_ids import character_classes, item_properties, ranks
+from .search_index import SUGGEST_LIMIT, SearchIndex
+from .appdirs import get_data_dir, get_output_dir, get_startup_cache_file, resource_path
+from concurrent.futures import ThreadPoolExecutor as ThreadPool, ProcessPoolExecutor as ProcessPool
+from types import MappingProxyType
+import threading
 import logging
+import marshal
+import multiprocessing
 
 logger = logging.getLogger(__name__)
 
+LOAD_STRATEGIES = ("auto", "serial", "threads", "processes")
+# Starting worker processes costs more than parsing a handful of characters:
+# "auto" only uses them once this much work is stale (see _load_work), and only
+# where workers are forked: spawned workers re-run the main module, which for
+# app.py starts the whole app
+PROCESS_POOL_MIN_WORK = 32 * 1024 * 1024
+PROCESS_POOL_MIN_FILES = 8
+# Snapshots are compressed protobuf; decoding one costs about as much as
+# parsing a JSON file this many times its size
+SNAPSHOT_WORK_FACTOR = 8
+
+
+def build_character(packet_data, file_path, last_update, data_dir):
+    """Build the cached character entry from a character info packet in dict form"""
+    char_data = packet_data.get("characterDataBase", {})
+    if not char_data:
+        return None
+    char_id = str(char_data.get("characterId"))
+    if not char_id:
+        logger.warning(f"No characterId in {file_path}")
+        return None
+
+    # Parse stashes efficiently
+    raw_stashes = parse_stashes(packet_data)
+    stashes = {str(k): v for k, v in raw_stashes.items()}
+    # Replay inventory changes captured since the character file was saved
+    ops = load_deltas(delta_path(char_id, data_dir))
+    if ops:
+        apply_ops_to_stashes(stashes, ops)
+
+    # Extract character data
+    class_name = character_classes.name(char_data.get("characterClass", ""))
+    nickname_data = char_data.get("nickName", {})
+
+    return {
+        'id': char_id,
+        'file_path': file_path,
+        'character_data': {
+            'id': char_id,
+            'nickname': nickname_data.get("originalNickName", "Unknown"),
+            'class': class_name,
+            'level': char_data.get("level", 1),
+            'lastUpdate': datetime.fromtimestamp(last_update).isoformat(),
+            'stashes': stashes,
+            'streamingModeName': nickname_data.get("streamingModeNickName", ""),
+            'rank': {
+                'name': ranks.name(nickname_data.get("rankId", "Unknown")),
+                'fame': nickname_data.get("fame", 0),
+                'iconType': nickname_data.get("rankIconType", 1)
+            }
+        }
+    }
+
+
+def load_character_packet(file_path, data_dir):
+    """
+    Read the character info packet of a snapshot or JSON file in dict form.
+
+    Snapshots are checksummed, so they are read whatever their size. One
+    that cannot be read, such as one written with another schema version,
+    falls back to the JSON file it was migrated from, if that is still
+    around. Large JSON files are streamed, keeping only the fields
+    characters are built from, so peak memory does not include the
+    document text.
+
+    Returns:
+        (packet data, capture time)
+
+    Raises:
+        Exception: If the file cannot be read or parsed
+    """
+    if file_path.endswith(SNAPSHOT_EXTENSION):
+        try:
+            header, packet_data = load_packet_data(file_path)
+            return packet_data, header.captured_at
+        except ValueError as e:
+            legacy_file = legacy_json_path(data_dir, os.path.basename(file_path)[:-len(SNAPSHOT_EXTENSION)])
+            if not os.path.exists(legacy_file):
+                raise
+            logger.warning(f"{e}; reading {legacy_file} instead")
+            file_path = legacy_file
+    file_size = os.path.getsize(file_path)
+    if file_size > STREAMING_JSON_SIZE:
+        logger.info(f"Streaming large file: {file_path} ({file_size/1024/1024:.2f} MB)")
+        packet_data = load_character_json(file_path)
+    else:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            packet_data = json.load(f)
+    return packet_data, os.path.getmtime(file_path)
+
+
+def parse_character_file(file_path, data_dir):
+    """
+    Parse a character snapshot or JSON file; see load_character_packet.
+
+    Returns:
+        The character entry, or None for non-character files
+
+    Raises:
+        Exception: If the file cannot be read or parsed
+    """
+    packet_data, last_update = load_character_packet(file_path, data_dir)
+    return build_character(packet_data, file_path, last_update, data_dir)
+
+
+def _parse_character_file_packed(file_path, data_dir):
+    """parse_character_file for worker processes; marshal is a cheaper way back than pickle"""
+    return marshal.dumps(parse_character_file(file_path, data_dir))
+
+class CharacterSnapshot:
+    """
+    Read-only view of every loaded character.
+
+    A snapshot is never modified after it is published; changes build a new
+    one and swap it in, so readers need no lock and always see a complete
+    set of characters. Character dicts inside it are not mutated either.
+    """
+    __slots__ = ("generation", "characters", "created")
+
+    def __init__(self, generation: int, characters: Dict[str, Dict]):
+        self.generation = generation
+        self.characters = MappingProxyType(characters)
+        self.created = time.time()
+
+
 class StashManager:
-    def __init__(self, resource_dir: str, defer_loading=False):
+    def __init__(self, resource_dir: str, defer_loading=False, load_strategy="auto"):
+        """
+        Args:
+            load_strategy: How changed files are parsed: "serial", "threads",
+                "processes", or "auto" to use processes only for large loads
+        """
+        if load_strategy not in LOAD_STRATEGIES:
+            raise ValueError(f"Unknown load strategy: {load_strategy}")
+        self.load_strategy = load_strategy
         self.data_dir = get_data_dir()
         self.output_dir = get_output_dir()
         # Only ensure data directory exists, not output directory
         os.makedirs(self.data_dir, exist_ok=True)
         
-        self.characters_cache = {}
+        self._snapshot = CharacterSnapshot(0, {})
+        # Generations restart at 0 on every launch; see version
+        self._boot_id = uuid.uuid4().hex[:12]
+        # Follows every published snapshot; see _publish
+        self._search_index = SearchIndex()
+        self._write_lock = threading.Lock()  # serializes writers only
+        # file path -> (file signature, load result); see _file_signature.
+        # Changed only under _write_lock
+        self._file_cache = {}
+        self.startup_cache_file = get_startup_cache_file()
+        self._watcher = None
+        self._on_change = None
         self._is_loaded = False
         self.resource_dir = resource_dir
         
@@ -33,16 +190,239 @@ class StashManager:
         if not defer_loading:
             self._load_data()
             
+    @property
+    def snapshot(self) -> CharacterSnapshot:
+        """The current character snapshot; hold on to it for a consistent view across calls"""
+        return self._snapshot
+
+    @property
+    def generation(self) -> int:
+        """Increments every time a new snapshot is published"""
+        return self._snapshot.generation
+
+    @property
+    def version(self) -> str:
+        """Identifies the current snapshot across restarts of the app, e.g. as an HTTP ETag"""
+        return f"{self._boot_id}-{self._snapshot.generation}"
+
+    @property
+    def characters_cache(self) -> MappingProxyType:
+        """Characters by id from the current snapshot (read-only)"""
+        return self._snapshot.characters
+
+    def _publish(self, characters: Dict[str, Dict]) -> None:
+        """Swap in a new snapshot; the caller must hold _write_lock"""
+        self._search_index.sync(characters)
+        self._snapshot = CharacterSnapshot(self._snapshot.generation + 1, characters)
+
     def force_reload(self):
         """Force reload of character data, ignoring the loaded flag"""
         self._is_loaded = False
-        self.characters_cache.clear()
         self._load_data()
-        
+
+    def _cache_dependencies(self):
+        """
+        Content hash of the item database, which parsed stash items are built from.
+
+        The hash rather than the file's mtime, as the onefile build unpacks
+        items.json with a new mtime on every launch.
+        """
+        try:
+            return item_data_manager.source_hash
+        except (AttributeError, OSError):
+            return None
+
+    def load_startup_cache(self) -> int:
+        """
+        Publish characters from the startup cache without parsing any file.
+
+        Only entries whose file is unchanged on disk are published; _load_data
+        still has to run afterwards to pick up new or changed files, and it
+        reuses every entry found valid here.
+
+        Returns:
+            Number of characters published
+        """
+        start_time = time.time()
+        entries = load_startup_cache(self.startup_cache_file, self._cache_dependencies())
+        characters = {}
+        valid = 0
+        for path, (signature, result) in entries.items():
+            if self._file_signature(path) != signature:
+                continue
+            valid += 1
+            with self._write_lock:
+                self._file_cache.setdefault(path, (signature, result))
+            # Snapshots win over a JSON file left for the same character, as in _load_data
+            if result and (result['id'] not in characters or path.endswith(SNAPSHOT_EXTENSION)):
+                characters[result['id']] = result['character_data']
+        if characters:
+            with self._write_lock:
+                if not self._is_loaded:
+                    self._publish(characters)
+        logger.info(f"Startup cache: {len(characters)} characters from {valid} of {len(entries)} "
+                    f"entries in {time.time() - start_time:.3f} seconds")
+        return len(characters)
+
+    def save_startup_cache(self) -> None:
+        """Persist the per-file cache for the next start; saves in quick succession are merged"""
+        dependencies = self._cache_dependencies()
+        # Encoded when the write happens, from the cache as it is by then
+        writer.write(self.startup_cache_file,
+                     lambda: encode_startup_cache(self._file_cache_copy(), dependencies),
+                     coalesce=True, fsync=False)
+
+    def _file_cache_copy(self) -> dict:
+        with self._write_lock:
+            return dict(self._file_cache)
+
+    def update_character(self, character_id: str, message=None) -> bool:
+        """
+        Rebuild a single character after it was captured, leaving the others untouched.
+
+        Args:
+            character_id: Character to rebuild
+            message: The captured character info packet; if None the character's
+                snapshot is read from disk instead
+
+        Returns:
+            True if the character is now in the cache
+        """
+        character_id = str(character_id)
+        file_path = snapshot_path(self.data_dir, character_id)
+        try:
+            if message is None:
+                result = self._load_file(file_path)
+            else:
+                from google.protobuf.json_format import MessageToDict
+                result = self._build_character(MessageToDict(message), file_path, time.time())
+                # Remember the result against the snapshot once it is on disk, so the
+                # next full load does not parse it again. The shared writer may still
+                # be holding the write back.
+                writer.when_written(file_path, lambda: self._cache_written_file(file_path, result))
+        except Exception as e:
+            logger.error(f"Error updating character {character_id}: {str(e)}")
+            return False
+        if not result:
+            return False
+        with self._write_lock:
+            characters = dict(self._snapshot.characters)
+            characters[result['id']] = result['character_data']
+            self._publish(characters)
+        self.save_startup_cache()
+        logger.info(f"Updated character {result['character_data']['nickname']} ({character_id})")
+        return True
+
+    def _cache_written_file(self, file_path, result):
+        with self._write_lock:
+            # Only valid while the published character is still the one written: inventory
+            # deltas or a newer capture since then leave the entry to the next load
+            if self._snapshot.characters.get(result['id']) is not result['character_data']:
+                self._file_cache.pop(file_path, None)
+                return
+            signature = self._file_signature(file_path)
+            if signature is None:
+                return
+            self._file_cache[file_path] = (signature, result)
+        self.save_startup_cache()
+
+    def _file_signature(self, file_path):
+        """(mtime, size) of a data file and of its delta journal, or None if the file is gone"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        try:
+            journal = os.stat(delta_path(stem, self.data_dir))
+            journal_signature = (journal.st_mtime_ns, journal.st_size)
+        except OSError:
+            journal_signature = None
+        return st.st_mtime_ns, st.st_size, journal_signature
+
+    def _load_file(self, file_path):
+        """Load a character file, reusing the previous result if the file and its journal are unchanged"""
+        signature = self._file_signature(file_path)
+        if signature is None:
+            return None
+        cached = self._file_cache.get(file_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        try:
+            result = parse_character_file(file_path, self.data_dir)
+        except Exception as e:
+            logger.error(f"Error loading packet data file {file_path}: {str(e)}")
+            return None
+        # Non-character files are remembered too, so they are not parsed again
+        with self._write_lock:
+            self._file_cache[file_path] = (signature, result)
+        return result
+
+    def _build_character(self, packet_data, file_path, last_update):
+        return build_character(packet_data, file_path, last_update, self.data_dir)
+
+    def _load_work(self, paths) -> int:
+        """Rough parsing cost of files, in JSON bytes"""
+        work = 0
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            work += size * SNAPSHOT_WORK_FACTOR if path.endswith(SNAPSHOT_EXTENSION) else size
+        return work
+
+    def _choose_load_strategy(self, stale) -> str:
+        if self.load_strategy != "auto":
+            return self.load_strategy
+        if len(stale) <= 1:
+            return "serial"
+        if ((os.cpu_count() or 1) > 1 and len(stale) >= PROCESS_POOL_MIN_FILES
+                and multiprocessing.get_start_method() == "fork"
+                and self._load_work(stale) >= PROCESS_POOL_MIN_WORK):
+            return "processes"
+        # Parsing holds the GIL, but threads still overlap reading from a cold disk
+        return "threads"
+
+    def _parse_files(self, paths, strategy) -> None:
+        """Parse files into the file cache using the given strategy"""
+        cpu_count = os.cpu_count() or 4
+        if strategy == "serial":
+            for path in paths:
+                self._load_file(path)
+        elif strategy == "threads":
+            max_workers = max(1, min(cpu_count, len(paths), 8))  # Cap at 8 workers
+            with ThreadPool(max_workers=max_workers) as pool:
+                list(pool.map(self._load_file, paths))
+        else:
+            self._parse_files_in_processes(paths, max(1, min(cpu_count, len(paths))))
+
+    def _parse_files_in_processes(self, paths, max_workers) -> None:
+        """Parse files in worker processes, one file per task"""
+        # Signatures are taken before parsing: a file changing meanwhile is parsed again next load
+        signatures = {path: self._file_signature(path) for path in paths}
+        # Largest first, so one big file does not end up last on a single worker
+        ordered = sorted((p for p in paths if signatures[p] is not None),
+                         key=lambda p: signatures[p][1], reverse=True)
+        with ProcessPool(max_workers=max_workers) as pool:
+            futures = {path: pool.submit(_parse_character_file_packed, path, self.data_dir)
+                       for path in ordered}
+            for path, future in futures.items():
+                try:
+                    result = marshal.loads(future.result())
+                except Exception as e:
+                    logger.error(f"Error loading packet data file {path}: {str(e)}")
+                    continue
+                with self._write_lock:
+                    self._file_cache[path] = (signatures[path], result)
+
     def _load_data(self, force=False):
         """
         Load character data from packet data files
-        
+
+        Files whose size and modification time are unchanged since the last
+        load are not read again.
+
         Args:
             force: If True, forces a reload even if data is already loaded
         """
@@ -51,84 +431,51 @@ class StashManager:
             return
 
         start_time = time.time()
-        self.characters_cache.clear()
         logger.info(f"Loading characters from: {self.data_dir}")
-        
-        def load_file(file_path):
-            try:
-                # Skip excessively large files (likely corrupted)
-                file_size = os.path.getsize(file_path)
-                if file_size > 10 * 1024 * 1024:  # > 10MB
-                    logger.warning(f"Skipping oversized file: {file_path} ({file_size/1024/1024:.2f} MB)")
-                    return None
-                    
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    packet_data = json.load(f)
-                char_data = packet_data.get("characterDataBase", {})
-                if not char_data:
-                    return None
-                char_id = str(char_data.get("characterId"))
-                if not char_id:
-                    logger.warning(f"No characterId in {file_path}")
-                    return None
-                    
-                # Parse stashes efficiently
-                raw_stashes = parse_stashes(packet_data)
-                stashes = {str(k): v for k, v in raw_stashes.items()}
-                
-                # Extract character data
-                raw_class = char_data.get("characterClass", "")
-                class_name = raw_class.replace("DesignDataPlayerCharacter:Id_PlayerCharacter_", "")
-                nickname_data = char_data.get("nickName", {})
-                
-                return {
-                    'id': char_id,
-                    'file_path': file_path,
-                    'character_data': {
-                        'id': char_id,
-                        'nickname': nickname_data.get("originalNickName", "Unknown"),
-                        'class': class_name,
-                        'level': char_data.get("level", 1),
-                        'lastUpdate': datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(),
-                        'stashes': stashes,
-                        'streamingModeName': nickname_data.get("streamingModeNickName", ""),
-                        'rank': {
-                            'name': nickname_data.get("rankId", "Unknown").replace("LeaderboardRankData:Id_LeaderboardRank_", "").replace("_", " "),
-                            'fame': nickname_data.get("fame", 0),
-                            'iconType': nickname_data.get("rankIconType", 1)
-                        }
-                    }
-                }
-            except Exception as e:
-                logger.error(f"Error loading packet data file {file_path}: {str(e)}")
-                return None
-                
-        # Load all JSON files from the data directory
-        json_files = glob.glob(os.path.join(self.data_dir, "*.json"))
-        logger.info(f"Found {len(json_files)} packet data files")
 
-        # Optimize worker count based on file count and system capabilities
-        cpu_count = os.cpu_count() or 4
-        max_workers = max(1, min(cpu_count, len(json_files), 8))  # Cap at 8 workers
-        
-        # Use multiprocessing to load files in parallel
-        with ThreadPool(max_workers=max_workers) as pool:
-            results = pool.map(load_file, json_files)
-
-        # Process results efficiently
-        loaded_count = 0
-        for result in results:
-            if result:
-                char_id = result['id']
-                self.characters_cache[char_id] = result['character_data']
-                loaded_count += 1
-
-        # Reduce memory usage by clearing unnecessary caches
-        results = None
-        
+        # Files from older versions are converted once: characters to snapshots,
+        # other packet dumps into the packet archive
+        migrate_json_files(self.data_dir)
+        packet_archive.import_dumps(self.data_dir)
+
+        # Snapshots come last so they win over any JSON file left for the same character
+        data_files = [path for path in glob.glob(os.path.join(self.data_dir, "*.json"))
+                      if not is_packet_dump(path)]
+        data_files += glob.glob(os.path.join(self.data_dir, f"*{SNAPSHOT_EXTENSION}"))
+        logger.info(f"Found {len(data_files)} packet data files")
+
+        signatures = {path: self._file_signature(path) for path in data_files}
+        with self._write_lock:
+            # Forget files that no longer exist
+            removed = set(self._file_cache) - set(data_files)
+            previous = [self._file_cache.pop(path)[1] for path in removed]
+            # Only files that changed need a worker
+            stale = [path for path in data_files
+                     if self._file_cache.get(path, (None,))[0] != signatures[path]]
+            previous += [self._file_cache.get(path, (None, None))[1] for path in stale]
+
+        strategy = self._choose_load_strategy(stale) if stale else "serial"
+        if stale:
+            self._parse_files(stale, strategy)
+        results = [self._load_file(path) for path in data_files]
+
+        # Characters of changed or removed files are merged into the current snapshot
+        # rather than replacing it, so characters captured meanwhile are kept
+        affected = {r['id'] for r in previous if r}
+        with self._write_lock:
+            affected.update(r['id'] for r in (self._file_cache.get(path, (None, None))[1] for path in stale) if r)
+            current = self._snapshot.characters
+            affected.update(r['id'] for r in results if r and r['id'] not in current)
+            characters = self._merge_characters(affected)
+            loaded_count = len(characters)
+            self._publish(characters)
+
         load_time = time.time() - start_time
-        logger.info(f"Loaded {loaded_count} characters in {load_time:.2f} seconds")
-        
+        logger.info(f"Loaded {loaded_count} characters in {load_time:.2f} seconds "
+                    f"({len(stale)} of {len(data_files)} files parsed, {strategy})")
+        if stale or removed:
+            self.save_startup_cache()
+
         # Only show character details for small number of characters
         if loaded_count <= 3:
             for char_id, char_data in self.characters_cache.items():
@@ -139,6 +486,120 @@ class StashManager:
         # Mark data as loaded
         self._is_loaded = True
 
+    def start_watching(self, on_change=None, **options) -> None:
+        """
+        Reload character files as they change on disk, e.g. restored or synced from elsewhere.
+
+        Args:
+            on_change: Called after changed files published a new snapshot
+            options: Passed to the directory watcher (debounce, poll_interval)
+        """
+        if self._watcher is not None:
+            return
+        self._on_change = on_change
+        self._watcher = create_watcher(self.data_dir, self._files_changed, **options)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def _files_changed(self, names) -> None:
+        if names is None:
+            # Events were lost; a load only parses files whose signature changed
+            self._load_data(force=True)
+            changed = True
+        else:
+            paths = set()
+            for name in names:
+                if name.endswith(DELTA_SUFFIX):
+                    # A journal belongs to the character file it is replayed onto
+                    stem = name[:-len(DELTA_SUFFIX)]
+                    paths.add(snapshot_path(self.data_dir, stem))
+                    paths.add(os.path.join(self.data_dir, f"{stem}.json"))
+                elif name.endswith(SNAPSHOT_EXTENSION) or (name.endswith(".json") and not is_packet_dump(name)):
+                    paths.add(os.path.join(self.data_dir, name))
+            changed = self.refresh_files(paths) if paths else False
+        if changed and self._on_change:
+            self._on_change()
+
+    def refresh_files(self, paths) -> bool:
+        """
+        Reload only the given character files; files that no longer exist are dropped.
+
+        Returns:
+            True if a new snapshot was published
+        """
+        affected = set()
+        for path in paths:
+            previous = self._file_cache.get(path, (None, None))[1]
+            if os.path.exists(path):
+                result = self._load_file(path)
+            else:
+                with self._write_lock:
+                    self._file_cache.pop(path, None)
+                result = None
+            if result is previous:
+                continue
+            affected.update(r['id'] for r in (previous, result) if r)
+        if not affected:
+            return False
+        with self._write_lock:
+            self._publish(self._merge_characters(affected))
+        logger.info(f"Reloaded {len(affected)} changed characters from {len(paths)} changed files")
+        self.save_startup_cache()
+        return True
+
+    def _merge_characters(self, affected) -> Dict[str, Dict]:
+        """
+        The current characters with the given ones rebuilt from the file cache;
+        the caller must hold _write_lock.
+        """
+        winners = {}
+        for path, (_, result) in self._file_cache.items():
+            # A snapshot wins over a JSON file left for the same character
+            if (result and result['id'] in affected
+                    and (result['id'] not in winners or path.endswith(SNAPSHOT_EXTENSION))):
+                winners[result['id']] = result
+        characters = dict(self._snapshot.characters)
+        for char_id in affected:
+            if char_id in winners:
+                characters[char_id] = winners[char_id]['character_data']
+            else:
+                characters.pop(char_id, None)
+        return characters
+
+    def apply_inventory_delta(self, character_id: str, ops: List[Dict]) -> bool:
+        """
+        Apply inventory delta ops to a loaded character and publish the result.
+
+        Returns:
+            True if the character is loaded and at least one stash changed
+        """
+        character_id = str(character_id)
+        with self._write_lock:
+            char = self._snapshot.characters.get(character_id)
+            if not char:
+                return False
+            stashes = dict(char['stashes'])
+            changed = apply_ops_to_stashes(stashes, ops)
+            if not changed:
+                return False
+            characters = dict(self._snapshot.characters)
+            characters[character_id] = dict(char, stashes=stashes, lastUpdate=datetime.now().isoformat())
+            self._publish(characters)
+            # The journal already holds these ops, so the cached entry of the
+            # snapshot is current again and the watcher need not parse it
+            file_path = snapshot_path(self.data_dir, character_id)
+            cached = self._file_cache.get(file_path)
+            if cached and cached[1]:
+                signature = self._file_signature(file_path)
+                if signature is not None:
+                    self._file_cache[file_path] = (signature, dict(cached[1], character_data=characters[character_id]))
+        logger.debug(f"Applied {len(ops)} inventory ops to {character_id}, stashes changed: {sorted(changed)}")
+        return True
+
     def get_characters(self) -> List[Dict]:
         """Get list of all characters"""
         return list(self.characters_cache.values())
@@ -186,62 +647,48 @@ class StashManager:
             }
         return None
 
+    def get_character_history(self, character_id: str, start: Optional[float] = None,
+                              end: Optional[float] = None) -> Dict:
+        """Capture timeline of a character and the item changes between start and end"""
+        return {
+            'timeline': history.timeline(character_id),
+            'changes': history.changes(character_id, start, end),
+        }
+
+    def get_character_stashes_at(self, character_id: str, ts: Optional[float] = None) -> Optional[Dict]:
+        """
+        Reconstruct a character's stashes as of its last capture at or before ts.
+
+        Returns:
+            {'ts': capture time, 'level': ..., 'stashes': {inventoryId: [item]}},
+            or None if the character has no capture that early
+        """
+        state = history.state_at(character_id, ts)
+        if state is None:
+            return None
+        stashes = {}
+        for item in state['items'].values():
+            stashes.setdefault(str(item.get('inventoryId')), []).append(stash_item(item))
+        for items in stashes.values():
+            items.sort(key=lambda entry: entry['slotId'])
+        return {
+            'ts': state['ts'],
+            'level': state['meta'].get('level', 1),
+            'stashes': stashes,
+        }
+
     def search_items(self, query: str) -> List[Dict]:
         """Search for items across all character stashes"""
         if not query:
             return []
         keywords = [k.strip().lower() for k in query.split(",")]
-        output = []
-        for char in self.get_characters():
-            for stash_id, stash in char.get('stashes', {}).items():
-                if not isinstance(stash, list):
-                    continue
-                for item in stash:
-                    try:
-                        design_str = item.get("itemId", "")
-                        item_id = item_data_manager.get_item_id_from_design_str(design_str)
-                        name = item_data_manager.get_item_name_from_id(item_id)
-                        rarity = item_data_manager.get_item_rarity_from_id(item_id)
-                        data = item.get("data", {})
-                        effect_str = "DesignDataItemPropertyType:Id_ItemPropertyType_Effect_"
-                        pp = []
-                        for p in data.get("primaryPropertyArray", []):
-                            if isinstance(p, dict) and "propertyTypeId" in p and "propertyValue" in p:
-                                prop_name = p["propertyTypeId"].replace(effect_str, "")
-                                pp.append((prop_name, p["propertyValue"]))
-                        sp = []
-                        for p in data.get("secondaryPropertyArray", []):
-                            if isinstance(p, dict) and "propertyTypeId" in p and "propertyValue" in p:
-                                prop_name = p["propertyTypeId"].replace(effect_str, "")
-                                sp.append((prop_name, p["propertyValue"]))
-                        search_parts = [
-                            name.lower(),
-                            rarity.lower(),
-                            *[p[0].lower() for p in pp],
-                            *[p[0].lower() for p in sp]
-                        ]
-                        search_str = " ".join(search_parts)
-                        if all(k in search_str for k in keywords):
-                            result = {
-                                'nickname': char['nickname'],
-                                'id': char['id'],
-                                'class': char['class'],
-                                'level': char['level'],
-                                'itemCount': item.get("itemCount", 1),
-                                'slotId': item.get("slotId", 0),
-                                'item': {
-                                    'name': name,
-                                    'rarity': rarity,
-                                    'pp': pp,
-                                    'sp': sp
-                                },
-                                'stash_id': stash_id
-                            }
-                            output.append(result)
-                    except Exception as e:
-                        logger.error(f"Error processing item in search: {str(e)}")
-                        continue
-        return output
+        return self._search_index.search(keywords)
+
+    def search_suggest(self, query: str, limit: int = SUGGEST_LIMIT) -> List[Dict]:
+        """Ranked completions for the keyword being typed, see SearchIndex.suggest"""
+        if not query:
+            return []
+        return self._search_index.suggest(query, limit)
 
     def get_character_stash_previews(self, character_id):
         """Get detailed item data for all stashes of a character without generating image previews"""
@@ -253,40 +700,22 @@ class StashManager:
                 enhanced_items = []
                 for item in items:
                     try:
-                        design_str = item.get("itemId", "")
-                        item_id = item_data_manager.get_item_id_from_design_str(design_str)
-                        name = item_data_manager.get_item_name_from_id(item_id)
-                        rarity = item_data_manager.get_item_rarity_from_id(item_id)
-                        width, height = item_data_manager.get_item_dimensions_from_id(item_id)
-                        img_path = item_data_manager.get_item_image_path_from_id(item_id)
+                        entry = item_data_manager.lookup_design_str(item.get("itemId", ""))
                         data = item.get("data", {})
-                        effect_str = "DesignDataItemPropertyType:Id_ItemPropertyType_Effect_"
-                        pp = []
-                        for p in data.get("primaryPropertyArray", []):
-                            if isinstance(p, dict) and "propertyTypeId" in p and "propertyValue" in p:
-                                prop_name = p["propertyTypeId"].replace(effect_str, "")
-                                pp.append([prop_name, p["propertyValue"]])
-                        sp = []
-                        for p in data.get("secondaryPropertyArray", []):
-                            if isinstance(p, dict) and "propertyTypeId" in p and "propertyValue" in p:
-                                prop_name = p["propertyTypeId"].replace(effect_str, "")
-                                sp.append([prop_name, p["propertyValue"]])
-                        image_url = None
-                        if img_path:
-                            image_url = f"/assets/{str(img_path)}"
-                            image_url = image_url.replace("\\", "/")
+                        pp = [list(p) for p in item_properties(data, "primaryPropertyArray")]
+                        sp = [list(p) for p in item_properties(data, "secondaryPropertyArray")]
                         enhanced_item = {
-                            'name': name,
-                            'itemId': item_id,
+                            'name': entry.name,
+                            'itemId': entry.item_id,
                             'slotId': item.get("slotId", 0),
                             'itemCount': item.get("itemCount", 1),
-                            'rarity': rarity,
-                            'width': width or 1,
-                            'height': height or 1,
+                            'rarity': entry.rarity,
+                            'width': entry.width or 1,
+                            'height': entry.height or 1,
                             'pp': pp,
                             'sp': sp,
-                            'imagePath': image_url,
-                            'vendor_price': item_data_manager.data.get(item_id, {}).get("vendor_price", 0)
+                            'imagePath': entry.image_url,
+                            'vendor_price': entry.vendor_price
                         }
                         enhanced_items.append(enhanced_item)
                     except Exception as e:
@@ -322,15 +751,13 @@ class StashManager:
         stash_items = char.get('stashes', {}).get(str(stash_id))
         if not stash_items:
             return False, "Stash not found"
-        file_path = os.path.join(self.data_dir, f"{character_id}.json")
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                raw = json.load(f)
-            stashes = parse_stashes(raw)
-            inv_items = stashes.get(StashType.BAG.value, [])
-        except Exception as e:
-            logger.error(f"Error loading inventory items: {str(e)}")
-            inv_items = []
+        # Windows-only game automation, imported here so that processes parsing
+        # character files with this module never load it
+        import pygetwindow as gw
+        from .sort import StashSorter
+        from .storage import Storage, StashType
+        # The cache includes inventory changes captured since the character file was saved
+        inv_items = char.get('stashes', {}).get(str(StashType.BAG.value), [])
         stash = Storage(StashType.STORAGE.value, stash_items)
         inventory = Storage(StashType.BAG.value, inv_items)
         windows = [w for w in gw.getAllWindows() if w.title == "Dark and Darker  "]
@@ -354,11 +781,11 @@ class StashManager:
 
     def _get_character(self, character_id):
         try:
-            file_path = os.path.join(self.data_dir, f"{character_id}.json")
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    packet_data = json.load(f)
-                return packet_data.get("characterDataBase", {})
+            for file_path in (snapshot_path(self.data_dir, character_id),
+                              os.path.join(self.data_dir, f"{character_id}.json")):
+                if os.path.exists(file_path):
+                    packet_data, _ = load_character_packet(file_path, self.data_dir)
+                    return packet_data.get("characterDataBase", {})
             return None
         except Exception as e:
             logger.error(f"Error reading character data: {str(e)}")
@@ -367,8 +794,7 @@ class StashManager:
     def _save_character(self, character_id, char_data):
         try:
             file_path = os.path.join(self.data_dir, f"{character_id}.json")
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump({"characterDataBase": char_data}, f, indent=2)
+            atomic_write_json(file_path, {"characterDataBase": char_data}, indent=2)
             return True
         except Exception as e:
             logger.error(f"Error saving character data: {str(e)}")
@@ -376,4 +802,48 @@ class StashManager:
 
     def _generate_previews(self, character_id):
         # TODO ?
-        pass
\ No newline at end of file
+        pass
+
+def benchmark_load(data_dir: Optional[str] = None, strategies=("serial", "threads", "processes"),
+                   repeat: int = 3) -> Dict[str, float]:
+    """
+    Time a cold parse of every character file with each load strategy.
+
+    Returns:
+        Best time in seconds per strategy
+    """
+    manager = StashManager(resource_path(''), defer_loading=True)
+    if data_dir:
+        manager.data_dir = data_dir
+    paths = [path for path in glob.glob(os.path.join(manager.data_dir, "*.json")) if not is_packet_dump(path)]
+    paths += glob.glob(os.path.join(manager.data_dir, f"*{SNAPSHOT_EXTENSION}"))
+    print(f"{len(paths)} files, work estimate {manager._load_work(paths) / 1024 / 1024:.1f} MB, "
+          f"{os.cpu_count()} CPUs, auto picks {manager._choose_load_strategy(paths)}")
+    timings = {}
+    for strategy in strategies:
+        best = None
+        for _ in range(repeat):
+            manager._file_cache = {}
+            start = time.perf_counter()
+            manager._parse_files(paths, strategy)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[strategy] = best
+        loaded = sum(1 for _, result in manager._file_cache.values() if result)
+        print(f"{strategy:>9}: {best:.3f}s ({loaded} characters)")
+    return timings
+
+
+def main():
+    """Compare load strategies on the character files in a data directory"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark character loading")
+    parser.add_argument("data_dir", nargs="?", help="Directory with character files (default: app data directory)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per strategy; the best is reported")
+    parser.add_argument("--strategies", default="serial,threads,processes", help="Comma-separated strategies")
+    args = parser.parse_args()
+    benchmark_load(args.data_dir, tuple(args.strategies.split(",")), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
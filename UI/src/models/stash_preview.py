@@ -1,7 +1,6 @@
 import json
 import os
 import re
-import difflib
 from typing import Tuple, Dict, List, Optional
 from dataclasses import dataclass
 from PIL import Image, ImageDraw, ImageFont
@@ -150,12 +149,10 @@ class StashPreviewGenerator:
             )
             
     def _place_equipment_item(self, preview: Image.Image, item: ItemInfo) -> None:
-        img_path = item_data_manager.get_item_image_path_from_id(item.itemId)
-        if img_path:
-            # Convert PathLib to string and use resource_path
-            img_path = resource_path(str(img_path))
-        w, h = item_data_manager.get_item_dimensions_from_id(item.itemId)
-        name = item_data_manager.get_item_name_from_id(item.itemId)
+        entry = item_data_manager.lookup(item.itemId)
+        img_path = resource_path(entry.icon_path) if entry.icon_path else None
+        w, h = entry.width, entry.height
+        name = entry.name
 
         if not img_path or not os.path.exists(img_path):
             logging.warning(f"Item not found or missing image: {item.itemId}")
@@ -216,12 +213,10 @@ class StashPreviewGenerator:
             draw.line([(0, y_pos), (img.width, y_pos)], fill=grid_color)
 
     def _place_item(self, preview: Image.Image, item: ItemInfo, grid_width: int, grid_height: int) -> None:
-        img_path = item_data_manager.get_item_image_path_from_id(item.itemId)
-        if img_path:
-            # Convert PathLib to string and use resource_path
-            img_path = resource_path(str(img_path))
-        w, h = item_data_manager.get_item_dimensions_from_id(item.itemId)
-        name = item_data_manager.get_item_name_from_id(item.itemId)
+        entry = item_data_manager.lookup(item.itemId)
+        img_path = resource_path(entry.icon_path) if entry.icon_path else None
+        w, h = entry.width, entry.height
+        name = entry.name
 
         # Get rarity from the item data
         parts = item.itemId.split('_')
@@ -230,8 +225,7 @@ class StashPreviewGenerator:
             rarity = int(parts[-1][0])
         else:
             # Check if it's a unique item in the data
-            item_data = item_data_manager.data.get(item.itemId, {})
-            rarity_str = item_data.get("rarity", None)
+            rarity_str = entry.rarity if entry.index >= 0 else None
             if rarity_str is not None:
                 rarity_map = {
                     "None": 0,
@@ -313,6 +307,18 @@ class StashPreviewGenerator:
             logging.error(f"Failed to process image {img_path}: {e}")
 
 
+def stash_item(item, slot_id=None):
+    """Build a stash entry from a raw SItem dict as saved by MessageToJson"""
+    entry = item_data_manager.lookup_design_str(item.get("itemId", ""))
+    return {
+        "name": entry.name,
+        "slotId": item.get("slotId", 0) if slot_id is None else slot_id,
+        "itemId": entry.item_id,
+        "itemCount": item.get("itemCount", 1),
+        "data": item,
+        "vendor_price": entry.vendor_price
+    }
+
 def parse_stashes(packet_data):
     stashes = {}
     # stashes
@@ -325,39 +331,14 @@ def parse_stashes(packet_data):
         # First process items with defined slots
         for item in items:
             if "slotId" in item:
-                design_str = item.get("itemId", "")
-                item_id = item_data_manager.get_item_id_from_design_str(design_str)
-                name = item_data_manager.get_item_name_from_id(item_id)
-                slot_id = item["slotId"]
-                item_data = item_data_manager.data.get(item_id, {})
-                vendor_price = item_data.get("vendor_price", 0)
-                stash_items.append({
-                    "name": name,
-                    "slotId": slot_id,
-                    "itemId": item_id,
-                    "itemCount": item.get("itemCount", 1),
-                    "data": item,
-                    "vendor_price": vendor_price
-                })
-                used_slots.add(slot_id)
+                stash_items.append(stash_item(item))
+                used_slots.add(item["slotId"])
         # Then process items without slots, assign to next free slot
         for item in items:
             if "slotId" not in item:
                 slot_id = 0
                 used_slots.add(slot_id)
-                design_str = item.get("itemId", "")
-                item_id = item_data_manager.get_item_id_from_design_str(design_str)
-                name = item_data_manager.get_item_name_from_id(item_id)
-                item_data = item_data_manager.data.get(item_id, {})
-                vendor_price = item_data.get("vendor_price", 0)
-                stash_items.append({
-                    "name": name,
-                    "slotId": slot_id,
-                    "itemId": item_id,
-                    "itemCount": item.get("itemCount", 1),
-                    "data": item,
-                    "vendor_price": vendor_price
-                })
+                stash_items.append(stash_item(item, slot_id))
         if stash_items:
             stashes[inventory_id] = stash_items
     # inventory
@@ -367,20 +348,7 @@ def parse_stashes(packet_data):
         if inventory_id not in stashes:
             stashes[inventory_id] = []
         # Assign slotId = 0 if missing, otherwise use the provided slotId
-        slot_id = item.get("slotId", 0)
-        design_str = item.get("itemId", "")
-        item_id = item_data_manager.get_item_id_from_design_str(design_str)
-        name = item_data_manager.get_item_name_from_id(item_id)
-        item_data = item_data_manager.data.get(item_id, {})
-        vendor_price = item_data.get("vendor_price", 0)
-        stashes[inventory_id].append({
-            "name": name,
-            "slotId": slot_id,
-            "itemId": item_id,
-            "itemCount": item.get("itemCount", 1),
-            "data": item,
-            "vendor_price": vendor_price
-        })
+        stashes[inventory_id].append(stash_item(item))
     return stashes
 
 def main():
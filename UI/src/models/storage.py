@@ -101,11 +101,11 @@ class Storage:
             if slot_id is None:
                 obj["slotId"] = 0
             try:
-                design_str = obj.get("itemId", "")
-                item_id = item_data_manager.get_item_id_from_design_str(design_str)
-                width, height = item_data_manager.get_item_dimensions_from_id(item_id)
-                rarity = item_data_manager.get_item_rarity_from_id(item_id)
-                name = item_data_manager.get_item_name_from_id(item_id)
+                entry = item_data_manager.lookup_design_str(obj.get("itemId", ""))
+                item_id = entry.item_id
+                width, height = entry.width, entry.height
+                rarity = entry.rarity
+                name = entry.name
 
                 slot_id = obj.get("slotId")
                 x = slot_id % self.width
@@ -113,7 +113,7 @@ class Storage:
 
                 position = Point(x, y)
 
-                rarity_id = item_data_manager.rarity_to_id(rarity)
+                rarity_id = entry.rarity_id
 
                 if (rarity_id == None):
                     print(item_id)
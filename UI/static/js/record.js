@@ -21,8 +21,6 @@ document.addEventListener('DOMContentLoaded', () => {
     const particleGameTool = document.getElementById('particleGameTool');
     const particleToolServer = document.getElementById('particleToolServer');
 
-    let pollingInterval = null;
-
     // Initialize particles with staggered animation delays
     function initTrafficParticles() {
         // For Game->Server direct path (capture off)
@@ -185,17 +183,8 @@ document.addEventListener('DOMContentLoaded', () => {
         return `/assets/classes/${imageName}`;
     }
 
-    function startPolling() {
-        if (pollingInterval) clearInterval(pollingInterval);
-        pollingInterval = setInterval(loadCharacters, 2000);
-    }
-
-    function stopPolling() {
-        if (pollingInterval) {
-            clearInterval(pollingInterval);
-            pollingInterval = null;
-        }
-    }
+    // Characters were captured, or their files changed on disk (restored, synced)
+    window.addEventListener('charactersChanged', loadCharacters);
 
     function updateToggleUI(isOn) {
         if (isOn) {
@@ -271,10 +260,8 @@ document.addEventListener('DOMContentLoaded', () => {
             }
 
             if (isRunning) {
-                startPolling();
                 showNotification('Capture started', 'success');
             } else {
-                stopPolling();
                 showNotification('Capture stopped', 'info');
             }
         } catch (error) {
@@ -355,7 +342,6 @@ document.addEventListener('DOMContentLoaded', () => {
             statusIndicator.className = 'status-indicator capturing';
             captureStatus.textContent = 'Capture is running';
             activateToolPath();
-            startPolling();
 
         } catch (error) {
             console.error('Failed to restart capture:', error);
@@ -399,7 +385,6 @@ document.addEventListener('DOMContentLoaded', () => {
                 statusIndicator.className = 'status-indicator capturing';
                 captureStatus.textContent = 'Capture is running';
                 activateToolPath();
-                startPolling();
             } else {
                 statusIndicator.className = 'status-indicator';
                 captureStatus.textContent = 'Capture is currently off';
@@ -538,6 +538,40 @@ window.addEventListener('load', () => {
     const debouncedSearch = debounce((e) => performSearch(e.target.value), 200); // Reduced from 300ms
     searchInput.addEventListener('input', debouncedSearch);
 
+    // Autocomplete for the keyword being typed
+    const searchSuggestions = document.getElementById('searchSuggestions');
+    let suggestTimeout;
+    const updateSuggestions = async (query) => {
+        if (!query.trim()) {
+            searchSuggestions.innerHTML = '';
+            return;
+        }
+        try {
+            let suggestions;
+            if (window.pywebview && window.pywebview.api && typeof window.pywebview.api.search_suggest === 'function') {
+                suggestions = await window.pywebview.api.search_suggest(query);
+            } else {
+                const res = await fetch(`/api/search_suggest?query=${encodeURIComponent(query)}`);
+                suggestions = await res.json();
+            }
+            // Ignore answers for text that has been typed over since
+            if (searchInput.value !== query) return;
+            searchSuggestions.innerHTML = '';
+            suggestions.forEach(suggestion => {
+                const option = document.createElement('option');
+                option.value = suggestion.query;
+                option.label = suggestion.count ? `${suggestion.kind} · ${suggestion.count} owned` : suggestion.kind;
+                searchSuggestions.appendChild(option);
+            });
+        } catch (error) {
+            console.error('Suggestion error:', error);
+        }
+    };
+    searchInput.addEventListener('input', (e) => {
+        clearTimeout(suggestTimeout);
+        suggestTimeout = setTimeout(() => updateSuggestions(e.target.value), 100);
+    });
+
     // Initial state
     showEmptyState();
 
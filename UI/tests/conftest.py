@@ -0,0 +1,30 @@
+import os
+import sys
+import json
+
+import pytest
+
+# Tests import the app the same way app.py does, as src.models.*
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ITEMS = {
+    "Longsword_5001": {"name": "Longsword", "rarity": "Rare", "inventory_width": 1, "inventory_height": 3,
+                       "vendor_price": 40},
+    "Longsword_2001": {"name": "Longsword", "rarity": "Common", "vendor_price": 5},
+    "LongBow_4001": {"name": "Long Bow", "rarity": "Uncommon"},
+    "GoldCoin": {"name": "Gold Coin", "rarity": "None"},
+    "SpellBook_6001": {"name": "Spellbook", "rarity": "Epic"},
+    "Lantern_2001": {"name": "Lantern", "rarity": "Common"},
+    "Lockpick_2001": {"name": "Lockpick", "rarity": "Common"},
+    "Longbow_of_Light_8001": {"name": "Longbow of Light", "rarity": "Artifact"},
+}
+
+
+@pytest.fixture
+def item_catalog(tmp_path, monkeypatch):
+    """An ItemDataManager over a small items.json, caching its compiled catalog in tmp_path"""
+    from src.models import game_data
+    path = tmp_path / "items.json"
+    path.write_text(json.dumps(ITEMS), encoding="utf-8")
+    monkeypatch.setattr(game_data, "get_item_cache_file", lambda: str(tmp_path / "items.cache"))
+    return game_data.ItemDataManager(str(path))
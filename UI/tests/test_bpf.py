@@ -0,0 +1,110 @@
+import socket
+import struct
+
+import pytest
+
+from src.models import capture_backends as cb
+from src.models.capture_backends import build_bpf_filter, compile_ip_bpf
+
+LOCAL_IP = "192.168.1.20"
+SERVER_IP = "35.1.2.3"
+PORTS = (20200, 20300)
+
+
+def run_bpf(program, packet: bytes) -> int:
+    """Interpret the classic BPF instructions the compiler emits"""
+    a = x = 0
+    pc = 0
+    while True:
+        code, jt, jf, k = program[pc]
+        pc += 1
+        if code == cb.BPF_LDB_ABS:
+            a = packet[k]
+        elif code == cb.BPF_LDH_ABS:
+            a = struct.unpack_from("!H", packet, k)[0]
+        elif code == cb.BPF_LDW_ABS:
+            a = struct.unpack_from("!I", packet, k)[0]
+        elif code == cb.BPF_LDH_IND:
+            a = struct.unpack_from("!H", packet, x + k)[0]
+        elif code == cb.BPF_LDXB_MSH:
+            x = 4 * (packet[k] & 0xF)
+        elif code == cb.BPF_JEQ:
+            pc += jt if a == k else jf
+        elif code == cb.BPF_JGE:
+            pc += jt if a >= k else jf
+        elif code == cb.BPF_JGT:
+            pc += jt if a > k else jf
+        elif code == cb.BPF_JSET:
+            pc += jt if a & k else jf
+        elif code == cb.BPF_RET:
+            return k
+        else:
+            raise AssertionError(f"Unexpected opcode {code:#x}")
+
+
+def ip_packet(src, dst, sport, dport, protocol=socket.IPPROTO_TCP, fragment=0, options=b""):
+    ihl = 5 + len(options) // 4
+    header = struct.pack("!BBHHHBBH4s4s", 0x40 | ihl, 0, 0, 0, fragment, 64, protocol, 0,
+                         socket.inet_aton(src), socket.inet_aton(dst)) + options
+    return header + struct.pack("!HH", sport, dport) + b"\0" * 16
+
+
+def accepts(program, packet):
+    return run_bpf(program, packet) != 0
+
+
+@pytest.mark.parametrize("outbound", [False, True])
+def test_inbound_game_traffic(outbound):
+    program = compile_ip_bpf(LOCAL_IP, PORTS, outbound)
+    for port in (PORTS[0], 20250, PORTS[1]):
+        assert accepts(program, ip_packet(SERVER_IP, LOCAL_IP, port, 50000))
+    for port in (PORTS[0] - 1, PORTS[1] + 1, 443):
+        assert not accepts(program, ip_packet(SERVER_IP, LOCAL_IP, port, 50000))
+
+
+@pytest.mark.parametrize("outbound", [False, True])
+def test_other_hosts_protocols_and_fragments_are_dropped(outbound):
+    program = compile_ip_bpf(LOCAL_IP, PORTS, outbound)
+    assert not accepts(program, ip_packet(SERVER_IP, "192.168.1.21", 20250, 50000))
+    assert not accepts(program, ip_packet(SERVER_IP, LOCAL_IP, 20250, 50000, protocol=socket.IPPROTO_UDP))
+    # More fragments flag, then a non-zero fragment offset
+    assert not accepts(program, ip_packet(SERVER_IP, LOCAL_IP, 20250, 50000, fragment=0x2000))
+    assert not accepts(program, ip_packet(SERVER_IP, LOCAL_IP, 20250, 50000, fragment=0x0010))
+    # Don't fragment alone is fine
+    assert accepts(program, ip_packet(SERVER_IP, LOCAL_IP, 20250, 50000, fragment=0x4000))
+
+
+def test_ip_options_shift_the_tcp_header():
+    program = compile_ip_bpf(LOCAL_IP, PORTS)
+    options = b"\x01" * 8
+    assert accepts(program, ip_packet(SERVER_IP, LOCAL_IP, 20250, 50000, options=options))
+    assert not accepts(program, ip_packet(SERVER_IP, LOCAL_IP, 443, 50000, options=options))
+
+
+def test_outbound_requests():
+    request = ip_packet(LOCAL_IP, SERVER_IP, 50000, 20250)
+    assert not accepts(compile_ip_bpf(LOCAL_IP, PORTS), request)
+    program = compile_ip_bpf(LOCAL_IP, PORTS, outbound=True)
+    assert accepts(program, request)
+    assert accepts(program, ip_packet(LOCAL_IP, SERVER_IP, 50000, PORTS[1]))
+    assert not accepts(program, ip_packet(LOCAL_IP, SERVER_IP, 50000, PORTS[1] + 1))
+    assert not accepts(program, ip_packet(LOCAL_IP, SERVER_IP, 50000, PORTS[0] - 1))
+    # Neither to nor from the local address
+    assert not accepts(program, ip_packet(SERVER_IP, "10.0.0.1", 50000, 20250))
+
+
+@pytest.mark.parametrize("outbound", [False, True])
+def test_jumps_stay_inside_the_program(outbound):
+    program = compile_ip_bpf(LOCAL_IP, PORTS, outbound)
+    for pc, (code, jt, jf, _) in enumerate(program):
+        if code == cb.BPF_RET:
+            continue
+        assert pc + 1 + max(jt, jf) < len(program)
+    assert program[-1][0] == cb.BPF_RET and program[-1][3] > 0
+
+
+def test_pcap_filter_strings():
+    assert build_bpf_filter(LOCAL_IP, PORTS) == "tcp and dst host 192.168.1.20 and src portrange 20200-20300"
+    assert build_bpf_filter(None, PORTS) == "tcp and src portrange 20200-20300"
+    assert build_bpf_filter(None, PORTS, outbound=True) == "tcp portrange 20200-20300"
+    assert "src host 192.168.1.20 and dst portrange 20200-20300" in build_bpf_filter(LOCAL_IP, PORTS, outbound=True)
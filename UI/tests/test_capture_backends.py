@@ -0,0 +1,61 @@
+import threading
+import time
+
+from src.models import capture_backends as cb
+
+
+class FakePcap:
+    """libpcap stand-in whose reads block until pcap_breakloop"""
+
+    def __init__(self):
+        self.reading = threading.Event()
+        self.broken = threading.Event()
+        self.closed_by = None
+        self.closed_during_read = False
+
+    def pcap_next_ex(self, handle, header, data):
+        self.reading.set()
+        self.broken.wait(5)
+        # Still inside libpcap for a moment after being woken up
+        time.sleep(0.05)
+        self.closed_during_read = self.closed_by is not None
+        return -2
+
+    def pcap_breakloop(self, handle):
+        self.broken.set()
+
+    def pcap_close(self, handle):
+        self.closed_by = threading.current_thread().name
+
+
+def open_backend(monkeypatch):
+    lib = FakePcap()
+    monkeypatch.setattr(cb, "load_pcap", lambda: lib)
+    backend = cb.PcapBackend("eth0", "192.168.1.20", (20200, 20300))
+    backend.handle = 1
+    return backend, lib
+
+
+def test_pcap_close_during_a_read_leaves_the_handle_to_the_capture_thread(monkeypatch):
+    backend, lib = open_backend(monkeypatch)
+    capture = threading.Thread(target=lambda: list(backend.segments()), name="capture")
+    capture.start()
+    assert lib.reading.wait(5)
+
+    backend.close()
+    capture.join(5)
+
+    assert not capture.is_alive()
+    assert lib.closed_by == "capture"
+    assert not lib.closed_during_read
+    assert backend.handle is None
+
+
+def test_pcap_close_without_a_reader_closes_at_once(monkeypatch):
+    backend, lib = open_backend(monkeypatch)
+    backend.close()
+    assert lib.closed_by == threading.current_thread().name
+    assert backend.handle is None
+    # A capture loop started after close() does not touch the handle
+    assert list(backend.segments()) == []
+    assert not lib.reading.is_set()
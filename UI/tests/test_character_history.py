@@ -0,0 +1,152 @@
+import copy
+import multiprocessing
+import os
+
+import pytest
+
+from src.models.character_history import (CharacterHistory, apply_delta, character_state, diff_states)
+
+
+def item(uid, inventory, slot, count=1, properties=()):
+    data = {"itemUniqueId": uid, "itemId": f"DesignDataItem:Id_Item_Thing_{uid}",
+            "inventoryId": inventory, "slotId": slot, "itemCount": count}
+    if properties:
+        data["primaryPropertyArray"] = [{"propertyTypeId": p, "propertyValue": v} for p, v in properties]
+    return data
+
+
+def captures():
+    """A character captured after a series of inventory changes"""
+    base = {
+        "characterId": "99", "nickName": {"originalNickName": "Tester"}, "level": 1,
+        "CharacterItemList": [item("1", 2, 0), item("2", 2, 1, count=5), item("3", 3, 4, properties=[("A", 1)])],
+        "CharacterStorageInfos": [{"inventoryId": 4, "CharacterStorageItemList": [
+            {"itemUniqueId": "10", "itemId": "DesignDataItem:Id_Item_Gem", "slotId": 0}]}],
+    }
+    packet = {"result": 1, "characterDataBase": base}
+    yield copy.deepcopy(packet)
+    steps = [
+        lambda b, i: b["CharacterItemList"][0].update(inventoryId=3, slotId=9 + i),         # move
+        lambda b, i: b["CharacterItemList"][1].update(itemCount=2 + i),                     # count
+        lambda b, i: b["CharacterItemList"].append(item(f"4{i}", 2, 5 + i)),                # add
+        lambda b, i: b.update(level=b["level"] + 1),                                        # meta
+        lambda b, i: b["CharacterItemList"][2].update(
+            primaryPropertyArray=[{"propertyTypeId": "A", "propertyValue": 2 + i}]),        # update
+        lambda b, i: b["CharacterItemList"].pop(),                                          # remove
+        lambda b, i: b["CharacterStorageInfos"][0]["CharacterStorageItemList"].append(
+            {"itemUniqueId": f"1{i}1", "itemId": "DesignDataItem:Id_Item_Gem", "slotId": 1 + i}),
+        lambda b, i: b.pop("nickName", None) if i % 2 else b.update(nickName={"originalNickName": f"T{i}"}),
+    ]
+    for i in range(3):
+        for step in steps:
+            step(base, i)
+            yield copy.deepcopy(packet)
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    history = CharacterHistory(str(tmp_path), keyframe_interval=4)
+    timeline = []
+    for n, packet in enumerate(captures()):
+        ts = 1000.0 + n
+        if history.record("99", packet, captured_at=ts):
+            timeline.append((ts, character_state(copy.deepcopy(packet))))
+    return history, timeline
+
+
+def test_diff_and_apply_round_trip():
+    packets = list(captures())
+    for old, new in zip(packets, packets[1:]):
+        old_state, new_state = character_state(old), character_state(new)
+        assert apply_delta(old_state, diff_states(old_state, new_state)) == new_state
+
+
+def test_storage_items_take_their_inventory():
+    state = character_state(next(captures()))
+    assert state["items"]["10"]["inventoryId"] == 4
+    assert "CharacterItemList" not in state["meta"]
+
+
+def test_state_at_every_capture(recorded, tmp_path):
+    history, timeline = recorded
+    # A fresh instance reads everything back from the file
+    for reader in (history, CharacterHistory(str(tmp_path), keyframe_interval=4)):
+        for ts, state in timeline:
+            assert reader.state_at("99", ts) == {"ts": ts, **state}
+            # Between captures the earlier one holds
+            assert reader.state_at("99", ts + 0.5) == {"ts": ts, **state}
+        assert reader.state_at("99") == {"ts": timeline[-1][0], **timeline[-1][1]}
+        assert reader.state_at("99", 999.0) is None
+
+
+def test_keyframes_bound_the_replay(recorded):
+    history, timeline = recorded
+    with history._lock:
+        index = history._index("99")
+    kinds = [entry[1] for entry in index]
+    assert kinds[0] == 0 and kinds.count(0) > 1
+    # Keyframes repeat a delta's capture and are left out of the timeline
+    assert [entry["ts"] for entry in history.timeline("99")] == [ts for ts, _ in timeline]
+
+
+def test_unchanged_capture_is_not_recorded(tmp_path):
+    history = CharacterHistory(str(tmp_path))
+    packet = next(captures())
+    assert history.record("99", packet, captured_at=1.0) == "full"
+    assert history.record("99", packet, captured_at=2.0) is None
+    assert history.record("99", packet, captured_at=0.5) is None
+    assert len(history.timeline("99")) == 1
+
+
+def test_changes_within_a_range(recorded):
+    history, timeline = recorded
+    changes = history.changes("99", start=timeline[1][0], end=timeline[3][0])
+    assert [change["ts"] for change in changes] == [ts for ts, _ in timeline[1:4]]
+    assert changes[0]["moved"] == {"1": [3, 9]}
+    assert changes[1]["count"] == {"2": 2}
+
+
+def test_torn_last_record_is_ignored_and_replaced(recorded, tmp_path):
+    history, timeline = recorded
+    with open(history.history_path("99"), "ab") as f:
+        f.write(b"\x00" * 7)
+    reader = CharacterHistory(str(tmp_path), keyframe_interval=4)
+    assert reader.state_at("99") == {"ts": timeline[-1][0], **timeline[-1][1]}
+    packet = list(captures())[-1]
+    packet["characterDataBase"]["level"] = 500
+    assert reader.record("99", packet, captured_at=5000.0) == "delta"
+    assert CharacterHistory(str(tmp_path)).state_at("99")["meta"]["level"] == 500
+
+
+def record_levels(history, levels, results):
+    recorded = 0
+    for level in levels:
+        packet = next(captures())
+        packet["characterDataBase"]["level"] = level
+        # Captures that lose the race to the file are older than its history and are skipped
+        recorded += history.record("99", packet) is not None
+    results.put(recorded)
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_processes_recording_the_same_character(tmp_path):
+    history = CharacterHistory(str(tmp_path), keyframe_interval=4)
+    history.record("99", next(captures()), captured_at=1.0)
+    assert len(history.timeline("99")) == 1
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [context.Process(target=record_levels, args=(history, range(100 * n + 2, 100 * n + 30), results))
+               for n in range(4)]
+    for worker in workers:
+        worker.start()
+    recorded = sum(results.get(timeout=30) for _ in workers)
+    for worker in workers:
+        worker.join(10)
+
+    # The parent's cached index follows appends made by other processes
+    timeline = history.timeline("99")
+    assert len(timeline) == 1 + recorded
+    assert timeline == CharacterHistory(str(tmp_path)).timeline("99")
+    for entry in timeline:
+        assert history.state_at("99", entry["ts"])["ts"] == entry["ts"]
+    assert os.path.getsize(history.history_path("99")) == history._indexes["99"][2]
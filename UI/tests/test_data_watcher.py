@@ -0,0 +1,175 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import pytest
+
+from src.models import data_watcher, stash_manager
+from src.models.appdirs import get_data_dir
+from src.models.data_watcher import DirectoryWatcher, InotifyWatcher, PollingWatcher
+
+WATCHERS = [PollingWatcher, pytest.param(InotifyWatcher, marks=pytest.mark.skipif(
+    not InotifyWatcher.is_available(), reason="inotify is not available"))]
+
+
+class ScriptedWatcher(DirectoryWatcher):
+    """Reports the changes queued by the test"""
+
+    name = "scripted"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.events = queue.Queue()
+
+    def _wait(self, timeout):
+        try:
+            names = self.events.get(timeout=timeout)
+        except queue.Empty:
+            return
+        if names == "fail":
+            raise OSError("watch failed")
+        self._changed(names)
+
+    def stop(self):
+        # Wake the watcher thread instead of waiting out its timeout
+        self._stop.set()
+        self.events.put(set())
+        super().stop()
+
+
+@pytest.fixture
+def calls():
+    return queue.Queue()
+
+
+def start(watcher):
+    watcher.start()
+    return watcher
+
+
+def test_changes_are_debounced_into_one_call(tmp_path, calls):
+    watcher = start(ScriptedWatcher(str(tmp_path), calls.put, debounce=0.2))
+    try:
+        for name in ("a", "b", "a"):
+            watcher.events.put({name})
+            time.sleep(0.02)
+        watcher.events.put(set())
+        assert calls.get(timeout=5) == {"a", "b"}
+        assert calls.empty()
+        watcher.events.put({"c"})
+        assert calls.get(timeout=5) == {"c"}
+    finally:
+        watcher.stop()
+
+
+def test_steady_changes_are_reported_after_max_delay(tmp_path, calls):
+    watcher = start(ScriptedWatcher(str(tmp_path), calls.put, debounce=0.2, max_delay=0.3))
+    stop = threading.Event()
+
+    def keep_changing():
+        n = 0
+        while not stop.is_set():
+            watcher.events.put({f"file{n}"})
+            n += 1
+            time.sleep(0.05)
+
+    changer = threading.Thread(target=keep_changing)
+    changer.start()
+    try:
+        assert calls.get(timeout=2)
+    finally:
+        stop.set()
+        changer.join()
+        watcher.stop()
+
+
+def test_lost_changes_ask_for_a_rescan(tmp_path, calls):
+    watcher = start(ScriptedWatcher(str(tmp_path), calls.put, debounce=0.05))
+    try:
+        watcher.events.put({"a"})
+        watcher.events.put(None)
+        assert calls.get(timeout=5) is None
+    finally:
+        watcher.stop()
+
+
+def test_failures_do_not_stop_the_watcher(tmp_path, calls):
+    def callback(names):
+        calls.put(names)
+        raise RuntimeError("handler failed")
+
+    watcher = start(ScriptedWatcher(str(tmp_path), callback, debounce=0.05))
+    try:
+        watcher.events.put("fail")
+        watcher.events.put({"a"})
+        assert calls.get(timeout=5) == {"a"}
+        watcher.events.put({"b"})
+        assert calls.get(timeout=5) == {"b"}
+    finally:
+        watcher.stop()
+
+
+@pytest.mark.parametrize("watcher_class", WATCHERS)
+def test_file_changes_are_reported(tmp_path, calls, watcher_class):
+    (tmp_path / "old.json").write_text("{}")
+    (tmp_path / "gone.json").write_text("{}")
+    watcher = start(watcher_class(str(tmp_path), calls.put, debounce=0.1, poll_interval=0.05))
+    try:
+        (tmp_path / "new.json").write_text("{}")
+        (tmp_path / "gone.json").unlink()
+        os.replace(tmp_path / "old.json", tmp_path / "moved.json")
+        changed = set()
+        while changed != {"new.json", "gone.json", "old.json", "moved.json"}:
+            changed |= calls.get(timeout=5)
+    finally:
+        watcher.stop()
+
+
+def test_create_watcher_falls_back_to_polling(tmp_path, monkeypatch):
+    monkeypatch.setattr(InotifyWatcher, "is_available", classmethod(lambda cls: False))
+    assert isinstance(data_watcher.create_watcher(str(tmp_path), print), PollingWatcher)
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    manager = stash_manager.StashManager(get_data_dir())
+    yield manager
+    manager.stop_watching()
+
+
+def write_character(data_dir, character_id, level=1):
+    packet = {"characterDataBase": {"characterId": character_id, "level": level,
+                                    "nickName": {"originalNickName": f"c{character_id}"}}}
+    path = os.path.join(data_dir, f"{character_id}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(packet, f)
+    return path
+
+
+def test_changed_files_update_the_manager(manager):
+    changes = []
+    manager._on_change = lambda: changes.append(manager.generation)
+    path = write_character(manager.data_dir, "7", level=3)
+    manager._files_changed({"7.json", "2025-01-31_12-00-00.json", "notes.txt"})
+    assert manager.characters_cache["7"]["level"] == 3
+    assert len(changes) == 1
+
+    # Nothing to reload for files that are not character files
+    manager._files_changed({"notes.txt"})
+    assert len(changes) == 1
+
+    os.remove(path)
+    manager._files_changed({"7.json"})
+    assert "7" not in manager.characters_cache
+    assert len(changes) == 2
+
+
+def test_watching_picks_up_new_character_files(manager):
+    changed = threading.Event()
+    manager.start_watching(changed.set, debounce=0.05, poll_interval=0.05)
+    write_character(manager.data_dir, "8", level=5)
+    assert changed.wait(5)
+    assert manager.characters_cache["8"]["level"] == 5
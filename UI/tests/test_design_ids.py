@@ -0,0 +1,76 @@
+import threading
+
+from src.models import design_ids
+from src.models.design_ids import InternTable, item_properties
+
+
+def test_names_and_ids():
+    table = InternTable("DesignDataItem:Id_Item_")
+    assert table.intern("DesignDataItem:Id_Item_GoldCoin") == (0, "GoldCoin")
+    assert table.intern("DesignDataItem:Id_Item_Longsword_5001") == (1, "Longsword_5001")
+    assert table.name("DesignDataItem:Id_Item_GoldCoin") == "GoldCoin"
+    assert table.id("DesignDataItem:Id_Item_Longsword_5001") == 1
+    assert table.names == ["GoldCoin", "Longsword_5001"]
+    assert len(table) == 2
+
+
+def test_raw_strings_with_and_without_prefix_share_an_id():
+    table = InternTable("DesignDataItem:Id_Item_")
+    assert table.id("GoldCoin") == table.id("DesignDataItem:Id_Item_GoldCoin")
+    assert len(table) == 1
+    # Both raw strings are remembered, so neither is converted again
+    assert set(table._entries) == {"GoldCoin", "DesignDataItem:Id_Item_GoldCoin"}
+
+
+def test_spaces():
+    assert design_ids.ranks.name("LeaderboardRankData:Id_LeaderboardRank_Grand_Master") == "Grand Master"
+    assert design_ids.character_classes.name("DesignDataPlayerCharacter:Id_PlayerCharacter_Fighter") == "Fighter"
+
+
+def test_concurrent_interning_assigns_one_id_per_name():
+    table = InternTable("P_")
+    barrier = threading.Barrier(4)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append([table.id(f"P_{n % 50}") for n in range(500)])
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(table) == 50
+    assert all(ids == results[0] for ids in results)
+    assert sorted(table.names) == sorted(f"{n}" for n in range(50))
+
+
+def test_item_properties():
+    prefix = design_ids.PROPERTY_EFFECT_PREFIX
+    data = {
+        "primaryPropertyArray": [{"propertyTypeId": f"{prefix}ArmorRating", "propertyValue": 40},
+                                 {"propertyTypeId": f"{prefix}MoveSpeed"},
+                                 "garbage"],
+        "secondaryPropertyArray": [{"propertyTypeId": f"{prefix}Strength", "propertyValue": 2}],
+    }
+    assert item_properties(data, "primaryPropertyArray") == [("ArmorRating", 40)]
+    assert item_properties(data, "secondaryPropertyArray") == [("Strength", 2)]
+    assert item_properties({}, "primaryPropertyArray") == []
+
+
+def test_catalog_design_string_lookup_uses_the_item_table(item_catalog):
+    assert item_catalog.get_item_id_from_design_str("DesignDataItem:Id_Item_Lantern_2001") == "Lantern_2001"
+    assert design_ids.item_designs.name("DesignDataItem:Id_Item_Lantern_2001") == "Lantern_2001"
+
+
+def test_characters_are_built_with_interned_names(tmp_path):
+    from src.models import stash_manager
+    packet = {"characterDataBase": {
+        "characterId": "3",
+        "characterClass": "DesignDataPlayerCharacter:Id_PlayerCharacter_Wizard",
+        "nickName": {"originalNickName": "c3", "rankId": "LeaderboardRankData:Id_LeaderboardRank_Iron_III"},
+    }}
+    result = stash_manager.build_character(packet, str(tmp_path / "3.json"), 0, str(tmp_path))
+    assert result["character_data"]["class"] == "Wizard"
+    assert result["character_data"]["rank"]["name"] == "Iron III"
@@ -0,0 +1,113 @@
+import pytest
+
+pytest.importorskip("google.protobuf")
+
+from src.models.capture import PacketCapture
+from src.models.frame_pool import ProcessHandler
+from src.models.reassembly import FRAME_HEADER
+from networking.protos import Lobby_pb2, _PacketCommand_pb2
+
+CHARACTER_INFO = _PacketCommand_pb2.PacketCommand.S2C_LOBBY_CHARACTER_INFO_RES
+CHARACTER_INFO_REQ = _PacketCommand_pb2.PacketCommand.C2S_LOBBY_CHARACTER_INFO_REQ
+UNSUBSCRIBED = _PacketCommand_pb2.PacketCommand.S2C_ALIVE_RES
+
+
+def frame(proto_type, message=b""):
+    body = message if isinstance(message, bytes) else message.SerializeToString()
+    return FRAME_HEADER.pack(FRAME_HEADER.size + len(body), proto_type, 0) + body
+
+
+class Owner:
+    def __init__(self):
+        self.seen = []
+
+    def request(self, message):
+        self.seen.append(message)
+
+    def response(self, message):
+        self.seen.append(message)
+
+
+class FakePool:
+    """Frame pool with worker processes that records what it is handed"""
+    processes = 1
+
+    def __init__(self):
+        self.offloaded = []
+
+    def run_in_process(self, fn, message_name, packet_data, block=None):
+        self.offloaded.append((fn, message_name, packet_data))
+        return True
+
+
+@pytest.fixture
+def capture(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    capture = PacketCapture(restore_state=False, workers=0)
+    parsed = []
+    parse_proto = capture.parse_proto
+
+    def counting_parse(packet_data, proto_type, message_class=None):
+        parsed.append(proto_type)
+        return parse_proto(packet_data, proto_type, message_class)
+
+    monkeypatch.setattr(capture, "parse_proto", counting_parse)
+    capture.parsed = parsed
+    return capture
+
+
+def test_unsubscribed_frames_are_not_parsed(capture):
+    capture.capture_info = {CHARACTER_INFO: lambda message: None}
+    capture.handle_packet(frame(UNSUBSCRIBED), UNSUBSCRIBED)
+    assert capture.parsed == []
+    assert capture.pipeline_metrics.frames_unsubscribed == 1
+    assert capture.pipeline_metrics.frames_handled == 0
+
+
+def test_subscribed_frame_is_parsed_once_for_all_its_handlers(capture):
+    seen = []
+    capture.capture_info = {CHARACTER_INFO: [seen.append, seen.append]}
+    capture.handle_packet(frame(CHARACTER_INFO, Lobby_pb2.SS2C_LOBBY_CHARACTER_INFO_RES(result=1)), CHARACTER_INFO)
+    assert capture.parsed == [CHARACTER_INFO]
+    assert len(seen) == 2 and seen[0] is seen[1]
+    assert seen[0].result == 1
+    assert capture.pipeline_metrics.frames_handled == 1
+
+
+def test_dispatch_follows_capture_info(capture):
+    capture.capture_info = {CHARACTER_INFO: lambda message: None}
+    assert set(capture._dispatch) == {CHARACTER_INFO}
+    assert not capture._outbound
+    capture.capture_info = {}
+    capture.handle_packet(frame(CHARACTER_INFO, Lobby_pb2.SS2C_LOBBY_CHARACTER_INFO_RES(result=1)), CHARACTER_INFO)
+    assert capture.parsed == []
+
+
+def test_handlers_of_one_object_share_a_shard(capture):
+    owner = Owner()
+    capture.capture_info = {CHARACTER_INFO_REQ: owner.request, CHARACTER_INFO: owner.response,
+                            UNSUBSCRIBED: lambda message: None}
+    assert capture._shards[CHARACTER_INFO] == capture._shards[CHARACTER_INFO_REQ]
+    assert UNSUBSCRIBED not in capture._shards
+    # A client request was subscribed to, so outbound traffic is needed
+    assert capture._outbound
+
+
+def test_process_only_frames_are_decoded_in_the_worker(capture):
+    pool = capture.frame_pool = FakePool()
+    handler = ProcessHandler(print)
+    capture.capture_info = {CHARACTER_INFO: handler}
+    packet = frame(CHARACTER_INFO, Lobby_pb2.SS2C_LOBBY_CHARACTER_INFO_RES(result=1))
+    capture.handle_packet(packet, CHARACTER_INFO)
+    assert capture.parsed == []
+    assert pool.offloaded == [(print, "SS2C_LOBBY_CHARACTER_INFO_RES", packet)]
+
+
+def test_frames_with_an_in_process_handler_are_still_parsed(capture):
+    pool = capture.frame_pool = FakePool()
+    seen = []
+    capture.capture_info = {CHARACTER_INFO: [ProcessHandler(print), seen.append]}
+    capture.handle_packet(frame(CHARACTER_INFO, Lobby_pb2.SS2C_LOBBY_CHARACTER_INFO_RES(result=1)), CHARACTER_INFO)
+    assert capture.parsed == [CHARACTER_INFO]
+    assert seen[0].result == 1
+    assert len(pool.offloaded) == 1
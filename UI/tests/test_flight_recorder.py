@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from src.models import flight_recorder
+from src.models.flight_recorder import FlightRecorder
+
+
+def test_ring_buffer_keeps_the_most_recent_frames():
+    recorder = FlightRecorder(capacity=3)
+    for n in range(5):
+        recorder.record(n, f"CMD_{n}", 10 * n, flight_recorder.HANDLED)
+    frames = recorder.dump()
+    assert [frame["proto_type"] for frame in frames] == [2, 3, 4]
+    assert frames[-1]["command"] == "CMD_4" and frames[-1]["length"] == 40
+    assert frames[-1]["latency_ms"] is None
+    summary = recorder.summary()
+    assert (summary["capacity"], summary["size"], summary["recorded"]) == (3, 3, 5)
+
+
+def test_dump_filters_by_outcome_and_limit():
+    recorder = FlightRecorder()
+    outcomes = [flight_recorder.HANDLED, flight_recorder.DROPPED, flight_recorder.HANDLED,
+                flight_recorder.PARSE_FAILED, flight_recorder.HANDLED]
+    for n, outcome in enumerate(outcomes):
+        recorder.record(n, "CMD", 8, outcome)
+    assert [f["proto_type"] for f in recorder.dump(outcome=flight_recorder.HANDLED)] == [0, 2, 4]
+    assert [f["proto_type"] for f in recorder.dump(limit=2)] == [3, 4]
+    assert [f["proto_type"] for f in recorder.dump(limit=1, outcome=flight_recorder.HANDLED)] == [4]
+    assert recorder.dump(limit=0) == []
+    assert recorder.summary()["outcomes"] == {"handled": 3, "dropped": 1, "parse_failed": 1}
+
+
+def test_latency_is_measured_from_the_first_segment():
+    recorder = FlightRecorder()
+    recorder.record(1, "CMD", 8, flight_recorder.HANDLED, started=time.monotonic() - 0.25)
+    assert recorder.dump()[0]["latency_ms"] == pytest.approx(250, abs=50)
+
+
+def test_clear_keeps_the_total():
+    recorder = FlightRecorder()
+    recorder.record(1, "CMD", 8, flight_recorder.HANDLED)
+    recorder.clear()
+    assert recorder.dump() == []
+    assert recorder.summary()["recorded"] == 1
+
+
+def test_capture_records_each_frame_outcome(tmp_path, monkeypatch):
+    pytest.importorskip("google.protobuf")
+    from src.models.capture import PacketCapture
+    from src.models.reassembly import FRAME_HEADER
+    from networking.protos import _PacketCommand_pb2
+    character_info = _PacketCommand_pb2.PacketCommand.S2C_LOBBY_CHARACTER_INFO_RES
+    alive = _PacketCommand_pb2.PacketCommand.S2C_ALIVE_RES
+
+    def frame(proto_type, body):
+        return FRAME_HEADER.pack(FRAME_HEADER.size + len(body), proto_type, 0) + body
+
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    capture = PacketCapture(restore_state=False, workers=0)
+    capture.capture_info = {character_info: lambda message: None}
+    capture.process_packet(frame(character_info, b"\x08\x01") + frame(alive, b"") +
+                           frame(character_info, b"\xff\xff\xff"), "stream", 1)
+
+    frames = capture.flight_recorder.dump()
+    assert [(f["command"], f["outcome"]) for f in frames] == [
+        ("S2C_LOBBY_CHARACTER_INFO_RES", flight_recorder.HANDLED),
+        ("S2C_ALIVE_RES", flight_recorder.UNSUBSCRIBED),
+        ("S2C_LOBBY_CHARACTER_INFO_RES", flight_recorder.PARSE_FAILED),
+    ]
+    assert frames[0]["length"] == 10
+    assert all(f["latency_ms"] is not None for f in frames)
@@ -0,0 +1,53 @@
+from pathlib import Path
+
+from src.models import game_data
+
+
+def test_catalog_resolves_every_item_once(item_catalog):
+    assert [entry.item_id for entry in item_catalog.items] == list(item_catalog.data)
+    assert [entry.index for entry in item_catalog.items] == list(range(len(item_catalog.data)))
+    entry = item_catalog.lookup("Longsword_5001")
+    assert entry is item_catalog.catalog["Longsword_5001"]
+    assert (entry.name, entry.rarity, entry.rarity_id, entry.width, entry.height, entry.vendor_price) == (
+        "Longsword", "Rare", 4, 1, 3, 40)
+
+
+def test_missing_fields_get_defaults(item_catalog):
+    entry = item_catalog.lookup("LongBow_4001")
+    assert (entry.width, entry.height, entry.vendor_price, entry.icon_path, entry.image_url) == (1, 1, 0, None, None)
+    assert item_catalog.lookup("GoldCoin").rarity_id == 0
+
+
+def test_unknown_items_get_a_placeholder(item_catalog):
+    entry = item_catalog.lookup("Mystery_9001")
+    assert (entry.index, entry.item_id, entry.name, entry.rarity, entry.width, entry.height) == (
+        -1, "Mystery_9001", "", 0, 1, 1)
+    assert entry.rarity_id is None
+    assert "Mystery_9001" not in item_catalog.catalog
+    assert item_catalog.get_item_name_from_id("Mystery_9001") == ""
+    assert item_catalog.get_item_dimensions_from_id("Mystery_9001") == (1, 1)
+    assert item_catalog.get_item_image_path_from_id("Mystery_9001") is None
+
+
+def test_icon_paths():
+    item = {"name": "Torch", "iconPath": "icons\\items\\torch.png"}
+    entry = game_data.CatalogItem.from_data(0, "Torch_2001", item)
+    assert entry.icon_path == "icons\\items\\torch.png"
+    assert entry.image_url == "/assets/icons/items/torch.png"
+
+
+def test_get_item_methods_read_the_catalog(item_catalog):
+    assert item_catalog.get_item_dimensions_from_id("Longsword_5001") == (1, 3)
+    assert item_catalog.get_item_rarity_from_id("Longsword_2001") == "Common"
+    assert item_catalog.get_item_name_from_id("Longbow_of_Light_8001") == "Longbow of Light"
+    item_catalog.catalog["Lantern_2001"].icon_path = "icons/lantern.png"
+    assert item_catalog.get_item_image_path_from_id("Lantern_2001") == Path("icons/lantern.png")
+
+
+def test_lookup_design_str(item_catalog):
+    entry = item_catalog.lookup_design_str("DesignDataItem:Id_Item_Longsword_5001")
+    assert entry is item_catalog.lookup("Longsword_5001")
+    assert item_catalog._by_design["DesignDataItem:Id_Item_Longsword_5001"] is entry
+    # Unknown items are not remembered, so a reloaded catalog can still resolve them
+    assert item_catalog.lookup_design_str("DesignDataItem:Id_Item_Mystery_9001").index == -1
+    assert "DesignDataItem:Id_Item_Mystery_9001" not in item_catalog._by_design
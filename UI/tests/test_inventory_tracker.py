@@ -0,0 +1,177 @@
+import json
+import logging
+
+import pytest
+
+pytest.importorskip("google.protobuf")
+pytest.importorskip("PIL")
+
+from src.models import inventory_tracker, stash_preview  # noqa: E402
+from src.models.inventory_tracker import (REQUEST_TIMEOUT, InventoryTracker, apply_ops,  # noqa: E402
+                                          apply_ops_to_stashes, delta_path, load_deltas)
+from src.models.proto_registry import registry  # noqa: E402
+
+
+def raw(uid, inventory, slot, count=1, item_id="DesignDataItem:Id_Item_GoldCoin"):
+    return {"itemUniqueId": uid, "itemId": item_id, "inventoryId": inventory, "slotId": slot, "itemCount": count}
+
+
+@pytest.fixture
+def items():
+    return {"1": raw("1", 2, 0, count=10), "2": raw("2", 2, 1, count=3), "3": raw("3", 3, 0)}
+
+
+def test_move(items):
+    assert apply_ops(items, [{"op": "move", "uniqueId": "3", "inventoryId": 2, "slotId": 7}]) == {2, 3}
+    assert (items["3"]["inventoryId"], items["3"]["slotId"]) == (2, 7)
+
+
+def test_count_removes_empty_stacks(items):
+    assert apply_ops(items, [{"op": "count", "uniqueId": "1", "delta": -4}]) == {2}
+    assert items["1"]["itemCount"] == 6
+    apply_ops(items, [{"op": "count", "uniqueId": "2", "delta": -3}])
+    assert "2" not in items
+
+
+def test_split(items):
+    changed = apply_ops(items, [{"op": "split", "uniqueId": "1", "newUniqueId": "9", "count": 4,
+                                 "inventoryId": 3, "slotId": 5}])
+    assert changed == {2, 3}
+    assert items["1"]["itemCount"] == 6
+    assert items["9"] == dict(raw("9", 3, 5, count=4))
+
+
+def test_split_of_the_whole_stack(items):
+    apply_ops(items, [{"op": "split", "uniqueId": "2", "newUniqueId": "9", "count": 3,
+                       "inventoryId": 2, "slotId": 8}])
+    assert "2" not in items and items["9"]["itemCount"] == 3
+
+
+def test_merge_from_old_journals(items):
+    assert apply_ops(items, [{"op": "merge", "uniqueId": "2", "dstUniqueId": "1"}]) == {2}
+    assert "2" not in items and items["1"]["itemCount"] == 13
+
+
+def test_upsert_and_remove(items):
+    changed = apply_ops(items, [{"op": "upsert", "item": raw("1", 5, 0, count=1)},
+                                {"op": "remove", "uniqueId": "3"}])
+    assert changed == {2, 3, 5}
+    assert items["1"]["inventoryId"] == 5 and "3" not in items
+
+
+def test_replace_clears_requested_inventories(items):
+    changed = apply_ops(items, [{"op": "replace", "inventoryIds": [2, 4], "items": [raw("7", 4, 0)]}])
+    assert changed == {2, 4}
+    assert sorted(items) == ["3", "7"]
+
+
+def test_ops_on_unknown_items_change_nothing(items):
+    before = json.loads(json.dumps(items))
+    assert apply_ops(items, [{"op": "move", "uniqueId": "x", "inventoryId": 1, "slotId": 1},
+                             {"op": "count", "uniqueId": "x", "delta": 1},
+                             {"op": "remove", "uniqueId": "x"},
+                             {"op": "bogus"}]) == set()
+    assert items == before
+
+
+def test_apply_ops_to_stashes_copies_entries(item_catalog, monkeypatch):
+    monkeypatch.setattr(stash_preview, "item_data_manager", item_catalog)
+    stashes = {"2": [stash_preview.stash_item(raw("1", 2, 0, count=10)),
+                     stash_preview.stash_item(raw("2", 2, 1, count=3))],
+               "3": [stash_preview.stash_item(raw("3", 3, 0))]}
+    original = stashes["2"]
+    untouched = stashes["3"]
+    changed = apply_ops_to_stashes(stashes, [{"op": "move", "uniqueId": "2", "inventoryId": 4, "slotId": 0}])
+    assert changed == {2, 4}
+    assert [e["data"]["itemUniqueId"] for e in stashes["2"]] == ["1"]
+    assert stashes["4"][0]["name"] == "Gold Coin"
+    # Entries other readers hold are not modified, and unchanged stashes are kept as they are
+    assert original[1]["data"]["inventoryId"] == 2
+    assert stashes["3"] is untouched
+    apply_ops_to_stashes(stashes, [{"op": "remove", "uniqueId": "3"}])
+    assert "3" not in stashes
+
+
+def test_load_deltas_skips_a_torn_line(tmp_path):
+    path = tmp_path / "1.deltas.jsonl"
+    ops = [{"op": "remove", "uniqueId": "1"}, {"op": "remove", "uniqueId": "2"}]
+    path.write_text(json.dumps({"ops": ops[:1]}) + "\n" + json.dumps({"ops": ops[1:]}) + "\n" + '{"ops": [{"op"')
+    assert load_deltas(str(path)) == ops
+    assert load_deltas(str(tmp_path / "missing.jsonl")) == []
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def tracked(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(inventory_tracker.time, "monotonic", clock)
+    applied, resynced = [], []
+    tracker = InventoryTracker(lambda character_id, ops: applied.append(ops), data_dir=str(tmp_path),
+                               resync=resynced.append)
+    tracker.set_character("7")
+    return tracker, clock, applied, resynced
+
+
+def move_request(uid, inventory, slot):
+    request = registry.get("SC2S_INVENTORY_MOVE_REQ")()
+    request.srcInfo.uniqueId = uid
+    request.dstInventoryId = inventory
+    request.dstSlotId = slot
+    return request
+
+
+def test_unanswered_requests_expire(tracked):
+    tracker, clock, applied, resynced = tracked
+    # Rejected by the server: no response ever comes for it
+    tracker.on_move_request(move_request(1, 2, 0))
+    clock.now += REQUEST_TIMEOUT + 1
+    tracker.on_move_request(move_request(2, 3, 4))
+    tracker.on_move(registry.get("SS2C_INVENTORY_MOVE_RES")())
+    assert applied == [[{"op": "move", "uniqueId": "2", "inventoryId": 3, "slotId": 4}]]
+    assert load_deltas(delta_path("7", tracker.data_dir)) == applied[0]
+    assert resynced == []
+
+
+def test_response_without_a_request_needs_a_resync(tracked):
+    tracker, clock, applied, resynced = tracked
+    tracker.on_move_request(move_request(1, 2, 0))
+    clock.now += REQUEST_TIMEOUT + 1
+    tracker.on_move(registry.get("SS2C_INVENTORY_MOVE_RES")())
+    assert applied == []
+    assert resynced == ["7"] and tracker.needs_resync == {"7"}
+    # A new full capture of the character starts over with an empty journal
+    tracker.set_character("7")
+    assert tracker.needs_resync == set()
+
+
+def test_all_update_without_a_request(tracked, caplog):
+    tracker, _, applied, resynced = tracked
+    response = registry.get("SS2C_INVENTORY_ALL_UPDATE_RES")(result=1)
+    item = response.inventoryItems.add()
+    item.itemUniqueId = 5
+    item.inventoryId = 3
+    with caplog.at_level(logging.WARNING):
+        tracker.on_all_update(response)
+    assert caplog.records == []
+    assert resynced == []
+    assert applied[0][0]["inventoryIds"] == [3]
+    # Failed updates change nothing
+    tracker.on_all_update(registry.get("SS2C_INVENTORY_ALL_UPDATE_RES")(result=2))
+    assert len(applied) == 1
+
+
+def test_new_capture_clears_the_journal(tracked):
+    tracker, _, applied, _ = tracked
+    tracker.on_move_request(move_request(1, 2, 0))
+    tracker.on_move(registry.get("SS2C_INVENTORY_MOVE_RES")())
+    path = delta_path("7", tracker.data_dir)
+    assert load_deltas(path)
+    tracker.set_character("7")
+    assert load_deltas(path) == []
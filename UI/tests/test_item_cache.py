@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+from src.models import game_data, item_cache
+from src.models.item_cache import encode_item_cache, load_item_cache, save_item_cache
+
+COLUMNS = {"item_id": ["A", "B"], "name": ["a", "b"], "rarity": ["Rare", 0], "width": [1, 2], "height": [3, 1],
+           "icon_path": [None, "icons/b.png"], "vendor_price": [0, 9]}
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "items.catalog")
+    assert save_item_cache(path, COLUMNS, "hash") == (tmp_path / "items.catalog").stat().st_size
+    assert load_item_cache(path, "hash") == COLUMNS
+
+
+@pytest.mark.parametrize("change", ["source", "version", "python"])
+def test_cache_of_another_build_is_ignored(tmp_path, monkeypatch, change):
+    path = tmp_path / "items.catalog"
+    path.write_bytes(encode_item_cache(COLUMNS, "hash"))
+    if change == "version":
+        monkeypatch.setattr(item_cache, "CACHE_VERSION", item_cache.CACHE_VERSION + 1)
+    elif change == "python":
+        monkeypatch.setattr(item_cache, "python_tag", lambda: "cpython-2.7")
+    assert load_item_cache(str(path), "other" if change == "source" else "hash") is None
+
+
+@pytest.mark.parametrize("data", [b"", b"{}", item_cache.MAGIC + b"\xff"])
+def test_unusable_cache_is_ignored(tmp_path, data):
+    path = tmp_path / "items.catalog"
+    path.write_bytes(data)
+    assert load_item_cache(str(path), "hash") is None
+    assert load_item_cache(str(tmp_path / "missing.catalog"), "hash") is None
+
+
+def catalog_of(manager):
+    return [(e.index, e.item_id, e.name, e.rarity, e.rarity_id, e.width, e.height, e.icon_path, e.image_url,
+             e.vendor_price) for e in manager.items]
+
+
+def test_nothing_is_read_before_the_first_lookup(tmp_path):
+    manager = game_data.ItemDataManager(str(tmp_path / "missing" / "items.json"))
+    assert manager._catalog is None
+    with pytest.raises(FileNotFoundError):
+        manager.lookup("GoldCoin")
+
+
+def test_second_start_loads_the_compiled_catalog(item_catalog, monkeypatch):
+    expected = catalog_of(item_catalog)
+    cache_file = game_data.get_item_cache_file()
+    assert load_item_cache(cache_file, item_catalog.source_hash) is not None
+
+    manager = game_data.ItemDataManager(item_catalog.file_path)
+    monkeypatch.setattr(game_data.json, "load", lambda f: pytest.fail("items.json parsed again"))
+    assert catalog_of(manager) == expected
+    assert manager._data is None
+
+
+def test_changed_items_json_is_compiled_again(item_catalog):
+    item_catalog.lookup("GoldCoin")
+    with open(item_catalog.file_path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    items["GoldCoin"]["name"] = "Gold Coins"
+    with open(item_catalog.file_path, "w", encoding="utf-8") as f:
+        json.dump(items, f)
+
+    manager = game_data.ItemDataManager(item_catalog.file_path)
+    assert manager.lookup("GoldCoin").name == "Gold Coins"
+    assert load_item_cache(game_data.get_item_cache_file(), manager.source_hash)["name"][
+        manager.lookup("GoldCoin").index] == "Gold Coins"
+
+
+def test_bundled_catalog_is_preferred(item_catalog):
+    columns = item_catalog.compile_columns()
+    columns["name"] = [name.upper() for name in columns["name"]]
+    save_item_cache(item_catalog.bundled_cache_file, columns, item_catalog.source_hash)
+
+    manager = game_data.ItemDataManager(item_catalog.file_path)
+    assert manager.lookup("GoldCoin").name == "GOLD COIN"
+    # Nothing is compiled into the app data directory
+    assert not os.path.exists(game_data.get_item_cache_file())
+
+
+def test_unwritable_cache_still_loads(item_catalog, monkeypatch, tmp_path):
+    monkeypatch.setattr(game_data, "get_item_cache_file", lambda: str(tmp_path / "missing" / "items.cache"))
+    assert item_catalog.lookup("GoldCoin").name == "Gold Coin"
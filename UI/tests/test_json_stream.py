@@ -0,0 +1,92 @@
+import io
+import json
+
+import pytest
+
+from src.models.json_stream import CHARACTER_KEYS, JsonStream, load_character_json
+
+DOCUMENT = json.dumps({
+    "result": 1,
+    "numbers": [0, -1, 12345678901234567890, 1.5, -2.25e+10, 3E-7, 1e5],
+    "strings": ["", "plain", "quote \" inside", "back\\slash", "unicode é中", "😀", "}]{["],
+    "nested": {"a": [{"b": [[], {}, [1, [2, [3]]]]}], "c": None, "d": True, "e": False},
+    "characterDataBase": {
+        "characterId": "12345",
+        "nickName": {"originalNickName": "Tester"},
+        "level": 20,
+        "ignored": {"deep": ["x" * 50, {"y": [1, 2, 3]}]},
+        "CharacterItemList": [{"itemUniqueId": str(i), "itemCount": i, "slotId": i * 1.5} for i in range(20)],
+        "CharacterStorageInfos": [],
+    },
+    "trailing": 123.456e-2,
+}, ensure_ascii=False)
+
+CHUNK_SIZES = [1, 2, 3, 5, 7, 16, 64, 1 << 20]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_value_matches_json_load(chunk_size):
+    assert JsonStream(io.StringIO(DOCUMENT), chunk_size).value() == json.loads(DOCUMENT)
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 12))
+@pytest.mark.parametrize("number", ["1", "10", "1.5", "1e5", "1.5e+10", "-0.25E-3", "123456789012"])
+def test_numbers_cut_at_chunk_ends(chunk_size, number):
+    document = f'[{number}, {number}]'
+    assert JsonStream(io.StringIO(document), chunk_size).value() == json.loads(document)
+    assert list(JsonStream(io.StringIO(document), chunk_size).items()) == json.loads(document)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_members_and_items_walk_the_document(chunk_size):
+    stream = JsonStream(io.StringIO(DOCUMENT), chunk_size)
+    walked = {}
+    for key in stream.members():
+        if key == "numbers":
+            walked[key] = list(stream.items())
+        else:
+            walked[key] = stream.value()
+    assert walked == json.loads(DOCUMENT)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_skip_consumes_exactly_one_value(chunk_size):
+    stream = JsonStream(io.StringIO(DOCUMENT), chunk_size)
+    kept = {}
+    for key in stream.members():
+        if key in ("strings", "nested", "characterDataBase"):
+            stream.skip()
+        else:
+            kept[key] = stream.value()
+    expected = json.loads(DOCUMENT)
+    assert kept == {k: v for k, v in expected.items() if k not in ("strings", "nested", "characterDataBase")}
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_load_character_json(tmp_path, chunk_size):
+    path = tmp_path / "character.json"
+    path.write_text(DOCUMENT, encoding="utf-8")
+    with open(path, encoding="utf-8") as f:
+        full = json.load(f)
+    base = {k: v for k, v in full["characterDataBase"].items() if k in CHARACTER_KEYS}
+    assert load_character_json(str(path), chunk_size=chunk_size) == {"result": 1, "characterDataBase": base}
+    assert load_character_json(str(path), keys=None, chunk_size=chunk_size) == {
+        "result": 1, "characterDataBase": full["characterDataBase"]}
+
+
+def test_document_without_character(tmp_path):
+    path = tmp_path / "dump.json"
+    path.write_text('[1, 2]', encoding="utf-8")
+    assert load_character_json(str(path)) == {}
+
+
+@pytest.mark.parametrize("document", ['{"a": [1, 2', '{"a": "unterminated', '[1 2]', '{"a" 1}'])
+def test_malformed_documents_raise(document):
+    with pytest.raises(ValueError):
+        JsonStream(io.StringIO(document), 2).value()
+
+
+@pytest.mark.parametrize("document", ['{"a": [1, 2', '{"a": "unterminated'])
+def test_skipping_truncated_documents_raises(document):
+    with pytest.raises(ValueError):
+        JsonStream(io.StringIO(document), 2).skip()
@@ -0,0 +1,117 @@
+import pytest
+
+from src.models.metrics import Histogram, PipelineMetrics, to_prometheus
+from src.models.persistence import Persistence
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(1.0, 0.1))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == [(0.1, 2), (1.0, 3), ("+Inf", 4)]
+    assert (snapshot["count"], snapshot["sum"], snapshot["avg"]) == (4, pytest.approx(3.65), pytest.approx(0.9125))
+    histogram.reset()
+    assert histogram.snapshot()["buckets"][-1] == ("+Inf", 0)
+
+
+def test_pipeline_metrics_reset():
+    metrics = PipelineMetrics()
+    metrics.record_segment(100)
+    metrics.record_handled(0.2, 0.01, error=True)
+    metrics.record_parse_failure("S2C_ALIVE_RES")
+    metrics.record_unsubscribed()
+    assert (metrics.segments, metrics.bytes, metrics.frames_handled, metrics.handler_errors,
+            metrics.frames_unsubscribed) == (1, 100, 1, 1, 1)
+    metrics.reset()
+    assert (metrics.segments, metrics.bytes, metrics.frames_handled, metrics.handler_errors,
+            metrics.frames_unsubscribed, metrics.parse_failures) == (0, 0, 0, 0, 0, {})
+    assert metrics.frame_latency.count == 0
+
+
+def test_capture_counts_every_outcome(tmp_path, monkeypatch):
+    pytest.importorskip("google.protobuf")
+    from src.models.capture import PacketCapture
+    from src.models.reassembly import FRAME_HEADER
+    from networking.protos import Lobby_pb2, _PacketCommand_pb2
+    character_info = _PacketCommand_pb2.PacketCommand.S2C_LOBBY_CHARACTER_INFO_RES
+    alive = _PacketCommand_pb2.PacketCommand.S2C_ALIVE_RES
+
+    def frame(proto_type, body):
+        return FRAME_HEADER.pack(FRAME_HEADER.size + len(body), proto_type, 0) + body
+
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    capture = PacketCapture(restore_state=False, workers=0)
+    capture.capture_info = {character_info: lambda message: None}
+    good = frame(character_info, Lobby_pb2.SS2C_LOBBY_CHARACTER_INFO_RES(result=1).SerializeToString())
+    data = good + frame(alive, b"") + frame(character_info, b"\xff\xff\xff")
+    # Split mid-header so one frame spans both segments
+    capture.process_packet(data[:len(good) + 3], "stream", 1)
+    capture.process_packet(data[len(good) + 3:], "stream", len(good) + 4)
+
+    capture.capture_info = {character_info: lambda message: 1 / 0}
+    with pytest.raises(ZeroDivisionError):
+        capture.handle_packet(good, character_info)
+
+    metrics = capture.metrics()
+    assert (metrics["segments"], metrics["bytes"]) == (2, len(data))
+    assert metrics["reassembly"]["frames"] == 3
+    assert (metrics["frames_handled"], metrics["handler_errors"]) == (2, 1)
+    assert metrics["frames_unsubscribed"] == 1
+    assert metrics["parse_failures"] == {"S2C_LOBBY_CHARACTER_INFO_RES": 1}
+    assert metrics["frame_latency_seconds"]["count"] == 2
+    assert metrics["queue"] is None
+
+
+def sample_metrics():
+    metrics = PipelineMetrics()
+    metrics.record_segment(64)
+    metrics.record_handled(0.003, 0.001)
+    metrics.record_parse_failure("S2C_ALIVE_RES")
+    writer = Persistence()
+    return {
+        "segments": metrics.segments,
+        "bytes": metrics.bytes,
+        "reassembly": {"frames": 1, "invalid_headers": 0, "buffer_resets": 0, "dropped_segments": 0,
+                       "pending_bytes": 12, "streams": 1},
+        "frames_handled": metrics.frames_handled,
+        "frames_unsubscribed": 0,
+        "handler_errors": 0,
+        "parse_failures": dict(metrics.parse_failures),
+        "queue": {"depth": 0, "max_depth": 4, "dropped": 2, "blocked_seconds": 0.5},
+        "frame_latency_seconds": metrics.frame_latency.snapshot(),
+        "handler_seconds": metrics.handler_time.snapshot(),
+        "persistence": writer.metrics(),
+    }
+
+
+def test_prometheus_exposition():
+    text = to_prometheus(sample_metrics(), prefix="test")
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert "# TYPE test_segments_total counter" in lines
+    assert "test_segments_total 1" in lines and "test_bytes_total 64" in lines
+    assert "# TYPE test_pending_bytes gauge" in lines
+    assert "test_queue_dropped_total 2" in lines
+    assert "test_persistence_writes_total 0" in lines
+    assert 'test_parse_failures_total{command="S2C_ALIVE_RES"} 1' in lines
+    assert "# TYPE test_frame_latency_seconds histogram" in lines
+    assert 'test_frame_latency_seconds_bucket{le="0.0025"} 0' in lines
+    assert 'test_frame_latency_seconds_bucket{le="0.005"} 1' in lines
+    assert 'test_frame_latency_seconds_bucket{le="+Inf"} 1' in lines
+    assert "test_frame_latency_seconds_count 1" in lines
+    assert "test_persistence_write_seconds_count 0" in lines
+    # Every sample belongs to a declared metric
+    declared = {line.split()[2] for line in lines if line.startswith("# TYPE")}
+    for line in lines:
+        if not line.startswith("#"):
+            name = line.split("{")[0].split()[0]
+            assert name in declared or name.rsplit("_", 1)[0] in declared
+
+
+def test_prometheus_without_queue_or_persistence():
+    metrics = sample_metrics()
+    metrics.update(queue=None, persistence=None)
+    text = to_prometheus(metrics)
+    assert "dndtools_capture_frames_handled_total 1" in text
+    assert "queue" not in text and "persistence" not in text
@@ -0,0 +1,128 @@
+import gzip
+import json
+import os
+import time
+
+import pytest
+
+from src.models import packet_archive
+from src.models.packet_archive import (ENCODING_JSON, ENCODING_PROTOBUF, INDEX_EXTENSION, SEGMENT_EXTENSION,
+                                       PacketArchive, read_segment)
+
+
+def payloads(count, size=1000):
+    return [os.urandom(size) for _ in range(count)]
+
+
+def test_closed_segment_has_its_records_and_index(tmp_path):
+    archive = PacketArchive(str(tmp_path))
+    archive.append("SS2C_A", b"one", captured_at=100.0)
+    archive.append("SS2C_B", b"two", captured_at=90.0)
+    archive.append("SS2C_A", b"three", captured_at=110.0)
+    archive.close()
+
+    [segment] = archive.segments()
+    assert list(read_segment(segment)) == [(100.0, ENCODING_PROTOBUF, "SS2C_A", b"one"),
+                                           (90.0, ENCODING_PROTOBUF, "SS2C_B", b"two"),
+                                           (110.0, ENCODING_PROTOBUF, "SS2C_A", b"three")]
+    [entry] = archive.index()
+    assert (entry["records"], entry["first_ts"], entry["last_ts"]) == (3, 90.0, 110.0)
+    assert entry["commands"] == {"SS2C_A": 2, "SS2C_B": 1}
+    assert entry["bytes"] == os.path.getsize(segment)
+    assert "open" not in entry
+    assert os.path.exists(segment[:-len(SEGMENT_EXTENSION)] + INDEX_EXTENSION)
+
+
+def test_segment_being_written_is_readable_and_scanned(tmp_path):
+    archive = PacketArchive(str(tmp_path))
+    archive.append("SS2C_A", b"one", captured_at=100.0)
+    archive.append("SS2C_A", b"two", captured_at=101.0)
+
+    [segment] = archive.segments()
+    # Every append is flushed, so a crash now loses nothing
+    assert [payload for _, _, _, payload in read_segment(segment)] == [b"one", b"two"]
+    [entry] = archive.index()
+    assert entry["open"] and entry["records"] == 2
+    archive.close()
+
+
+def test_unfinished_and_reopened_gzip_members(tmp_path):
+    path = tmp_path / f"segment{SEGMENT_EXTENSION}"
+    records = [packet_archive._RECORD.pack(float(n), ENCODING_PROTOBUF, 1, 4) + b"A" + b"%04d" % n
+               for n in range(3)]
+    whole = gzip.compress(records[0]) + gzip.compress(records[1] + records[2])
+    # The second member was cut off in the middle of the last record
+    path.write_bytes(whole[:-12])
+    assert [payload for _, _, _, payload in read_segment(str(path))] == [b"0000", b"0001"]
+    path.write_bytes(whole)
+    assert [payload for _, _, _, payload in read_segment(str(path))] == [b"0000", b"0001", b"0002"]
+
+
+def test_full_segments_are_rotated(tmp_path):
+    archive = PacketArchive(str(tmp_path), max_segment_bytes=2500)
+    data = payloads(10)
+    for payload in data:
+        archive.append("SS2C_A", payload)
+    archive.close()
+
+    segments = archive.segments()
+    assert len(segments) > 2
+    assert [p for segment in segments for _, _, _, p in read_segment(segment)] == data
+    assert sum(entry["records"] for entry in archive.index()) == 10
+    assert all("open" not in entry for entry in archive.index())
+
+
+def test_retention_removes_the_oldest_segments(tmp_path):
+    archive = PacketArchive(str(tmp_path), max_segment_bytes=2500, max_total_bytes=6000)
+    for payload in payloads(20):
+        archive.append("SS2C_A", payload)
+    archive.close()
+    segments = archive.segments()
+    assert sum(os.path.getsize(path) for path in segments) <= 6000 + 2500
+    names = sorted(os.listdir(tmp_path))
+    # Indexes go with their segments, and the newest segments are kept
+    assert len(names) == 2 * len(segments)
+    assert 0 < sum(entry["records"] for entry in archive.index()) < 20
+
+
+def test_retention_removes_expired_segments(tmp_path):
+    archive = PacketArchive(str(tmp_path), max_age_days=1)
+    archive.append("SS2C_A", b"old")
+    archive.close()
+    [old] = archive.segments()
+    expired = time.time() - 2 * 86400
+    os.utime(old, (expired, expired))
+
+    archive.append("SS2C_A", b"new")
+    archive.close()
+    [segment] = archive.segments()
+    assert segment != old
+    assert not os.path.exists(old[:-len(SEGMENT_EXTENSION)] + INDEX_EXTENSION)
+
+
+def test_import_dumps_moves_legacy_packet_files(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    dump = {"characterDataBase": {"level": 3}}
+    (data_dir / "2025-01-31_12-00-00.json").write_text(json.dumps(dump), encoding="utf-8")
+    (data_dir / "2025-01-31_12-05-00.json").write_text("{}", encoding="utf-8")
+    (data_dir / "123.json").write_text("{}", encoding="utf-8")
+    archive = PacketArchive(str(tmp_path / "archive"))
+    os.mkdir(archive.archive_dir)
+
+    assert archive.import_dumps(str(data_dir)) == 2
+    assert os.listdir(data_dir) == ["123.json"]
+    [segment] = archive.segments()
+    records = list(read_segment(segment))
+    assert [(encoding, name) for _, encoding, name, _ in records] == [(ENCODING_JSON, "")] * 2
+    assert json.loads(records[0][3]) == dump
+    assert records[0][0] == pytest.approx(time.mktime((2025, 1, 31, 12, 0, 0, 0, 0, -1)))
+    assert archive.import_dumps(str(data_dir)) == 0
+
+
+def test_archive_lives_outside_the_data_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    from src.models.appdirs import get_data_dir
+    archive_dir = PacketArchive().archive_dir
+    assert os.path.isdir(archive_dir)
+    assert os.path.commonpath([archive_dir, get_data_dir()]) != get_data_dir()
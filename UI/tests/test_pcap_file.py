@@ -0,0 +1,111 @@
+import struct
+
+import pytest
+
+from src.models.pcap_file import (PCAPNG_BYTE_ORDER_MAGIC, PCAPNG_EPB, PCAPNG_IDB, PCAPNG_SHB, PCAPNG_SPB,
+                                  list_capture_files, read_capture_file)
+
+DLT_EN10MB = 1
+DLT_RAW = 12
+FRAMES = [b"\x45" + bytes(range(n % 256)) * 3 for n in (1, 20, 61)]
+
+
+def pcap(frames, endian="<", nanoseconds=False, linktype=DLT_RAW):
+    magic = 0xA1B23C4D if nanoseconds else 0xA1B2C3D4
+    data = struct.pack(endian + "IHHiIII", magic, 2, 4, 0, 0, 65535, linktype)
+    for n, frame in enumerate(frames):
+        data += struct.pack(endian + "IIII", 1000 + n, 250, len(frame), len(frame)) + frame
+    return data
+
+
+def block(block_type, body, endian="<"):
+    body += b"\0" * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack(endian + "II", block_type, length) + body + struct.pack(endian + "I", length)
+
+
+def pcapng(frames, endian="<", tsresol=None):
+    data = block(PCAPNG_SHB, struct.pack(endian + "IHHq", PCAPNG_BYTE_ORDER_MAGIC, 1, 0, -1), endian)
+    options = b""
+    if tsresol is not None:
+        options = struct.pack(endian + "HHB3x", 9, 1, tsresol) + struct.pack(endian + "HH", 0, 0)
+    data += block(PCAPNG_IDB, struct.pack(endian + "HHI", DLT_EN10MB, 0, 65535) + options, endian)
+    units = 10 ** (tsresol or 6)
+    for n, frame in enumerate(frames):
+        ts = (1000 + n) * units + units // 4
+        data += block(PCAPNG_EPB, struct.pack(endian + "IIIII", 0, ts >> 32, ts & 0xFFFFFFFF, len(frame),
+                                              len(frame)) + frame, endian)
+    return data
+
+
+@pytest.mark.parametrize("endian", "<>")
+@pytest.mark.parametrize("nanoseconds", [False, True])
+def test_pcap_round_trip(tmp_path, endian, nanoseconds):
+    path = tmp_path / "capture.pcap"
+    path.write_bytes(pcap(FRAMES, endian, nanoseconds))
+    records = list(read_capture_file(str(path)))
+    assert [frame for _, _, frame in records] == FRAMES
+    assert {linktype for _, linktype, _ in records} == {DLT_RAW}
+    fraction = 250e-9 if nanoseconds else 250e-6
+    assert [ts for ts, _, _ in records] == pytest.approx([1000 + n + fraction for n in range(len(FRAMES))])
+
+
+@pytest.mark.parametrize("endian", "<>")
+@pytest.mark.parametrize("tsresol", [None, 9])
+def test_pcapng_round_trip(tmp_path, endian, tsresol):
+    path = tmp_path / "capture.pcapng"
+    path.write_bytes(pcapng(FRAMES, endian, tsresol))
+    records = list(read_capture_file(str(path)))
+    assert [frame for _, _, frame in records] == FRAMES
+    assert {linktype for _, linktype, _ in records} == {DLT_EN10MB}
+    assert [ts for ts, _, _ in records] == pytest.approx([1000.25 + n for n in range(len(FRAMES))])
+
+
+def test_pcapng_sections_and_simple_packets(tmp_path):
+    # A second section in the other byte order, with a simple packet block
+    second = pcapng([], ">") + block(PCAPNG_SPB, struct.pack(">I", len(FRAMES[1])) + FRAMES[1], ">")
+    path = tmp_path / "capture.pcapng"
+    path.write_bytes(pcapng(FRAMES[:1]) + second)
+    assert [frame for _, _, frame in read_capture_file(str(path))] == FRAMES[:2]
+
+
+@pytest.mark.parametrize("build", [pcap, pcapng])
+def test_truncated_file_yields_complete_records(tmp_path, build):
+    data = build(FRAMES)
+    path = tmp_path / "capture.cap"
+    path.write_bytes(data[:-5])
+    assert [frame for _, _, frame in read_capture_file(str(path))] == FRAMES[:-1]
+
+
+@pytest.mark.parametrize("block_length", [0, 4, 8, 30, 33])
+def test_invalid_pcapng_block_length(tmp_path, block_length):
+    data = bytearray(pcapng(FRAMES))
+    idb = len(block(PCAPNG_SHB, bytes(16)))
+    struct.pack_into("<I", data, idb + 4, block_length)
+    path = tmp_path / "capture.pcapng"
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="block length"):
+        list(read_capture_file(str(path)))
+
+
+def test_pcapng_block_length_mismatch(tmp_path):
+    data = bytearray(pcapng(FRAMES))
+    struct.pack_into("<I", data, len(data) - 4, 16)
+    path = tmp_path / "capture.pcapng"
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="does not end with its length"):
+        list(read_capture_file(str(path)))
+
+
+def test_not_a_capture(tmp_path):
+    path = tmp_path / "capture.pcap"
+    path.write_bytes(b"GET / HTTP/1.1\r\n")
+    with pytest.raises(ValueError, match="Not a pcap"):
+        list(read_capture_file(str(path)))
+
+
+def test_list_capture_files(tmp_path):
+    for name in ("b.pcapng", "a.pcap", "c.cap", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    assert [p[len(str(tmp_path)) + 1:] for p in list_capture_files(str(tmp_path))] == ["a.pcap", "b.pcapng", "c.cap"]
+    assert list_capture_files(str(tmp_path / "a.pcap")) == [str(tmp_path / "a.pcap")]
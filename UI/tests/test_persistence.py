@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from src.models.persistence import Persistence, atomic_write, atomic_write_json
+
+
+def leftovers(directory):
+    return [name for name in os.listdir(directory) if name.endswith(".tmp")]
+
+
+def test_atomic_write_replaces_the_file(tmp_path):
+    path = str(tmp_path / "file.bin")
+    assert atomic_write(path, b"first") == 5
+    assert atomic_write(path, "second é", fsync=False) == len("second é".encode("utf-8"))
+    with open(path, "rb") as f:
+        assert f.read() == "second é".encode("utf-8")
+    assert leftovers(tmp_path) == []
+
+
+def test_failed_atomic_write_keeps_the_old_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "file.bin")
+    atomic_write(path, b"old")
+
+    def fail(src, dst):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        atomic_write(path, b"new")
+    with open(path, "rb") as f:
+        assert f.read() == b"old"
+    assert leftovers(tmp_path) == []
+
+
+def test_atomic_write_json(tmp_path):
+    path = str(tmp_path / "file.json")
+    atomic_write_json(path, {"a": [1, 2]}, separators=(",", ":"))
+    with open(path) as f:
+        assert f.read() == '{"a":[1,2]}'
+
+
+def test_immediate_write(tmp_path):
+    writer = Persistence(window=10)
+    path = str(tmp_path / "file")
+    writer.write(path, b"now")
+    assert not writer.pending(path)
+    with open(path, "rb") as f:
+        assert f.read() == b"now"
+    assert writer.metrics()["writes"] == 1
+
+
+def test_coalesced_writes_keep_only_the_last_version(tmp_path):
+    writer = Persistence(window=10)
+    path = str(tmp_path / "file")
+    produced = []
+
+    def payload(n):
+        def produce():
+            produced.append(n)
+            return f"version {n}"
+        return produce
+
+    for n in range(5):
+        writer.write(path, payload(n), coalesce=True)
+    assert writer.pending(path) and not os.path.exists(path)
+    writer.flush(path)
+    with open(path) as f:
+        assert f.read() == "version 4"
+    # Superseded versions are never serialized
+    assert produced == [4]
+    metrics = writer.metrics()
+    assert (metrics["writes"], metrics["coalesced"], metrics["pending"]) == (1, 4, 0)
+
+
+def test_coalesced_write_lands_after_the_window(tmp_path):
+    writer = Persistence(window=0.05)
+    path = str(tmp_path / "file")
+    writer.write(path, b"later", coalesce=True)
+    deadline = time.monotonic() + 5
+    while writer.pending(path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with open(path, "rb") as f:
+        assert f.read() == b"later"
+
+
+def test_immediate_write_supersedes_a_pending_one(tmp_path):
+    writer = Persistence(window=10)
+    path = str(tmp_path / "file")
+    writer.write(path, b"pending", coalesce=True)
+    writer.write(path, b"immediate")
+    writer.flush()
+    with open(path, "rb") as f:
+        assert f.read() == b"immediate"
+
+
+def test_when_written_waits_for_the_pending_write(tmp_path):
+    writer = Persistence(window=10)
+    path = str(tmp_path / "file")
+    seen = []
+    writer.write(path, b"v1", coalesce=True)
+    writer.when_written(path, lambda: seen.append("v1"))
+    writer.write(path, b"v2", coalesce=True)
+    writer.when_written(path, lambda: seen.append(open(path, "rb").read()))
+    assert seen == []
+    writer.flush(path)
+    # The callback about the superseded version is dropped
+    assert seen == [b"v2"]
+    writer.when_written(path, lambda: seen.append("now"))
+    assert seen == [b"v2", "now"]
+
+
+def test_failed_coalesced_write_drops_callbacks(tmp_path):
+    writer = Persistence(window=10)
+    path = str(tmp_path / "missing" / "file")
+    seen = []
+    writer.write(path, b"data", coalesce=True)
+    writer.when_written(path, lambda: seen.append(True))
+    writer.flush()
+    assert seen == []
+    assert writer.metrics()["errors"] == 1
+
+
+def test_append(tmp_path):
+    writer = Persistence()
+    path = str(tmp_path / "journal")
+    threads = [threading.Thread(target=lambda n=n: [writer.append(path, f"{n}\n") for _ in range(50)])
+               for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert sorted(lines) == sorted(str(n) for n in range(4) for _ in range(50))
+    assert writer.metrics()["writes"] == 200
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_forked_child_writes_coalesced_writes_immediately(tmp_path):
+    writer = Persistence(window=10)
+    writer.write(str(tmp_path / "parent"), b"parent", coalesce=True)
+    path = str(tmp_path / "child")
+    # A worker process exits without running exit handlers, so nothing may be held back
+    child = multiprocessing.get_context("fork").Process(target=writer.write, args=(path, b"child"),
+                                                        kwargs={"coalesce": True})
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0
+    with open(path, "rb") as f:
+        assert f.read() == b"child"
+    assert writer.pending(str(tmp_path / "parent"))
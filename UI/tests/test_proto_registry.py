@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from src.models.proto_registry import ProtoRegistry
+
+UI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def protos(tmp_path, monkeypatch):
+    """A protos directory of plain modules, removed from sys.modules afterwards"""
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    before = set(sys.modules)
+    (tmp_path / "Shop.proto").write_text(textwrap.dedent("""
+        message SS2C_SHOP_RES {
+          message Entry {
+          }
+        }
+        message SC2S_SHOP_REQ {
+        }
+    """), encoding="utf-8")
+    (tmp_path / "Shop_pb2.py").write_text(textwrap.dedent("""
+        class SS2C_SHOP_RES: pass
+        class SC2S_SHOP_REQ: pass
+    """), encoding="utf-8")
+    (tmp_path / "Broken.proto").write_text("message SS2C_BROKEN_RES {\n}\n", encoding="utf-8")
+    (tmp_path / "Broken_pb2.py").write_text("raise ImportError('incompatible protobuf')\n", encoding="utf-8")
+    # Without a generated module the messages cannot be loaded
+    (tmp_path / "Draft.proto").write_text("message SS2C_DRAFT_RES {\n}\n", encoding="utf-8")
+    yield tmp_path
+    for name in set(sys.modules) - before:
+        del sys.modules[name]
+
+
+def test_index_covers_top_level_messages_of_generated_modules(protos):
+    registry = ProtoRegistry(str(protos))
+    assert registry.module_for("SS2C_SHOP_RES") == "Shop_pb2"
+    assert registry.module_for("SC2S_SHOP_REQ") == "Shop_pb2"
+    assert registry.module_for("Entry") is None
+    assert registry.module_for("SS2C_DRAFT_RES") is None
+    assert registry.report()["modules_available"] == 2
+
+
+def test_modules_load_on_first_use_only(protos):
+    registry = ProtoRegistry(str(protos))
+    assert registry.report()["modules_loaded"] == 0
+    message_class = registry.get("SS2C_SHOP_RES")
+    assert message_class.__name__ == "SS2C_SHOP_RES"
+    assert registry.get("SS2C_SHOP_RES") is message_class
+    assert registry.get("SC2S_SHOP_REQ") is sys.modules["networking.protos.Shop_pb2"].SC2S_SHOP_REQ
+    report = registry.report()
+    assert (report["modules_loaded"], report["loaded"]) == (1, ["Shop_pb2"])
+    assert registry.get("SS2C_UNKNOWN_RES") is None
+
+
+def test_failed_import_is_not_left_half_loaded(protos):
+    registry = ProtoRegistry(str(protos))
+    for _ in range(2):
+        with pytest.raises(ImportError, match="incompatible"):
+            registry.get("SS2C_BROKEN_RES")
+        assert "networking.protos.Broken_pb2" not in sys.modules
+    assert registry.report()["modules_loaded"] == 0
+
+
+def test_one_message_does_not_import_every_proto():
+    pytest.importorskip("google.protobuf")
+    code = textwrap.dedent(f"""
+        import json, sys
+        sys.path.insert(0, {UI_DIR!r})
+        from src.models.proto_registry import registry
+        assert registry.get("SS2C_LOBBY_CHARACTER_INFO_RES") is not None
+        print(json.dumps(registry.report()))
+    """)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    report = json.loads(out.stdout)
+    assert "Lobby_pb2" in report["loaded"]
+    assert report["modules_loaded"] < report["modules_available"]
@@ -0,0 +1,123 @@
+import pytest
+
+from src.models.reassembly import FRAME_HEADER, SEQ_MOD, TcpReassembler, TcpStream, seq_diff
+
+
+def frame(proto_type: int, body: bytes = b"") -> bytes:
+    return FRAME_HEADER.pack(FRAME_HEADER.size + len(body), proto_type, 0) + body
+
+
+def valid(length, proto_type, padding):
+    return padding == 0 and FRAME_HEADER.size <= length < 65536
+
+
+def frames_of(result):
+    return [(proto_type, data) for proto_type, data, _ in result]
+
+
+def test_seq_diff_wraps_around():
+    assert seq_diff(5, 3) == 2
+    assert seq_diff(3, 5) == -2
+    assert seq_diff(2, SEQ_MOD - 3) == 5
+    assert seq_diff(SEQ_MOD - 3, 2) == -5
+
+
+def test_frame_split_across_segments():
+    data = frame(1, b"hello") + frame(2, b"world!")
+    reassembler = TcpReassembler(valid)
+    assert reassembler.feed("s", data[:3], seq=100) == []
+    assert frames_of(reassembler.feed("s", data[3:15], seq=103)) == [(1, frame(1, b"hello"))]
+    assert frames_of(reassembler.feed("s", data[15:], seq=115)) == [(2, frame(2, b"world!"))]
+    assert reassembler.pending_bytes() == 0
+
+
+def test_sequence_wraparound():
+    data = frame(7, b"x" * 20) + frame(8, b"y" * 3)
+    start = SEQ_MOD - 10
+    reassembler = TcpReassembler(valid)
+    result = []
+    for offset in range(0, len(data), 6):
+        result += reassembler.feed("s", data[offset:offset + 6], seq=(start + offset) % SEQ_MOD)
+    assert frames_of(result) == [(7, frame(7, b"x" * 20)), (8, frame(8, b"y" * 3))]
+    assert reassembler.dropped_segments == 0
+
+
+def test_out_of_order_segments_are_buffered():
+    data = frame(3, bytes(range(30)))
+    segments = [(data[i:i + 8], 1000 + i) for i in range(0, len(data), 8)]
+    reassembler = TcpReassembler(valid)
+    # First segment establishes the stream, the rest arrive in reverse
+    result = reassembler.feed("s", *segments[0])
+    for payload, seq in reversed(segments[1:]):
+        result += reassembler.feed("s", payload, seq)
+    assert frames_of(result) == [(3, data)]
+    assert reassembler.streams["s"].pending == {}
+
+
+def test_out_of_order_across_wraparound():
+    data = frame(4, b"abcdefghijklmnop")
+    start = SEQ_MOD - 4
+    segments = [(data[i:i + 5], (start + i) % SEQ_MOD) for i in range(0, len(data), 5)]
+    reassembler = TcpReassembler(valid)
+    result = reassembler.feed("s", *segments[0])
+    result += reassembler.feed("s", *segments[2])
+    result += reassembler.feed("s", *segments[1])
+    for segment in segments[3:]:
+        result += reassembler.feed("s", *segment)
+    assert frames_of(result) == [(4, data)]
+
+
+def test_retransmission_is_trimmed():
+    data = frame(5, b"0123456789")
+    reassembler = TcpReassembler(valid)
+    result = reassembler.feed("s", data[:10], seq=50)
+    # Overlaps the first 4 bytes already received
+    result += reassembler.feed("s", data[6:], seq=56)
+    # Entirely old
+    result += reassembler.feed("s", data[:10], seq=50)
+    assert frames_of(result) == [(5, data)]
+
+
+def test_streams_do_not_mix():
+    a, b = frame(1, b"aaaa"), frame(2, b"bbbb")
+    reassembler = TcpReassembler(valid)
+    result = reassembler.feed("a", a[:5], seq=0)
+    result += reassembler.feed("b", b[:7], seq=900)
+    result += reassembler.feed("a", a[5:], seq=5)
+    result += reassembler.feed("b", b[7:], seq=907)
+    assert frames_of(result) == [(1, a), (2, b)]
+
+
+def test_invalid_header_resets_stream():
+    reassembler = TcpReassembler(valid)
+    assert reassembler.feed("s", FRAME_HEADER.pack(12, 1, 99), seq=0) == []
+    assert reassembler.invalid_headers == 1
+    # The next segment resynchronises
+    assert frames_of(reassembler.feed("s", frame(6), seq=5000)) == [(6, frame(6))]
+
+
+def test_too_many_pending_segments_reset_the_stream():
+    stream = TcpStream(max_pending_segments=2)
+    stream.add_segment(b"ab", seq=0)
+    assert stream.add_segment(b"x", seq=10) == 0
+    assert stream.add_segment(b"y", seq=20) == 0
+    assert stream.add_segment(b"z", seq=30) == 3
+    assert len(stream) == 0 and stream.next_seq is None
+
+
+def test_segments_without_sequence_numbers_are_appended():
+    data = frame(9, b"payload")
+    reassembler = TcpReassembler(valid)
+    result = reassembler.feed("s", data[:4]) + reassembler.feed("s", data[4:])
+    assert frames_of(result) == [(9, data)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 8, 13])
+def test_any_segmentation_yields_the_same_frames(size):
+    frames = [frame(i, bytes([i]) * i) for i in range(1, 12)]
+    data = b"".join(frames)
+    reassembler = TcpReassembler(valid)
+    result = []
+    for offset in range(0, len(data), size):
+        result += reassembler.feed("s", data[offset:offset + size], seq=(SEQ_MOD - 17 + offset) % SEQ_MOD)
+    assert [f for _, f in frames_of(result)] == frames
@@ -0,0 +1,66 @@
+import os
+import socket
+import struct
+import time
+
+import pytest
+
+pytest.importorskip("google.protobuf")
+
+from src.models.capture import PacketCapture
+from src.models.frame_pool import ProcessHandler
+from src.models.reassembly import FRAME_HEADER
+from networking.protos import Lobby_pb2, _PacketCommand_pb2
+
+CHARACTER_INFO = _PacketCommand_pb2.PacketCommand.S2C_LOBBY_CHARACTER_INFO_RES
+DLT_RAW = 12
+
+
+def record_character(message):
+    """Worker process handler: leave a file per handled frame, slowly enough to fill the pool"""
+    time.sleep(0.02)
+    with open(os.path.join(os.environ["REPLAY_OUT"], str(message.result)), "w"):
+        pass
+
+
+def tcp_packet(payload: bytes, seq: int) -> bytes:
+    tcp = struct.pack("!HHIIBBHHH", 20200, 50000, seq, 0, 5 << 4, 0x18, 65535, 0, 0)
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(tcp) + len(payload), 0, 0, 64, socket.IPPROTO_TCP, 0,
+                     socket.inet_aton("35.1.2.3"), socket.inet_aton("192.168.1.20"))
+    return ip + tcp + payload
+
+
+def write_pcap(path, packets):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, DLT_RAW))
+        for n, packet in enumerate(packets):
+            f.write(struct.pack("<IIII", 1000 + n, 0, len(packet), len(packet)))
+            f.write(packet)
+
+
+def test_replay_hands_every_frame_to_worker_processes(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    out = tmp_path / "out"
+    out.mkdir()
+    monkeypatch.setenv("REPLAY_OUT", str(out))
+    frames = 12
+    packets, seq = [], 1
+    for n in range(frames):
+        body = Lobby_pb2.SS2C_LOBBY_CHARACTER_INFO_RES(result=n + 1).SerializeToString()
+        frame = FRAME_HEADER.pack(FRAME_HEADER.size + len(body), CHARACTER_INFO, 0) + body
+        packets.append(tcp_packet(frame, seq))
+        seq += len(frame)
+    write_pcap(tmp_path / "capture.pcap", packets)
+
+    # Far fewer frames fit in the process pool at once than the replay holds
+    capture = PacketCapture(restore_state=False, queue_size=2, persist_processes=1)
+    capture.capture_info = {CHARACTER_INFO: ProcessHandler(record_character)}
+    try:
+        stats = capture.replay(str(tmp_path / "capture.pcap"))
+        pool = capture.frame_pool.stats()
+    finally:
+        capture.frame_pool.stop()
+
+    assert stats["frames"] == frames
+    assert (pool["offloaded"], pool["dropped"], pool["failed"]) == (frames, 0, 0)
+    assert sorted(int(name) for name in os.listdir(out)) == list(range(1, frames + 1))
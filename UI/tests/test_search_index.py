@@ -0,0 +1,122 @@
+import pytest
+
+from src.models import search_index
+from src.models.search_index import SearchIndex, TrigramIndex, fuzzy_score, match_score, trigrams
+
+
+def entry(item_id, slot, properties=(), count=1):
+    return {"itemId": f"DesignDataItem:Id_Item_{item_id}", "slotId": slot, "itemCount": count,
+            "data": {"primaryPropertyArray": [
+                {"propertyTypeId": f"DesignDataItemPropertyType:Id_ItemPropertyType_Effect_{name}",
+                 "propertyValue": value} for name, value in properties]}}
+
+
+def character(char_id, stashes):
+    return {"id": char_id, "nickname": f"Char{char_id}", "class": "Fighter", "level": 10, "stashes": stashes}
+
+
+@pytest.fixture
+def index(item_catalog, monkeypatch):
+    monkeypatch.setattr(search_index, "item_data_manager", item_catalog)
+    index = SearchIndex()
+    index.sync({
+        "1": character("1", {"2": [entry("Longsword_5001", 0, [("MoveSpeed", 5)]),
+                                   entry("GoldCoin", 3, count=50)]}),
+        "2": character("2", {"3": [entry("Longsword_2001", 1, [("PhysicalDamageAdd", 2)]),
+                                   entry("Lantern_2001", 2)]}),
+    })
+    return index
+
+
+def names(results):
+    return [(r["id"], r["item"]["name"], r["item"]["rarity"]) for r in results]
+
+
+def test_keywords_match_names_rarities_and_properties(index):
+    assert names(index.search(["longsword"])) == [("1", "Longsword", "Rare"), ("2", "Longsword", "Common")]
+    assert names(index.search(["longsword", "common"])) == [("2", "Longsword", "Common")]
+    assert names(index.search(["movespeed"])) == [("1", "Longsword", "Rare")]
+    assert names(index.search(["sword", "damage"])) == [("2", "Longsword", "Common")]
+    assert index.search(["longsword", "lantern"]) == []
+    assert len(index.search([""])) == 4
+    assert len(index.search([], limit=2)) == 2
+
+
+def test_results_are_copies(index):
+    result = index.search(["gold"])[0]
+    assert result["itemCount"] == 50
+    result["itemCount"] = 1
+    assert index.search(["gold"])[0]["itemCount"] == 50
+
+
+def test_sync_reindexes_only_replaced_characters(index):
+    characters = dict(index._characters)
+    assert index.sync(characters) == 0
+    characters["2"] = character("2", {"3": [entry("SpellBook_6001", 0)]})
+    assert index.sync(characters) == 1
+    assert names(index.search(["longsword"])) == [("1", "Longsword", "Rare")]
+    assert names(index.search(["spell"])) == [("2", "Spellbook", "Epic")]
+    del characters["1"]
+    assert index.sync(characters) == 1
+    assert index.search(["longsword"]) == []
+    assert len(index) == 1
+
+
+def test_results_follow_character_order(index):
+    characters = dict(index._characters)
+    reordered = {"2": characters["2"], "1": characters["1"]}
+    index.sync(reordered)
+    assert [r["id"] for r in index.search(["longsword"])] == ["2", "1"]
+
+
+def test_match_score_tiers():
+    assert match_score("long bow", "long bow") == (4, 1.0)
+    assert match_score("long", "longsword")[0] == 3
+    assert match_score("bow", "long bow")[0] == 2
+    assert match_score("sword", "longsword")[0] == 1
+    assert match_score("axe", "longsword") == (0, 0.0)
+    # Shorter completions rank first within a tier
+    assert match_score("long", "long bow")[1] > match_score("long", "longbow of light")[1]
+
+
+def test_trigrams_and_candidates():
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+    assert trigrams("ab", partial_last_word=True) == {"  a", " ab"}
+    terms = TrigramIndex()
+    for term in ("longsword", "lantern", "gold coin"):
+        terms.add(term)
+    assert "longsword" in terms.candidates("longs")
+    assert "gold coin" in terms.candidates("coin")
+    assert "lantern" not in terms.candidates("longs")
+    terms.remove("longsword")
+    assert terms.candidates("longs") == {}
+
+
+def test_fuzzy_score():
+    assert fuzzy_score("lantren", "lantern") >= search_index.MIN_FUZZY_RATIO
+    assert fuzzy_score("coin", "gold coin") == 1.0
+    assert fuzzy_score("zzzz", "lantern") == 0.0
+
+
+def test_suggest_ranks_prefixes_then_substrings_then_typos(index):
+    suggestions = index.suggest("lon")
+    texts = [s["text"] for s in suggestions]
+    # Owned items first within the prefix tier, then catalog items, shorter first
+    assert texts[:3] == ["Longsword", "Long Bow", "Longbow of Light"]
+    assert suggestions[0] == {"text": "Longsword", "kind": "item", "count": 2, "query": "Longsword"}
+    assert suggestions[1]["count"] == 0
+
+    texts = [s["text"] for s in index.suggest("sword")]
+    assert texts == ["Longsword"]
+
+    texts = [s["text"] for s in index.suggest("lantren")]
+    assert texts[0] == "Lantern"
+
+
+def test_suggest_kinds_and_query_completion(index):
+    kinds = {s["text"]: s["kind"] for s in index.suggest("r")}
+    assert kinds.get("Rare") == "rarity"
+    suggestion = index.suggest("longsword, move")[0]
+    assert suggestion == {"text": "MoveSpeed", "kind": "property", "count": 1, "query": "longsword, MoveSpeed"}
+    assert index.suggest("longsword, ") == []
+    assert len(index.suggest("l", limit=2)) == 2
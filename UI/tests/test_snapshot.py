@@ -0,0 +1,65 @@
+import pytest
+
+from src.models import snapshot
+from src.models.snapshot import (SCHEMA_VERSION, encode_snapshot, read_snapshot, snapshot_path,
+                                 write_snapshot)
+
+PAYLOAD = bytes(range(256)) * 64
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_round_trip(tmp_path, compress):
+    path = snapshot_path(str(tmp_path), "42")
+    write_snapshot(path, PAYLOAD, "42", captured_at=1700000000.5, compress=compress)
+    header, payload = read_snapshot(path)
+    assert payload == PAYLOAD
+    assert header.character_id == "42"
+    assert header.captured_at == 1700000000.5
+    assert header.schema_version == SCHEMA_VERSION
+    assert header.compressed is compress
+
+
+def test_header_only(tmp_path):
+    path = snapshot_path(str(tmp_path), "7")
+    write_snapshot(path, PAYLOAD, "7", captured_at=5.0)
+    header, payload = read_snapshot(path, header_only=True)
+    assert payload is None and header.character_id == "7" and header.captured_at == 5.0
+
+
+def test_compression_shrinks_repetitive_payloads():
+    assert len(encode_snapshot(PAYLOAD, "1")) < len(encode_snapshot(PAYLOAD, "1", compress=False)) // 4
+
+
+def test_corrupt_payload_fails_the_checksum(tmp_path):
+    path = tmp_path / "1.snap"
+    data = bytearray(encode_snapshot(PAYLOAD, "1", captured_at=1.0))
+    data[-10] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="checksum"):
+        read_snapshot(str(path))
+
+
+@pytest.mark.parametrize("cut", [3, 20, -1])
+def test_truncated_snapshot(tmp_path, cut):
+    path = tmp_path / "1.snap"
+    path.write_bytes(encode_snapshot(PAYLOAD, "1", captured_at=1.0)[:cut])
+    with pytest.raises(ValueError, match="Truncated"):
+        read_snapshot(str(path))
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "1.snap"
+    path.write_bytes(b'{"characterDataBase": {}}' * 4)
+    with pytest.raises(ValueError, match="Not a snapshot"):
+        read_snapshot(str(path))
+
+
+def test_other_schema_versions_are_rejected(tmp_path, monkeypatch):
+    path = snapshot_path(str(tmp_path), "3")
+    with monkeypatch.context() as patch:
+        patch.setattr(snapshot, "SCHEMA_VERSION", SCHEMA_VERSION + 1)
+        write_snapshot(path, PAYLOAD, "3", captured_at=1.0)
+    with pytest.raises(ValueError, match="schema"):
+        read_snapshot(path)
+    header, _ = read_snapshot(path, header_only=True)
+    assert header.schema_version == SCHEMA_VERSION + 1
@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+from src.models import stash_manager, startup_cache
+from src.models.appdirs import get_data_dir
+from src.models.persistence import writer
+from src.models.startup_cache import encode_startup_cache, load_startup_cache
+
+ENTRIES = {"/data/1.snapshot": ((1, 2, None), {"id": "1", "character_data": {"level": 3}}),
+           "/data/notes.json": ((4, 5, (6, 7)), None)}
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    monkeypatch.setattr(stash_manager, "PROCESS_POOL_MIN_FILES", 1000)
+    return get_data_dir()
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """Paths passed to parse_character_file"""
+    paths = []
+    parse = stash_manager.parse_character_file
+
+    def counting_parse(file_path, data_dir):
+        paths.append(file_path)
+        return parse(file_path, data_dir)
+
+    monkeypatch.setattr(stash_manager, "parse_character_file", counting_parse)
+    return paths
+
+
+def write_character(data_dir, character_id, level=1):
+    packet = {"characterDataBase": {"characterId": character_id, "level": level,
+                                    "nickName": {"originalNickName": f"c{character_id}"}}}
+    with open(os.path.join(data_dir, f"{character_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(packet, f)
+
+
+def saved_manager(data_dir):
+    manager = stash_manager.StashManager(data_dir)
+    writer.flush(manager.startup_cache_file)
+    return manager
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "startup_cache.bin"
+    path.write_bytes(encode_startup_cache(ENTRIES, "items-hash"))
+    assert load_startup_cache(str(path), "items-hash") == ENTRIES
+
+
+@pytest.mark.parametrize("change", ["dependencies", "version", "python"])
+def test_cache_of_another_build_is_ignored(tmp_path, monkeypatch, change):
+    path = tmp_path / "startup_cache.bin"
+    path.write_bytes(encode_startup_cache(ENTRIES, "items-hash"))
+    if change == "version":
+        monkeypatch.setattr(startup_cache, "CACHE_VERSION", startup_cache.CACHE_VERSION + 1)
+    elif change == "python":
+        monkeypatch.setattr(startup_cache, "python_tag", lambda: "cpython-2.7")
+    dependencies = "other-hash" if change == "dependencies" else "items-hash"
+    assert load_startup_cache(str(path), dependencies) == {}
+
+
+@pytest.mark.parametrize("data", [b"", b"PK\x03\x04", startup_cache.MAGIC + b"\xff\x00"])
+def test_unusable_cache_is_ignored(tmp_path, data):
+    path = tmp_path / "startup_cache.bin"
+    path.write_bytes(data)
+    assert load_startup_cache(str(path), None) == {}
+    assert load_startup_cache(str(tmp_path / "missing.bin"), None) == {}
+
+
+def test_startup_publishes_cached_characters_without_parsing(data_dir, parsed):
+    write_character(data_dir, "1", level=4)
+    write_character(data_dir, "2", level=7)
+    saved_manager(data_dir)
+    parsed.clear()
+
+    manager = stash_manager.StashManager(data_dir, defer_loading=True)
+    assert manager.load_startup_cache() == 2
+    assert manager.characters_cache["1"]["level"] == 4
+    assert manager.characters_cache["2"]["level"] == 7
+    manager._load_data()
+    assert parsed == []
+    assert manager.characters_cache["2"]["level"] == 7
+
+
+def test_changed_files_are_parsed_again(data_dir, parsed):
+    write_character(data_dir, "1", level=4)
+    write_character(data_dir, "2", level=7)
+    saved_manager(data_dir)
+    parsed.clear()
+    path = stash_manager.snapshot_path(data_dir, "2")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    manager = stash_manager.StashManager(data_dir, defer_loading=True)
+    assert manager.load_startup_cache() == 1
+    assert "2" not in manager.characters_cache
+    manager._load_data()
+    assert parsed == [path]
+    assert manager.characters_cache["2"]["level"] == 7
+
+
+def test_item_database_change_discards_the_cache(data_dir, parsed, monkeypatch):
+    write_character(data_dir, "1")
+    saved_manager(data_dir)
+    parsed.clear()
+    monkeypatch.setattr(stash_manager.StashManager, "_cache_dependencies", lambda self: "new-items")
+    manager = stash_manager.StashManager(data_dir, defer_loading=True)
+    assert manager.load_startup_cache() == 0
+    manager._load_data()
+    assert len(parsed) == 1
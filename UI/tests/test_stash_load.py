@@ -0,0 +1,73 @@
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+UI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stands in for app.py: module-level setup that must run once per app, with
+# the load under a main guard as app.py has it
+MAIN_SCRIPT = textwrap.dedent("""
+    import multiprocessing
+    import os
+    import sys
+
+    with open(os.environ["MARKER_FILE"], "a") as f:
+        f.write(f"{os.getpid()}\\n")
+
+    sys.path.insert(0, os.environ["UI_DIR"])
+    from src.models import stash_manager
+
+    if __name__ == "__main__":
+        multiprocessing.set_start_method(sys.argv[1])
+        stash_manager.PROCESS_POOL_MIN_FILES = 2
+        stash_manager.PROCESS_POOL_MIN_WORK = 0
+        os.cpu_count = lambda: 4
+        manager = stash_manager.StashManager(os.environ["UI_DIR"], defer_loading=True)
+        manager._load_data()
+        print(len(manager.characters_cache))
+""")
+
+
+def write_characters(data_dir, count):
+    os.makedirs(data_dir, exist_ok=True)
+    for i in range(count):
+        packet = {"characterDataBase": {"characterId": str(i), "nickName": {"originalNickName": f"c{i}"}}}
+        with open(os.path.join(data_dir, f"{i}.json"), "w", encoding="utf-8") as f:
+            json.dump(packet, f)
+
+
+@pytest.mark.parametrize("start_method", multiprocessing.get_all_start_methods())
+def test_auto_load_does_not_rerun_main_module(tmp_path, start_method):
+    appdata = tmp_path / "appdata"
+    write_characters(appdata / "DnDTools" / "data", 4)
+    script = tmp_path / "main.py"
+    script.write_text(MAIN_SCRIPT, encoding="utf-8")
+    marker = tmp_path / "marker"
+    env = dict(os.environ, LOCALAPPDATA=str(appdata), MARKER_FILE=str(marker), UI_DIR=UI_DIR)
+
+    out = subprocess.run([sys.executable, str(script), start_method], env=env, cwd=str(tmp_path),
+                         capture_output=True, text=True, timeout=120)
+
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.split()[-1] == "4"
+    # One line per execution of the main module: workers must not run it again
+    assert len(marker.read_text().splitlines()) == 1
+
+
+@pytest.mark.parametrize("start_method, expected", [("fork", "processes"), ("spawn", "threads"),
+                                                     ("forkserver", "threads")])
+def test_auto_uses_processes_only_when_forking(tmp_path, monkeypatch, start_method, expected):
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    from src.models import stash_manager
+    monkeypatch.setattr(stash_manager, "PROCESS_POOL_MIN_WORK", 0)
+    monkeypatch.setattr(stash_manager.os, "cpu_count", lambda: 4)
+    monkeypatch.setattr(stash_manager.multiprocessing, "get_start_method", lambda: start_method)
+    manager = stash_manager.StashManager(str(tmp_path), defer_loading=True)
+    stale = [str(tmp_path / f"{i}.json") for i in range(stash_manager.PROCESS_POOL_MIN_FILES)]
+
+    assert manager._choose_load_strategy(stale) == expected
@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from src.models import snapshot, stash_manager
+from src.models.appdirs import get_data_dir
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    return get_data_dir()
+
+
+def write_character(data_dir, character_id, level=1):
+    packet = {"characterDataBase": {"characterId": character_id, "level": level,
+                                    "nickName": {"originalNickName": f"c{character_id}"}}}
+    path = os.path.join(data_dir, f"{character_id}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(packet, f)
+    return path
+
+
+def test_version_differs_across_launches(data_dir):
+    write_character(data_dir, "1")
+    first = stash_manager.StashManager(data_dir)
+    # The same generation after a restart is not the same character list
+    second = stash_manager.StashManager(data_dir)
+    assert first.generation == second.generation
+    assert first.version != second.version
+
+    version = first.version
+    write_character(data_dir, "2")
+    first.force_reload()
+    assert first.version != version
+    assert first.version.endswith(f"-{first.generation}")
+
+
+def test_unreadable_snapshot_falls_back_to_its_legacy_json(data_dir, monkeypatch):
+    write_character(data_dir, "5", level=9)
+    stash_manager.StashManager(data_dir)
+    # Migrated on load: the JSON file now lives in legacy_json
+    legacy_file = snapshot.legacy_json_path(data_dir, "5")
+    assert os.path.exists(legacy_file)
+    # A snapshot from a version with another message schema replaces it
+    with monkeypatch.context() as patch:
+        patch.setattr(snapshot, "SCHEMA_VERSION", snapshot.SCHEMA_VERSION + 1)
+        snapshot.write_snapshot(snapshot.snapshot_path(data_dir, "5"), b"", "5")
+
+    manager = stash_manager.StashManager(data_dir)
+    assert manager.characters_cache["5"]["level"] == 9
+
+
+def test_capture_written_after_inventory_deltas_is_not_cached_stale(data_dir, item_catalog, monkeypatch):
+    pytest.importorskip("google.protobuf")
+    from src.models import stash_preview
+    from src.models.persistence import writer
+    from src.models.proto_registry import registry
+    monkeypatch.setattr(stash_preview, "item_data_manager", item_catalog)
+    manager = stash_manager.StashManager(data_dir)
+    message = registry.get(snapshot.SNAPSHOT_MESSAGE)(result=1)
+    message.characterDataBase.characterId = "5"
+    item = message.characterDataBase.CharacterItemList.add()
+    item.itemUniqueId, item.itemId, item.inventoryId, item.slotId = 9, "DesignDataItem:Id_Item_GoldCoin", 2, 0
+
+    # The capture is published at once while its snapshot write is still held back
+    path = snapshot.save_character_snapshot(data_dir, message, coalesce=True)
+    assert manager.update_character("5", message)
+    assert manager.apply_inventory_delta("5", [{"op": "move", "uniqueId": "9", "inventoryId": 3, "slotId": 1}])
+    writer.flush(path)
+
+    cached = manager._file_cache.get(path)
+    assert cached is None or cached[1]["character_data"] is manager.characters_cache["5"]
+    assert list(manager.characters_cache["5"]["stashes"]) == ["3"]
+
+    # Without changes in between, the written capture is remembered against its file
+    snapshot.save_character_snapshot(data_dir, message, coalesce=True)
+    assert manager.update_character("5", message)
+    writer.flush(path)
+    assert manager._file_cache[path][1]["character_data"] is manager.characters_cache["5"]